@@ -0,0 +1,438 @@
+"""Benchmarks for hot paths of the library, against local repositories.
+
+Builds a synthetic tree, creates a local repository and archive of it, and
+times library operations on them. Results are written as JSON, so that they can
+be compared between releases.
+
+Usage:
+
+    python3 benchmarks/run.py --files 10000 --depth 4 --output results.json
+
+Borg must be installed. Everything is created in a temporary directory, which is
+removed afterwards.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from cyberfusion.BorgSupport import Borg, decoders
+from cyberfusion.BorgSupport.archives import (
+    Archive,
+    ArchiveRestoration,
+    FilesystemObject,
+)
+from cyberfusion.BorgSupport.operations import Operation
+from cyberfusion.BorgSupport.repositories import Repository
+
+NAME_TREE_DIRECTORY = "tree"
+NAME_FILE_PREFIX = "file"
+NAME_DIRECTORY_PREFIX = "dir"
+
+
+@dataclass
+class Parameters:
+    """Parameters of benchmark run."""
+
+    files: int
+    depth: int
+    fan_out: int
+    file_size: int
+    compressibility: float
+    repetitions: int
+    progress_lines: int
+    listing_lines: int
+    seed: int
+
+
+@dataclass
+class Result:
+    """Timings of benchmark, in seconds."""
+
+    name: str
+    repetitions: int
+    minimum: float
+    maximum: float
+    mean: float
+    median: float
+
+
+def get_file_contents(
+    randomiser: random.Random, *, size: int, compressibility: float
+) -> bytes:
+    """Get file contents, of which 'compressibility' (0-1) is zeroes."""
+    compressible_size = int(size * compressibility)
+
+    return b"\0" * compressible_size + randomiser.randbytes(size - compressible_size)
+
+
+def build_tree(path: str, parameters: Parameters) -> List[str]:
+    """Create synthetic tree, and return paths of directories in it.
+
+    Files are spread over directories. Directories are nested 'depth' levels
+    deep, with 'fan_out' subdirectories each.
+    """
+    randomiser = random.Random(parameters.seed)
+
+    directories = [path]
+    level = [path]
+
+    for _ in range(parameters.depth):
+        next_level = []
+
+        for parent in level:
+            for i in range(parameters.fan_out):
+                directory = os.path.join(parent, f"{NAME_DIRECTORY_PREFIX}{i}")
+
+                os.mkdir(directory)
+
+                next_level.append(directory)
+
+        directories.extend(next_level)
+        level = next_level
+
+    for i in range(parameters.files):
+        with open(
+            os.path.join(
+                directories[i % len(directories)], f"{NAME_FILE_PREFIX}{i}.bin"
+            ),
+            "wb",
+        ) as f:
+            f.write(
+                get_file_contents(
+                    randomiser,
+                    size=parameters.file_size,
+                    compressibility=parameters.compressibility,
+                )
+            )
+
+    return directories
+
+
+def remove_file(path: str) -> None:
+    """Remove file if it exists."""
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+def build_progress_file(path: str, *, lines: int) -> None:
+    """Create progress file like written by 'borg create'."""
+    with open(path, "w") as f:
+        for i in range(lines):
+            f.write(
+                json.dumps(
+                    {
+                        "original_size": i * 1024,
+                        "compressed_size": i * 512,
+                        "deduplicated_size": i * 256,
+                        "nfiles": i,
+                        "time": 1648247800.0 + i,
+                        "type": "archive_progress",
+                        "path": f"home/example/{NAME_FILE_PREFIX}{i}.bin",
+                    }
+                )
+                + "\n"
+            )
+
+        f.write(
+            json.dumps(
+                {
+                    "operation": 1,
+                    "msgid": "cache.commit",
+                    "type": "progress_message",
+                    "finished": True,
+                    "time": 1648247800.0 + lines,
+                }
+            )
+            + "\n"
+        )
+
+
+def get_listing_lines(*, lines: int) -> List[bytes]:
+    """Get lines like written by 'borg list --json-lines'."""
+    return [
+        json.dumps(
+            {
+                "type": "-",
+                "mode": "-rw-r--r--",
+                "user": "example",
+                "group": "example",
+                "uid": 1000,
+                "gid": 1000,
+                "path": f"home/example/{NAME_DIRECTORY_PREFIX}{i % 100}/"
+                f"{NAME_FILE_PREFIX}{i}.bin",
+                "healthy": True,
+                "source": "",
+                "linktarget": "",
+                "flags": None,
+                "mtime": "2022-03-25T23:36:40.000000",
+                "size": i * 1024,
+            }
+        ).encode()
+        + b"\n"
+        for i in range(lines)
+    ]
+
+
+def run_benchmark(
+    name: str,
+    function: Callable[[int], Any],
+    *,
+    repetitions: int,
+    setup: Optional[Callable[[int], Any]] = None,
+) -> Result:
+    """Time function. Both 'setup' and 'function' are called with repetition number."""
+    timings = []
+
+    for repetition in range(repetitions):
+        if setup:
+            setup(repetition)
+
+        start_time = time.perf_counter()
+
+        function(repetition)
+
+        timings.append(time.perf_counter() - start_time)
+
+    return Result(
+        name=name,
+        repetitions=repetitions,
+        minimum=min(timings),
+        maximum=max(timings),
+        mean=statistics.mean(timings),
+        median=statistics.median(timings),
+    )
+
+
+def run(workspace_path: str, parameters: Parameters) -> List[Result]:
+    """Run all benchmarks."""
+    results = []
+
+    tree_path = os.path.join(workspace_path, NAME_TREE_DIRECTORY)
+
+    os.mkdir(tree_path)
+
+    directories = build_tree(tree_path, parameters)
+
+    # Archive paths are relative to the working directory, which is '/'
+
+    directory_archive_path = directories[-1].lstrip(os.path.sep)
+    tree_archive_path = tree_path.lstrip(os.path.sep)
+
+    repository = Repository(
+        path=os.path.join(workspace_path, "repository"),
+        passphrase="benchmark",
+        create_if_not_exists=True,
+    )
+
+    archive = Archive(repository=repository, name="benchmark", comment="Benchmark")
+
+    results.append(
+        run_benchmark(
+            "Archive.create",
+            lambda i: Archive(
+                repository=repository, name=f"create-{i}", comment="Benchmark"
+            ).create(paths=[tree_path], excludes=[]),
+            repetitions=parameters.repetitions,
+        )
+    )
+
+    archive.create(paths=[tree_path], excludes=[])
+
+    results.append(
+        run_benchmark(
+            "Repository.archives",
+            lambda _: repository.archives(),
+            repetitions=parameters.repetitions,
+        )
+    )
+
+    # Compare JSON backends, on synthetic listing (to show the gain on large
+    # listings without building a large archive), and on the archive
+
+    listing_lines = get_listing_lines(lines=parameters.listing_lines)
+
+    default_backend = decoders.get_backend()
+
+    for backend in decoders.get_available_backends():
+        decoders.set_backend(backend)
+
+        results.append(
+            run_benchmark(
+                f"JSON decoding of archive listing ({backend})",
+                lambda _: [decoders.loads(line) for line in listing_lines],
+                repetitions=parameters.repetitions,
+            )
+        )
+
+        results.append(
+            run_benchmark(
+                f"Archive.contents (recursive, {backend})",
+                lambda _: archive.contents(path=tree_archive_path, recursive=True),
+                repetitions=parameters.repetitions,
+            )
+        )
+
+    decoders.set_backend(default_backend)
+
+    listing = [decoders.loads(line) for line in listing_lines]
+
+    results.append(
+        run_benchmark(
+            "FilesystemObject (all attributes)",
+            lambda _: [
+                (
+                    filesystem_object.type_,
+                    filesystem_object.path,
+                    filesystem_object.size,
+                    filesystem_object.modification_time,
+                )
+                for filesystem_object in map(FilesystemObject, listing)
+            ],
+            repetitions=parameters.repetitions,
+        )
+    )
+
+    results.append(
+        run_benchmark(
+            "Archive.contents (non-recursive)",
+            lambda _: archive.contents(path=tree_archive_path, recursive=False),
+            repetitions=parameters.repetitions,
+        )
+    )
+
+    extract_path = os.path.join(workspace_path, "extract")
+
+    results.append(
+        run_benchmark(
+            "Archive.extract",
+            lambda _: archive.extract(
+                destination_path=extract_path, restore_paths=[tree_archive_path]
+            ),
+            repetitions=parameters.repetitions,
+            setup=lambda _: shutil.rmtree(extract_path, ignore_errors=True),
+        )
+    )
+
+    export_tar_path = os.path.join(workspace_path, "export.tar.gz")
+
+    results.append(
+        run_benchmark(
+            "Archive.export_tar (including hashing)",
+            lambda _: archive.export_tar(
+                destination_path=export_tar_path,
+                restore_paths=[tree_archive_path],
+                strip_components=0,
+            ),
+            repetitions=parameters.repetitions,
+            setup=lambda _: remove_file(export_tar_path),
+        )
+    )
+
+    restore_root_path = os.path.join(workspace_path, "restore")
+
+    os.mkdir(restore_root_path)
+
+    results.append(
+        run_benchmark(
+            "ArchiveRestoration.replace",
+            lambda _: ArchiveRestoration(
+                archive=archive,
+                path=os.path.join(os.path.sep, directory_archive_path),
+                temporary_path_root_path=restore_root_path,
+            ).replace(),
+            repetitions=parameters.repetitions,
+        )
+    )
+
+    progress_file_path = os.path.join(workspace_path, "progress.json")
+
+    build_progress_file(progress_file_path, lines=parameters.progress_lines)
+
+    results.append(
+        run_benchmark(
+            "Operation",
+            lambda _: Operation(progress_file=progress_file_path).last_line,
+            repetitions=parameters.repetitions,
+        )
+    )
+
+    repository.delete()
+
+    return results
+
+
+def get_report(parameters: Parameters, results: List[Result]) -> Dict[str, Any]:
+    """Get machine-readable report."""
+    major, minor, patch = Borg().version
+
+    return {
+        "time": time.time(),
+        "python_version": platform.python_version(),
+        "borg_version": f"{major}.{minor}.{patch}",
+        "platform": platform.platform(),
+        "parameters": asdict(parameters),
+        "results": [asdict(result) for result in results],
+    }
+
+
+def main() -> None:
+    """Parse arguments, and run benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fan-out", type=int, default=4)
+    parser.add_argument("--file-size", type=int, default=4096, help="Bytes")
+    parser.add_argument(
+        "--compressibility",
+        type=float,
+        default=0.5,
+        help="Share of file contents that is compressible, from 0 to 1",
+    )
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--progress-lines", type=int, default=100000)
+    parser.add_argument("--listing-lines", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workspace", help="Directory to create temporary directory in"
+    )
+    parser.add_argument("--output", help="Path to write JSON to. Default: stdout")
+
+    arguments = parser.parse_args()
+
+    parameters = Parameters(
+        files=arguments.files,
+        depth=arguments.depth,
+        fan_out=arguments.fan_out,
+        file_size=arguments.file_size,
+        compressibility=arguments.compressibility,
+        repetitions=arguments.repetitions,
+        progress_lines=arguments.progress_lines,
+        listing_lines=arguments.listing_lines,
+        seed=arguments.seed,
+    )
+
+    with tempfile.TemporaryDirectory(dir=arguments.workspace) as workspace_path:
+        results = run(workspace_path, parameters)
+
+    report = json.dumps(get_report(parameters, results), indent=2)
+
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        sys.stdout.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
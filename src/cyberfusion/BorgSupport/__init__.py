@@ -1,6 +1,7 @@
 """Classes for basic interaction with Borg."""
 
 import os
+import threading
 from typing import Dict, Tuple
 
 from cyberfusion.BorgSupport.borg_cli import BorgCommand, BorgRegularCommand
@@ -10,7 +11,17 @@ CAT_BIN = find_executable("cat")
 
 
 class Borg:
-    """Abstraction of Borg."""
+    """Abstraction of Borg.
+
+    The version is cached per Borg binary, as getting it requires running a
+    command. The cache is invalidated when the binary changes (i.e. its inode
+    or modification time), e.g. when Borg is upgraded.
+    """
+
+    # Resolved path of binary -> (inode, modification time, version)
+
+    _versions: Dict[str, Tuple[int, int, Tuple[int, int, int]]] = {}
+    _versions_lock = threading.Lock()
 
     def __init__(self) -> None:
         """Do nothing."""
@@ -19,6 +30,40 @@ class Borg:
     @property
     def version(self) -> Tuple[int, int, int]:
         """Get Borg version."""
+        path = os.path.realpath(BorgCommand.BORG_BIN)
+        stat = os.stat(path)
+
+        with self._versions_lock:
+            cached = self._versions.get(path)
+
+        if cached is not None:
+            inode, modification_time, version = cached
+
+            if inode == stat.st_ino and modification_time == stat.st_mtime_ns:
+                return version
+
+        version = self._get_version()
+
+        with self._versions_lock:
+            self._versions[path] = (stat.st_ino, stat.st_mtime_ns, version)
+
+        return version
+
+    def preload_version(self) -> None:
+        """Cache version, so that getting it later does not run a command.
+
+        Call this once, e.g. when a daemon starts.
+        """
+        self.version
+
+    @classmethod
+    def clear_version_cache(cls) -> None:
+        """Clear cached versions of all binaries."""
+        with cls._versions_lock:
+            cls._versions.clear()
+
+    def _get_version(self) -> Tuple[int, int, int]:
+        """Get Borg version by running command."""
 
         # Execute command
 
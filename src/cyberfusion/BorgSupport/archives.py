@@ -1,26 +1,39 @@
 """Classes for managing archives."""
 
-import json
 import os
 import shutil
+import sys
+from contextlib import closing
 from datetime import datetime
 from enum import Enum
-from pathlib import Path, PosixPath
-from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple, TypeVar
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 from functools import cached_property
 
-from cyberfusion.BorgSupport import PassphraseFile
 from cyberfusion.BorgSupport.borg_cli import (
     BorgCommand,
     BorgLoggedCommand,
     BorgRegularCommand,
 )
+from cyberfusion.BorgSupport.captures import ProgressCapture
 from cyberfusion.BorgSupport.exceptions import (
     PathNotExistsError,
+    RegularCommandFailedError,
     RepositoryLockedError,
 )
-from cyberfusion.BorgSupport.operations import Operation
+from cyberfusion.BorgSupport.operations import Operation, _get_archive_stats
 from cyberfusion.BorgSupport.utilities import (
     generate_random_string,
     get_md5_hash,
@@ -36,10 +49,8 @@ def archive_check_repository_not_locked(f: F) -> Any:
     """Check that repository is not locked for Archive class."""
 
     def wrapper(self: Any, *args: tuple, **kwargs: dict) -> Any:
-        if self.repository.is_locked:
-            raise RepositoryLockedError
-
-        return f(self, *args, **kwargs)
+        with self.repository._lock_check_scope():
+            return f(self, *args, **kwargs)
 
     return wrapper
 
@@ -48,14 +59,59 @@ def archive_restoration_check_repository_not_locked(f: F) -> Any:
     """Check that repository is not locked for ArchiveRestoration class."""
 
     def wrapper(self: Any, *args: tuple, **kwargs: dict) -> Any:
-        if self.archive.repository.is_locked:
-            raise RepositoryLockedError
-
-        return f(self, *args, **kwargs)
+        with self.archive.repository._lock_check_scope():
+            return f(self, *args, **kwargs)
 
     return wrapper
 
 
+def _remove_files(paths: List[str]) -> None:
+    """Remove paths that are regular files. Other paths are left untouched."""
+    for path in paths:
+        if not os.path.isfile(path):
+            continue
+
+        os.unlink(path)
+
+
+def _create_extract_destination_path(path: str) -> None:
+    """Create directory to extract to with correct permissions, if needed."""
+    if os.path.isdir(path):
+        return
+
+    os.mkdir(path)
+    os.chmod(path, 0o700)
+
+
+def _create_export_tar_destination_path(path: str) -> None:
+    """Create file to export tarball to with correct permissions."""
+    with open(path, "w"):
+        pass
+
+    os.chmod(path, 0o600)
+
+
+def _escape_shell_pattern(path: str) -> str:
+    """Escape path for use in Borg shell-style pattern ('sh:').
+
+    Wildcards are escaped by placing them in a character class.
+    """
+    return "".join(
+        f"[{character}]" if character in "*?[" else character for character in path
+    )
+
+
+def _get_not_recursive_exclude_pattern(path: str) -> str:
+    """Get Borg pattern that excludes objects more than one level below path.
+
+    Borg matches patterns against paths and their parents, so everything below
+    those objects is excluded as well.
+    """
+    prefix = _escape_shell_pattern(path) + "/" if path else ""
+
+    return f"sh:{prefix}*/*"
+
+
 class UNIXFileType(Enum):
     """UNIX file types.
 
@@ -75,6 +131,21 @@ class UNIXFileType(Enum):
     # OTHER = '?'
 
 
+_UNIX_FILE_TYPES = {type_.value: type_ for type_ in UNIXFileType}
+
+
+def _intern(value: Any) -> Any:
+    """Intern value if it is a string.
+
+    Borg uses the UID or GID as user or group if it has no name, e.g. when the
+    user was deleted.
+    """
+    if not isinstance(value, str):
+        return value
+
+    return sys.intern(value)
+
+
 class FilesystemObject:
     """Abstraction of filesystem object in archive contents.
 
@@ -90,11 +161,55 @@ class FilesystemObject:
       and therefore this attribute not returned.
     * source: we doubt the user is interested in this, and hard links should be rarely used
     * flags: we doubt the user is interested in this, and is usually 'null'
+
+    Only exposed keys are kept. The modification time is parsed when first
+    accessed, as most users of large listings don't need it.
     """
 
+    __slots__ = (
+        "_type",
+        "_symbolic_mode",
+        "_user",
+        "_group",
+        "_path",
+        "_link_target",
+        "_mtime",
+        "_modification_time",
+        "_size",
+    )
+
     def __init__(self, line: dict) -> None:
         """Set attributes."""
-        self._line = line
+        type_ = line["type"]
+
+        # Unsupported types are kept as is, so that only accessing the type fails
+
+        self._type: Union[UNIXFileType, str] = _UNIX_FILE_TYPES.get(type_, type_)
+
+        # The same modes, users and groups occur for many objects
+
+        self._symbolic_mode: str = sys.intern(line["mode"])
+        self._user: str = _intern(line["user"])
+        self._group: str = _intern(line["group"])
+        self._path: str = line["path"]
+
+        # For symlinks, 'source' and 'linktarget' both refer to the target. However,
+        # for regular files, 'source' refers to the hard link master. As by now we know
+        # we're dealing with a symlink, it doesn't matter if we use the value of 'source'
+        # or 'linktarget'.
+        #
+        # Source: https://github.com/borgbackup/borg/issues/2324#issuecomment-289253843
+
+        self._link_target: Optional[str] = (
+            line["linktarget"] if self._type is UNIXFileType.SYMBOLIC_LINK else None
+        )
+
+        self._mtime: str = line["mtime"]
+        self._modification_time: Optional[datetime] = None
+
+        self._size: Optional[int] = (
+            line["size"] if self._type is UNIXFileType.REGULAR_FILE else None
+        )
 
     @property
     def type_(self) -> UNIXFileType:
@@ -106,7 +221,18 @@ class FilesystemObject:
         * UNIXFileType.DIRECTORY
         * UNIXFileType.SYMBOLIC_LINK
         """
-        return UNIXFileType(self._line["type"])
+        if not isinstance(self._type, UNIXFileType):
+            return UNIXFileType(self._type)  # Raises ValueError
+
+        return self._type
+
+    @property
+    def _type_value(self) -> str:
+        """Get object type as Borg lists it, also if not supported (see 'type_')."""
+        if isinstance(self._type, UNIXFileType):
+            return self._type.value
+
+        return self._type
 
     @property
     def symbolic_mode(self) -> str:
@@ -115,22 +241,22 @@ class FilesystemObject:
         This method is named the way it is so that we can add conversion to other
         representations of the mode later (e.g. symbolic -> octal -> numeric).
         """
-        return self._line["mode"]
+        return self._symbolic_mode
 
     @property
     def user(self) -> str:
         """Get user."""
-        return self._line["user"]
+        return self._user
 
     @property
     def group(self) -> str:
         """Get group."""
-        return self._line["group"]
+        return self._group
 
     @property
     def path(self) -> str:
         """Get path."""
-        return self._line["path"]
+        return self._path
 
     @property
     def link_target(self) -> Optional[str]:
@@ -138,17 +264,7 @@ class FilesystemObject:
 
         If the object type is not a symlink, None is returned.
         """
-        if self.type_ != UNIXFileType.SYMBOLIC_LINK:
-            return None
-
-        # For symlinks, 'source' and 'linktarget' both refer to the target. However,
-        # for regular files, 'source' refers to the hard link master. As by now we know
-        # we're dealing with a symlink, it doesn't matter if we use the value of 'source'
-        # or 'linktarget'.
-        #
-        # Source: https://github.com/borgbackup/borg/issues/2324#issuecomment-289253843
-
-        return self._line["linktarget"]
+        return self._link_target
 
     @property
     def modification_time(self) -> datetime:
@@ -161,7 +277,10 @@ class FilesystemObject:
 
         # There is no difference between 'iso*time' and '*time' when using JSON
 
-        return datetime.strptime(self._line["mtime"], "%Y-%m-%dT%H:%M:%S.%f")
+        if self._modification_time is None:
+            self._modification_time = datetime.fromisoformat(self._mtime)
+
+        return self._modification_time
 
     @property
     def size(self) -> Optional[int]:
@@ -173,10 +292,7 @@ class FilesystemObject:
         Note that the size of the original object, and the size of the object in
         the archive may differ.
         """
-        if self.type_ != UNIXFileType.REGULAR_FILE:
-            return None
-
-        return self._line["size"]
+        return self._size
 
 
 class Archive:
@@ -188,12 +304,19 @@ class Archive:
         repository: "Repository",
         name: str,
         comment: str,
+        id_: Optional[str] = None,
     ) -> None:
-        """Set variables."""
+        """Set variables.
+
+        'id_' is the ID that Borg assigned to the archive. It is set for archives
+        returned by 'Repository.archives', and None for archives that have yet
+        to be created.
+        """
         self.repository = repository
 
         self.name = name
         self._comment = comment
+        self.id_ = id_
 
     @property
     def full_name(self) -> str:
@@ -211,71 +334,206 @@ class Archive:
         """
         return self._comment
 
-    @archive_check_repository_not_locked
+    def _get_create_arguments(
+        self, *, paths: List[str], excludes: List[str], stats: bool = False
+    ) -> List[str]:
+        """Get arguments for 'create' command."""
+        arguments = ["--one-file-system", "--comment", self.comment]
+
+        if stats:
+            arguments.append("--stats")
+
+        for exclude in excludes:
+            arguments.extend(["--exclude", exclude])
+
+        arguments.append(self.full_name)
+        arguments.extend(paths)
+
+        return arguments
+
+    def _get_extract_arguments(
+        self, *, restore_paths: List[str], strip_components: Optional[int]
+    ) -> List[str]:
+        """Get arguments for 'extract' command."""
+        arguments = []
+
+        if strip_components:
+            arguments.append(f"--strip-components={strip_components}")
+
+        arguments.append(self.full_name)
+        arguments.extend(restore_paths)
+
+        return arguments
+
+    def _get_export_tar_arguments(
+        self,
+        *,
+        destination_path: str,
+        restore_paths: List[str],
+        strip_components: int,
+    ) -> List[str]:
+        """Get arguments for 'export-tar' command."""
+        arguments = [
+            f"--strip-components={strip_components}",
+            self.full_name,
+            destination_path,
+        ]
+        arguments.extend(restore_paths)
+
+        return arguments
+
     def contents(
         self, *, path: Optional[str], recursive: bool = True
     ) -> List[FilesystemObject]:
         """Get contents of archive.
 
+        See 'iter_contents'.
+        """
+        return list(self.iter_contents(path=path, recursive=recursive))
+
+    def iter_contents(
+        self, *, path: Optional[str], recursive: bool = True
+    ) -> Iterator[FilesystemObject]:
+        """Yield contents of archive as Borg lists them.
+
         If 'path' is None, no path will be passed to Borg. As far as we are aware,
         this is equal to starting at the root, i.e. specifying '/' as path.
 
         If 'recursive' is True, all contents from the given path, including
-        those in subdirectories, are returned. This is the default behaviour
+        those in subdirectories, are yielded. This is the default behaviour
         by Borg. If 'recursive' is False, only the contents in the given path
-        and the filesystem object of that path itself are returned.
+        and the filesystem object of that path itself are yielded.
 
         Contents are filesystem objects, i.e. directories and files.
+
+        If the caller stops iterating (i.e. closes the generator), Borg is
+        terminated, so that e.g. getting the first entries doesn't require
+        listing the whole archive. PathNotExistsError is raised once Borg is
+        done if it listed nothing.
+
+        If the repository has a contents index (see 'Repository'), contents are
+        yielded from it, so that Borg doesn't list the archive again. The
+        archive is indexed first if it is not indexed yet.
         """
+        contents_index = self.repository.contents_index
 
-        # Construct arguments
+        if contents_index is None:
+            yield from self._iter_borg_contents(path=path, recursive=recursive)
 
-        arguments = ["--json-lines", self.full_name]
+            return
 
-        if path:
-            arguments.append(path)
+        # If not recursive, get the path itself and objects directly in it, i.e.
+        # with at most one path component more. The root has none.
 
-        # Execute command
+        max_depth = None
 
-        results = []
+        if path and not recursive:
+            normalized_path = os.path.normpath(path).strip(os.path.sep)
 
-        command = BorgRegularCommand()
+            max_depth = normalized_path.count(os.path.sep) + 2 if normalized_path else 1
 
-        with PassphraseFile(self.repository.passphrase) as environment:
-            command.execute(
-                command=BorgCommand.SUBCOMMAND_LIST,
-                arguments=arguments,
-                **self.repository._cli_options,
-                environment=environment,
-            )
+        has_contents = False
+
+        for filesystem_object in contents_index.iter_contents(
+            self, path=path, max_depth=max_depth
+        ):
+            has_contents = True
 
-        lines = command.stdout.splitlines()
+            yield filesystem_object
 
-        if lines == []:  # See https://github.com/borgbackup/borg/discussions/8273
+        if not has_contents:  # Like when listed by Borg
             raise PathNotExistsError
 
-        for _line in lines:
-            line = json.loads(_line)
+    def _iter_borg_contents(
+        self, *, path: Optional[str], recursive: bool = True
+    ) -> Iterator[FilesystemObject]:
+        """Yield contents of archive as Borg lists them, without using index.
+
+        See 'iter_contents'.
+        """
 
-            # If not recursive, skip if the path of this filesystem object is
-            # not the given path or directly inside the given path. Borg does
-            # not support doing this natively, see the dead end at https://mail.python.org/pipermail/borgbackup/2017q4/000928.html
+        # Construct arguments. If not recursive, Borg excludes objects more than
+        # one level below the path itself. Borg does not support listing only
+        # one level natively, see the dead end at https://mail.python.org/pipermail/borgbackup/2017q4/000928.html
 
-            if path and not recursive:
-                is_path = line["path"] == path
+        arguments = ["--json-lines"]
 
-                path_is_parent = Path(
-                    os.path.join(
-                        os.path.sep, line["path"]
-                    )  # Convert from relative to absolute for check
-                ).parent == PosixPath(os.path.join(os.path.sep, path))
+        normalized_path: Optional[str] = None  # Set if not recursive
 
-                if not path_is_parent and not is_path:
-                    continue
+        if path and not recursive:
+            normalized_path = os.path.normpath(path).strip(os.path.sep)
 
-            results.append(FilesystemObject(line))
+            prefix = normalized_path + os.path.sep if normalized_path else ""
+            depth = prefix.count(os.path.sep)
 
-        return results
+            arguments.extend(
+                ["--exclude", _get_not_recursive_exclude_pattern(normalized_path)]
+            )
+
+        arguments.append(self.full_name)
+
+        if path:
+            arguments.append(path)
+
+        # Execute command. Lines are processed as Borg writes them, so that the
+        # output is never held in memory as a whole.
+
+        has_lines = False
+
+        command = BorgRegularCommand(repository_path=self.repository.path)
+
+        # The lock check scope is only entered to probe, before Borg runs. It is
+        # not held while yielding, as other operations in this thread would then
+        # be considered nested in it while the generator is paused. For the same
+        # reason, lock timeouts are detected here rather than by the scope.
+
+        with self.repository._lock_check_scope():
+            pass
+
+        try:
+            with (
+                self.repository._passphrase_environment() as environment,
+                closing(
+                    command.execute_streaming(
+                        command=BorgCommand.SUBCOMMAND_LIST,
+                        arguments=arguments,
+                        json_lines=True,
+                        capture_stderr=self.repository._capture_stderr,
+                        **self.repository._cli_options,
+                        environment=environment,
+                    )
+                ) as lines,
+            ):
+                for line in lines:
+                    has_lines = True
+
+                    # If not recursive, skip if the path of this filesystem object is
+                    # not the given path or directly inside the given path. Borg
+                    # should have excluded those already, so this is only a cheap
+                    # safeguard.
+
+                    if normalized_path is not None:
+                        line_path = line["path"]
+
+                        is_path = line_path == normalized_path
+
+                        path_is_parent = (
+                            line_path.startswith(prefix)
+                            and line_path.count(os.path.sep) == depth
+                        )
+
+                        if not path_is_parent and not is_path:
+                            continue
+
+                    yield FilesystemObject(line)
+        except RegularCommandFailedError as e:
+            if self.repository._is_locked_error(e):
+                raise RepositoryLockedError from e
+
+            raise
+
+        if not has_lines:  # See https://github.com/borgbackup/borg/discussions/8273
+            raise PathNotExistsError
 
     @archive_check_repository_not_locked
     def create(
@@ -285,6 +543,9 @@ class Archive:
         excludes: List[str],
         working_directory: str = os.path.sep,
         remove_paths_if_file: bool = False,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+        stats: bool = False,
     ) -> Operation:
         """Create archive.
 
@@ -307,41 +568,49 @@ class Archive:
         > recursively traversing all paths specified. Paths are added to the
         > archive as they are given, that means if relative paths are desired,
         > the command has to be run from the correct directory.
-        """
 
-        # Construct arguments
+        To monitor progress while the archive is being created, pass 'line_callback'.
+        To keep only the last lines of output in memory instead of in a file,
+        pass 'capture'. See 'BorgLoggedCommand.execute'. This also applies to
+        other methods that return an operation.
 
-        arguments = ["--one-file-system", "--comment", self.comment]
+        If 'stats' is True, statistics of the created archive are set on the
+        returned operation as 'archive_stats'. Borg writes them as JSON to
+        stdout, separately from the progress lines.
+        """
 
-        for exclude in excludes:
-            arguments.extend(["--exclude", exclude])
+        # Construct arguments
 
-        arguments.append(self.full_name)
-        arguments.extend(paths)
+        arguments = self._get_create_arguments(
+            paths=paths, excludes=excludes, stats=stats
+        )
 
         # Execute command
 
-        command = BorgLoggedCommand()
+        command = BorgLoggedCommand(repository_path=self.repository.path)
 
-        with PassphraseFile(self.repository.passphrase) as environment:
+        with self.repository._passphrase_environment() as environment:
             command.execute(
                 command=BorgCommand.SUBCOMMAND_CREATE,
                 arguments=arguments,
                 working_directory=working_directory,
                 **self.repository._cli_options,
                 environment=environment,
+                line_callback=line_callback,
+                capture=capture,
+                json_format=stats,
             )
 
         # Remove paths
 
         if remove_paths_if_file:
-            for path in paths:
-                if not os.path.isfile(path):
-                    continue
+            _remove_files(paths)
 
-                os.unlink(path)
-
-        return Operation(progress_file=command.file)
+        return Operation(
+            progress_file=command.file,
+            capture=command.capture,
+            archive_stats=_get_archive_stats(command.stdout) if stats else None,
+        )
 
     @archive_check_repository_not_locked
     def extract(
@@ -350,6 +619,8 @@ class Archive:
         destination_path: str,
         restore_paths: List[str],
         strip_components: Optional[int] = None,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
     ) -> Tuple[Operation, str]:
         """Extract paths in archive to destination.
 
@@ -359,34 +630,32 @@ class Archive:
 
         # Construct arguments
 
-        arguments = []
-
-        if strip_components:
-            arguments.append(f"--strip-components={strip_components}")
-
-        arguments.append(self.full_name)
-        arguments.extend(restore_paths)
+        arguments = self._get_extract_arguments(
+            restore_paths=restore_paths, strip_components=strip_components
+        )
 
         # Create directory with correct permissions
 
-        if not os.path.isdir(destination_path):
-            os.mkdir(destination_path)
-            os.chmod(destination_path, 0o700)
+        _create_extract_destination_path(destination_path)
 
         # Execute command
 
-        command = BorgLoggedCommand()
+        command = BorgLoggedCommand(repository_path=self.repository.path)
 
-        with PassphraseFile(self.repository.passphrase) as environment:
+        with self.repository._passphrase_environment() as environment:
             command.execute(
                 command=BorgCommand.SUBCOMMAND_EXTRACT,
                 arguments=arguments,
                 working_directory=destination_path,  # Borg extracts in working directory
                 **self.repository._cli_options,
                 environment=environment,
+                line_callback=line_callback,
+                capture=capture,
             )
 
-        return Operation(progress_file=command.file), destination_path
+        return Operation(
+            progress_file=command.file, capture=command.capture
+        ), destination_path
 
     @archive_check_repository_not_locked
     def export_tar(
@@ -395,6 +664,8 @@ class Archive:
         destination_path: str,
         restore_paths: List[str],
         strip_components: int,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
     ) -> Tuple[Operation, str, str]:
         """Export archive to tarball.
 
@@ -403,34 +674,32 @@ class Archive:
 
         # Construct arguments
 
-        arguments = [
-            f"--strip-components={strip_components}",
-            self.full_name,
-            destination_path,
-        ]
-        arguments.extend(restore_paths)
+        arguments = self._get_export_tar_arguments(
+            destination_path=destination_path,
+            restore_paths=restore_paths,
+            strip_components=strip_components,
+        )
 
         # Create file with correct permissions
 
-        with open(destination_path, "w"):
-            pass
-
-        os.chmod(destination_path, 0o600)
+        _create_export_tar_destination_path(destination_path)
 
         # Execute command
 
-        command = BorgLoggedCommand()
+        command = BorgLoggedCommand(repository_path=self.repository.path)
 
-        with PassphraseFile(self.repository.passphrase) as environment:
+        with self.repository._passphrase_environment() as environment:
             command.execute(
                 command=BorgCommand.SUBCOMMAND_EXPORT_TAR,
                 arguments=arguments,
                 **self.repository._cli_options,
                 environment=environment,
+                line_callback=line_callback,
+                capture=capture,
             )
 
         return (
-            Operation(progress_file=command.file),
+            Operation(progress_file=command.file, capture=command.capture),
             destination_path,
             get_md5_hash(destination_path),
         )
@@ -0,0 +1,239 @@
+"""Classes for managing archives asynchronously."""
+
+import asyncio
+import os
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from cyberfusion.BorgSupport.archives import (
+    Archive,
+    _create_export_tar_destination_path,
+    _create_extract_destination_path,
+    _remove_files,
+)
+from cyberfusion.BorgSupport.async_borg_cli import AsyncBorgLoggedCommand
+from cyberfusion.BorgSupport.borg_cli import BorgCommand
+from cyberfusion.BorgSupport.captures import ProgressCapture
+from cyberfusion.BorgSupport.operations import Operation, _get_archive_stats
+from cyberfusion.BorgSupport.utilities import get_md5_hash
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cyberfusion.BorgSupport.async_repositories import AsyncRepository
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def async_archive_check_repository_not_locked(f: F) -> Any:
+    """Check that repository is not locked for AsyncArchive class."""
+
+    async def wrapper(self: Any, *args: tuple, **kwargs: dict) -> Any:
+        async with self.repository._lock_check_scope():
+            return await f(self, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncArchive:
+    """Abstraction of Borg archive, for use with asyncio.
+
+    See 'Archive'. The synchronous archive is available as 'archive', e.g. to
+    get contents.
+    """
+
+    def __init__(
+        self,
+        *,
+        repository: "AsyncRepository",
+        name: str,
+        comment: str,
+        id_: Optional[str] = None,
+    ) -> None:
+        """Set variables."""
+        self.repository = repository
+
+        self.archive = Archive(
+            repository=repository.repository, name=name, comment=comment, id_=id_
+        )
+
+    @property
+    def name(self) -> str:
+        """Get archive name."""
+        return self.archive.name
+
+    @property
+    def full_name(self) -> str:
+        """Get archive name with repository path."""
+        return self.archive.full_name
+
+    @property
+    def comment(self) -> str:
+        """Get archive comment."""
+        return self.archive.comment
+
+    @property
+    def id_(self) -> Optional[str]:
+        """Get archive ID."""
+        return self.archive.id_
+
+    @async_archive_check_repository_not_locked
+    async def create(
+        self,
+        *,
+        paths: List[str],
+        excludes: List[str],
+        working_directory: str = os.path.sep,
+        remove_paths_if_file: bool = False,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+        stats: bool = False,
+    ) -> Operation:
+        """Create archive.
+
+        See 'Archive.create'.
+        """
+
+        # Construct arguments
+
+        arguments = self.archive._get_create_arguments(
+            paths=paths, excludes=excludes, stats=stats
+        )
+
+        # Execute command
+
+        command = AsyncBorgLoggedCommand(repository_path=self.repository.path)
+
+        with self.repository.repository._passphrase_environment() as environment:
+            await command.execute(
+                command=BorgCommand.SUBCOMMAND_CREATE,
+                arguments=arguments,
+                working_directory=working_directory,
+                **self.repository.repository._cli_options,
+                environment=environment,
+                line_callback=line_callback,
+                capture=capture,
+                json_format=stats,
+            )
+
+        # Remove paths
+
+        if remove_paths_if_file:
+            _remove_files(paths)
+
+        # Creating an operation parses the progress file, which may be large, so
+        # don't block the event loop
+
+        return await asyncio.to_thread(
+            Operation,
+            progress_file=command.file,
+            capture=command.capture,
+            archive_stats=_get_archive_stats(command.stdout) if stats else None,
+        )
+
+    @async_archive_check_repository_not_locked
+    async def extract(
+        self,
+        *,
+        destination_path: str,
+        restore_paths: List[str],
+        strip_components: Optional[int] = None,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+    ) -> Tuple[Operation, str]:
+        """Extract paths in archive to destination.
+
+        See 'Archive.extract'.
+        """
+
+        # Construct arguments
+
+        arguments = self.archive._get_extract_arguments(
+            restore_paths=restore_paths, strip_components=strip_components
+        )
+
+        # Create directory with correct permissions
+
+        _create_extract_destination_path(destination_path)
+
+        # Execute command
+
+        command = AsyncBorgLoggedCommand(repository_path=self.repository.path)
+
+        with self.repository.repository._passphrase_environment() as environment:
+            await command.execute(
+                command=BorgCommand.SUBCOMMAND_EXTRACT,
+                arguments=arguments,
+                working_directory=destination_path,  # Borg extracts in working directory
+                **self.repository.repository._cli_options,
+                environment=environment,
+                line_callback=line_callback,
+                capture=capture,
+            )
+
+        # See 'create'
+
+        operation = await asyncio.to_thread(
+            Operation, progress_file=command.file, capture=command.capture
+        )
+
+        return operation, destination_path
+
+    @async_archive_check_repository_not_locked
+    async def export_tar(
+        self,
+        *,
+        destination_path: str,
+        restore_paths: List[str],
+        strip_components: int,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+    ) -> Tuple[Operation, str, str]:
+        """Export archive to tarball.
+
+        See 'Archive.export_tar'.
+        """
+
+        # Construct arguments
+
+        arguments = self.archive._get_export_tar_arguments(
+            destination_path=destination_path,
+            restore_paths=restore_paths,
+            strip_components=strip_components,
+        )
+
+        # Create file with correct permissions
+
+        _create_export_tar_destination_path(destination_path)
+
+        # Execute command
+
+        command = AsyncBorgLoggedCommand(repository_path=self.repository.path)
+
+        with self.repository.repository._passphrase_environment() as environment:
+            await command.execute(
+                command=BorgCommand.SUBCOMMAND_EXPORT_TAR,
+                arguments=arguments,
+                **self.repository.repository._cli_options,
+                environment=environment,
+                line_callback=line_callback,
+                capture=capture,
+            )
+
+        # Hashing a large tarball takes a while, so don't block the event loop
+
+        md5_hash = await asyncio.to_thread(get_md5_hash, destination_path)
+
+        # See 'create'
+
+        operation = await asyncio.to_thread(
+            Operation, progress_file=command.file, capture=command.capture
+        )
+
+        return operation, destination_path, md5_hash
@@ -0,0 +1,413 @@
+"""Classes for asynchronous interaction with Borg CLI.
+
+These are asyncio counterparts of the classes in 'borg_cli'. Commands are built
+in the same way, but executed with 'asyncio.create_subprocess_exec', so that a
+single event loop can drive many Borg processes at the same time.
+
+When a command is cancelled or times out, the Borg process is killed.
+"""
+
+import asyncio
+import os
+import tempfile
+from contextlib import nullcontext
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+from cyberfusion.BorgSupport import decoders
+from cyberfusion.BorgSupport.borg_cli import (
+    _get_logged_command,
+    _get_logged_command_failed_error,
+    _get_regular_command,
+)
+from cyberfusion.BorgSupport.captures import ProgressCapture
+from cyberfusion.BorgSupport.exceptions import (
+    LoggedCommandFailedError,
+    RegularCommandFailedError,
+)
+from cyberfusion.BorgSupport.observers import instrument_command
+from cyberfusion.BorgSupport.utilities import get_tmp_file
+
+T = TypeVar("T")
+
+# Maximum length of a line read from a pipe. Log lines can contain long paths,
+# so the asyncio default of 64 KiB is raised.
+
+LIMIT_LINE_LENGTH = 16 * 1024 * 1024
+
+
+async def _wait_for_process(
+    process: asyncio.subprocess.Process,
+    awaitable: Awaitable[T],
+    timeout: Optional[float],
+) -> T:
+    """Wait for process, and kill it when cancelled or timed out.
+
+    On timeout, asyncio.TimeoutError is raised.
+    """
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except BaseException:  # Includes asyncio.CancelledError
+        if process.returncode is None:
+            process.kill()
+
+            await process.wait()
+
+        raise
+
+
+class AsyncBorgRegularCommand:
+    """Abstract asynchronous Borg CLI implementation for use in scripts."""
+
+    stderr: Optional[str]
+
+    def __init__(self, *, repository_path: Optional[str] = None) -> None:
+        """Set attributes.
+
+        'repository_path' is only used to inform observers, see 'observers'.
+        """
+        self.repository_path = repository_path
+
+    async def execute(
+        self,
+        *,
+        command: Optional[str],
+        arguments: Optional[List[str]] = None,
+        json_format: bool = False,
+        identity_file_path: Optional[str] = None,
+        ssh_control_path: Optional[str] = None,
+        ssh_control_persist: Optional[int] = None,
+        environment: Optional[Dict[str, str]] = None,
+        run: bool = True,
+        capture_stderr: bool = False,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Set attributes and execute command."""
+        self.command = _get_regular_command(
+            command=command,
+            arguments=arguments,
+            json_format=json_format,
+            identity_file_path=identity_file_path,
+            ssh_control_path=ssh_control_path,
+            ssh_control_persist=ssh_control_persist,
+        )
+
+        # Execute command
+
+        if not run:
+            return
+
+        with instrument_command(
+            self.command, subcommand=command, repository_path=self.repository_path
+        ) as event:
+            process = await asyncio.create_subprocess_exec(
+                *self.command,
+                env=environment,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE if capture_stderr else None,
+            )
+
+            stdout, stderr = await _wait_for_process(
+                process, process.communicate(), timeout
+            )
+
+            event.return_code = process.returncode
+            event.stdout_bytes = len(stdout)
+            event.stderr_bytes = len(stderr) if stderr is not None else None
+
+        # Set attributes
+
+        self.stderr = stderr.decode() if stderr is not None else None
+
+        if process.returncode != 0:
+            raise RegularCommandFailedError(
+                command=self.command,
+                stderr=self.stderr,
+                return_code=process.returncode,
+            )
+
+        # Cast if JSON. Bytes are decoded directly, without decoding to text first.
+
+        if json_format:
+            self.stdout = decoders.loads(stdout)
+        else:
+            self.stdout = stdout.decode()
+
+
+class AsyncBorgLoggedCommand:
+    """Abstract asynchronous Borg CLI implementation for use in scripts, for running logged commands.
+
+    See 'BorgLoggedCommand'.
+    """
+
+    def __init__(self, *, repository_path: Optional[str] = None) -> None:
+        """Set attributes.
+
+        'repository_path' is only used to inform observers, see 'observers'.
+        """
+        self.repository_path = repository_path
+
+        self.file: Optional[str] = None
+        self.capture: Optional[ProgressCapture] = None
+        self.stdout: Optional[Any] = None
+
+    async def execute(
+        self,
+        *,
+        command: str,
+        arguments: List[str],
+        identity_file_path: Optional[str] = None,
+        ssh_control_path: Optional[str] = None,
+        ssh_control_persist: Optional[int] = None,
+        working_directory: Optional[str] = None,
+        environment: Optional[Dict[str, str]] = None,
+        run: bool = True,
+        timeout: Optional[float] = None,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+        json_format: bool = False,
+    ) -> None:
+        """Set attributes and execute command.
+
+        See 'BorgLoggedCommand.execute' for 'line_callback', 'capture' and
+        'json_format'.
+        """
+        self.command = _get_logged_command(
+            command=command,
+            arguments=arguments,
+            identity_file_path=identity_file_path,
+            ssh_control_path=ssh_control_path,
+            ssh_control_persist=ssh_control_persist,
+            json_format=json_format,
+        )
+
+        self.stdout = None
+
+        if capture is not None:
+            self.file = None
+            self.capture = capture
+
+            if not run:
+                return
+
+            with capture:
+                await self._consume_streaming(
+                    subcommand=command,
+                    working_directory=working_directory,
+                    environment=environment,
+                    output=capture,
+                    timeout=timeout,
+                    line_callback=line_callback,
+                    json_format=json_format,
+                )
+
+            return
+
+        self.file = get_tmp_file()
+        self.capture = None
+
+        # Execute command
+
+        if not run:
+            return
+
+        if line_callback is not None:
+            with open(self.file, "wb") as f:
+                await self._consume_streaming(
+                    subcommand=command,
+                    working_directory=working_directory,
+                    environment=environment,
+                    output=f,
+                    timeout=timeout,
+                    line_callback=line_callback,
+                    json_format=json_format,
+                )
+
+            return
+
+        with (
+            instrument_command(
+                self.command, subcommand=command, repository_path=self.repository_path
+            ) as event,
+            open(self.file, "w") as f,
+        ):
+            process = await asyncio.create_subprocess_exec(
+                *self.command,
+                env=environment,
+                cwd=working_directory,
+                stderr=f,  # See 'BorgLoggedCommand'
+                stdout=asyncio.subprocess.PIPE if json_format else None,
+            )
+
+            stdout, _ = await _wait_for_process(process, process.communicate(), timeout)
+
+            return_code = process.returncode
+
+            event.return_code = return_code
+            event.stderr_bytes = os.path.getsize(self.file)
+
+            if stdout is not None:
+                event.stdout_bytes = len(stdout)
+
+        if return_code != 0:
+            raise LoggedCommandFailedError(
+                command=self.command,
+                output_file_path=self.file,
+                return_code=return_code,
+            )
+
+        if json_format:
+            self.stdout = decoders.loads(stdout)
+
+    async def execute_streaming(
+        self,
+        *,
+        command: str,
+        arguments: List[str],
+        identity_file_path: Optional[str] = None,
+        ssh_control_path: Optional[str] = None,
+        ssh_control_persist: Optional[int] = None,
+        working_directory: Optional[str] = None,
+        environment: Optional[Dict[str, str]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Set attributes, execute command and yield decoded JSON lines as they are written.
+
+        See 'BorgLoggedCommand.execute_streaming'.
+        """
+        self.command = _get_logged_command(
+            command=command,
+            arguments=arguments,
+            identity_file_path=identity_file_path,
+            ssh_control_path=ssh_control_path,
+            ssh_control_persist=ssh_control_persist,
+        )
+
+        self.file = get_tmp_file()
+        self.capture = None
+
+        with open(self.file, "wb") as f:
+            async for line in self._execute_streaming(
+                subcommand=command,
+                working_directory=working_directory,
+                environment=environment,
+                output=f,
+            ):
+                yield line
+
+    async def _consume_streaming(
+        self,
+        *,
+        subcommand: str,
+        working_directory: Optional[str],
+        environment: Optional[Dict[str, str]],
+        output: Union[BinaryIO, ProgressCapture],
+        timeout: Optional[float],
+        line_callback: Optional[Callable[[Dict[str, Any]], None]],
+        json_format: bool = False,
+    ) -> None:
+        """Execute set command, and call 'line_callback' with every decoded JSON line."""
+
+        async def consume() -> None:
+            async for line in self._execute_streaming(
+                subcommand=subcommand,
+                working_directory=working_directory,
+                environment=environment,
+                output=output,
+                json_format=json_format,
+            ):
+                if line_callback is not None:
+                    line_callback(line)
+
+        # When cancelled or timed out, the generator kills the process
+
+        await asyncio.wait_for(consume(), timeout)
+
+    async def _execute_streaming(
+        self,
+        *,
+        subcommand: str,
+        working_directory: Optional[str],
+        environment: Optional[Dict[str, str]],
+        output: Union[BinaryIO, ProgressCapture],
+        json_format: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Execute set command, write lines to output, and yield decoded JSON lines as they are written.
+
+        See 'BorgLoggedCommand._execute_streaming' for 'json_format'.
+        """
+        with (
+            instrument_command(
+                self.command,
+                subcommand=subcommand,
+                repository_path=self.repository_path,
+            ) as event,
+            (
+                tempfile.TemporaryFile("w+b") if json_format else nullcontext()
+            ) as stdout_file,
+        ):
+            process = await asyncio.create_subprocess_exec(
+                *self.command,
+                env=environment,
+                cwd=working_directory,
+                stderr=asyncio.subprocess.PIPE,
+                stdout=stdout_file,  # See 'BorgLoggedCommand._execute_streaming'
+                limit=LIMIT_LINE_LENGTH,
+            )
+
+            finished = False
+            start_position = output.tell()  # Capture may be reused
+
+            try:
+                async for _line in process.stderr:  # type: ignore[union-attr]
+                    output.write(_line)
+                    output.flush()
+
+                    try:
+                        line = decoders.loads(_line)
+                    except ValueError:
+                        # Not written by Borg, e.g. by SSH
+
+                        continue
+
+                    if isinstance(output, ProgressCapture):
+                        output.count(line)
+
+                    yield line
+
+                finished = True
+            finally:
+                if not finished and process.returncode is None:
+                    process.kill()
+
+                return_code = await process.wait()
+
+                event.return_code = return_code
+                event.stderr_bytes = output.tell() - start_position
+
+            if stdout_file is not None:
+                stdout_file.seek(0)
+
+                stdout = stdout_file.read()
+
+                event.stdout_bytes = len(stdout)
+
+        if return_code != 0:
+            raise _get_logged_command_failed_error(
+                command=self.command,
+                file=self.file,
+                capture=self.capture,
+                return_code=return_code,
+            )
+
+        if stdout_file is not None:
+            self.stdout = decoders.loads(stdout)
@@ -0,0 +1,450 @@
+"""Classes for managing repositories asynchronously."""
+
+import asyncio
+import contextvars
+import time
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+    overload,
+)
+
+from cyberfusion.BorgSupport import Borg
+from cyberfusion.BorgSupport.async_archives import AsyncArchive
+from cyberfusion.BorgSupport.async_borg_cli import (
+    AsyncBorgLoggedCommand,
+    AsyncBorgRegularCommand,
+)
+from cyberfusion.BorgSupport.borg_cli import BorgCommand
+from cyberfusion.BorgSupport.captures import ProgressCapture
+from cyberfusion.BorgSupport.exceptions import (
+    ArchiveNotExistsError,
+    LoggedCommandFailedError,
+    RegularCommandFailedError,
+    RepositoryLockedError,
+)
+from cyberfusion.BorgSupport.operations import Operation
+from cyberfusion.BorgSupport.repositories import (
+    Repository,
+    _get_prune_arguments,
+    _get_pruned_archives_names,
+    _has_lock_timeout_line,
+    _is_lock_timeout_error,
+)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Depth of lock check scopes per repository (by ID of 'AsyncRepository'), see
+# 'AsyncRepository._lock_check_scope'. The dict is replaced rather than changed,
+# so that each task only sees its own scopes.
+
+_lock_check_depths: contextvars.ContextVar[Dict[int, int]] = contextvars.ContextVar(
+    "lock_check_depths", default={}
+)
+
+
+def async_check_repository_not_locked(f: F) -> Any:
+    """Check that repository is not locked."""
+
+    async def wrapper(self: Any, *args: tuple, **kwargs: dict) -> Any:
+        async with self._lock_check_scope():
+            return await f(self, *args, **kwargs)
+
+    return wrapper
+
+
+def async_compact_repository(f: F) -> Any:
+    """Run repository compact."""
+
+    async def wrapper(self: Any, *args: tuple, **kwargs: dict) -> Any:
+        result = await f(self, *args, **kwargs)
+
+        # Getting the version runs a command, so don't block the event loop
+
+        if await asyncio.to_thread(lambda: Borg().version) >= (1, 2, 0):
+            await self.compact()
+
+        return result
+
+    return wrapper
+
+
+class AsyncRepository:
+    """Abstraction of Borg repository, for use with asyncio.
+
+    Wraps a regular repository, from which the path, passphrase and CLI options
+    are used. Only operations that run Borg commands are asynchronous.
+
+    All coroutines can be cancelled, or wrapped in 'asyncio.wait_for' to apply
+    a timeout. In both cases, the Borg process is killed.
+
+    Locks are checked like for the regular repository (see 'Repository'), using
+    its 'lock_check_ttl' and 'lock_check_probe'. Nested operations are tracked
+    per task instead of per thread.
+    """
+
+    def __init__(self, *, repository: Repository) -> None:
+        """Set attributes."""
+        self.repository = repository
+
+    @property
+    def path(self) -> str:
+        """Get repository path."""
+        return self.repository.path
+
+    @property
+    def passphrase(self) -> str:
+        """Get repository passphrase."""
+        return self.repository.passphrase
+
+    async def is_locked(self) -> bool:
+        """Get if repository is locked by Borg.
+
+        See 'Repository.is_locked'.
+        """
+
+        # Construct arguments
+
+        arguments = ["--log-json", self.path, BorgCommand.TRUE_BIN]
+
+        # Execute command
+
+        command = AsyncBorgRegularCommand(repository_path=self.path)
+
+        try:
+            with self.repository._passphrase_environment() as environment:
+                await command.execute(
+                    command=BorgCommand.SUBCOMMAND_WITH_LOCK,
+                    arguments=arguments,
+                    capture_stderr=True,
+                    **self.repository._cli_options,
+                    environment=environment,
+                )
+        except RegularCommandFailedError as e:
+            if _has_lock_timeout_line(e.stderr):
+                return True
+
+        return False
+
+    @asynccontextmanager
+    async def _lock_check_scope(self) -> AsyncIterator[None]:
+        """Check that repository is not locked, once for all nested operations.
+
+        See 'Repository._lock_check_scope'.
+        """
+        depths = _lock_check_depths.get()
+
+        depth = depths.get(id(self), 0)
+
+        if depth == 0 and self.repository.lock_check_probe:
+            if not self.repository._is_lock_check_fresh:
+                if await self.is_locked():
+                    raise RepositoryLockedError
+
+                self.repository._lock_checked_at = time.monotonic()
+
+        token = _lock_check_depths.set({**depths, id(self): depth + 1})
+
+        try:
+            yield
+        except (RegularCommandFailedError, LoggedCommandFailedError) as e:
+            # Reading the output of logged commands may take a while, so don't
+            # block the event loop
+
+            if (
+                depth == 0
+                and not self.repository.lock_check_probe
+                and await asyncio.to_thread(_is_lock_timeout_error, e)
+            ):
+                raise RepositoryLockedError from e
+
+            raise
+        finally:
+            _lock_check_depths.reset(token)
+
+    async def get_archive(self, name: str) -> AsyncArchive:
+        """Get archive by name."""
+        for archive in await self.archives():
+            if archive.name != name:
+                continue
+
+            return archive
+
+        raise ArchiveNotExistsError
+
+    @async_check_repository_not_locked
+    async def archives(self) -> List[AsyncArchive]:
+        """Get archives in repository."""
+        results = []
+
+        # Construct arguments
+
+        arguments = [self.path, "--format='{comment}'"]
+
+        # Execute command
+
+        command = AsyncBorgRegularCommand(repository_path=self.path)
+
+        with self.repository._passphrase_environment() as environment:
+            await command.execute(
+                command=BorgCommand.SUBCOMMAND_LIST,
+                arguments=arguments,
+                json_format=True,
+                capture_stderr=self.repository._capture_stderr,
+                **self.repository._cli_options,
+                environment=environment,
+            )
+
+        for archive in command.stdout["archives"]:
+            results.append(
+                AsyncArchive(
+                    repository=self,
+                    name=archive["name"],
+                    comment=archive["comment"],
+                    id_=archive["id"],
+                )
+            )
+
+        return results
+
+    @async_check_repository_not_locked
+    async def check(
+        self,
+        *,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+    ) -> bool:
+        """Check repository.
+
+        Returns False in case issues were found.
+
+        See 'BorgLoggedCommand.execute' for 'line_callback' and 'capture'.
+        """
+
+        # Construct arguments
+
+        arguments = [self.path]
+
+        # Execute command
+
+        try:
+            with self.repository._passphrase_environment() as environment:
+                await AsyncBorgLoggedCommand(repository_path=self.path).execute(
+                    command=BorgCommand.SUBCOMMAND_CHECK,
+                    arguments=arguments,
+                    **self.repository._cli_options,
+                    environment=environment,
+                    line_callback=line_callback,
+                    capture=capture,
+                )
+        except LoggedCommandFailedError as e:
+            if await asyncio.to_thread(_is_lock_timeout_error, e):
+                raise RepositoryLockedError from e
+
+            return False
+
+        return True
+
+    async def _execute_maintenance_command(
+        self,
+        *,
+        command: str,
+        arguments: List[str],
+        environment: Dict[str, str],
+        progress: bool,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]],
+        capture: Optional[ProgressCapture],
+    ) -> Optional[Operation]:
+        """Execute command that doesn't log progress by default.
+
+        See 'Repository._execute_maintenance_command'.
+        """
+        if not progress:
+            await AsyncBorgRegularCommand(repository_path=self.path).execute(
+                command=command,
+                arguments=arguments,
+                capture_stderr=self.repository._capture_stderr,
+                **self.repository._cli_options,
+                environment=environment,
+            )
+
+            return None
+
+        logged_command = AsyncBorgLoggedCommand(repository_path=self.path)
+
+        await logged_command.execute(
+            command=command,
+            arguments=arguments,
+            **self.repository._cli_options,
+            environment=environment,
+            line_callback=line_callback,
+            capture=capture,
+        )
+
+        # Creating an operation parses the progress file, which may be large, so
+        # don't block the event loop
+
+        return await asyncio.to_thread(
+            Operation, progress_file=logged_command.file, capture=logged_command.capture
+        )
+
+    @overload
+    async def prune(
+        self,
+        *,
+        keep_last: Optional[int] = ...,
+        keep_hourly: Optional[int] = ...,
+        keep_daily: Optional[int] = ...,
+        keep_weekly: Optional[int] = ...,
+        keep_monthly: Optional[int] = ...,
+        keep_yearly: Optional[int] = ...,
+        progress: Literal[False] = ...,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = ...,
+        capture: Optional[ProgressCapture] = ...,
+    ) -> List[str]: ...
+
+    @overload
+    async def prune(
+        self,
+        *,
+        keep_last: Optional[int] = ...,
+        keep_hourly: Optional[int] = ...,
+        keep_daily: Optional[int] = ...,
+        keep_weekly: Optional[int] = ...,
+        keep_monthly: Optional[int] = ...,
+        keep_yearly: Optional[int] = ...,
+        progress: Literal[True],
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = ...,
+        capture: Optional[ProgressCapture] = ...,
+    ) -> Tuple[Operation, List[str]]: ...
+
+    @async_check_repository_not_locked
+    @async_compact_repository
+    async def prune(
+        self,
+        *,
+        keep_last: Optional[int] = None,
+        keep_hourly: Optional[int] = None,
+        keep_daily: Optional[int] = None,
+        keep_weekly: Optional[int] = None,
+        keep_monthly: Optional[int] = None,
+        keep_yearly: Optional[int] = None,
+        progress: bool = False,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+    ) -> Union[List[str], Tuple[Operation, List[str]]]:
+        """Prune repository archives, and return names of pruned archives.
+
+        See 'Repository.prune'.
+        """
+
+        # Get archives before prune
+
+        before_archives = await self.archives()
+        before_archives_names = [a.name for a in before_archives]
+
+        # Construct arguments
+
+        arguments = _get_prune_arguments(
+            path=self.path,
+            keep_last=keep_last,
+            keep_hourly=keep_hourly,
+            keep_daily=keep_daily,
+            keep_weekly=keep_weekly,
+            keep_monthly=keep_monthly,
+            keep_yearly=keep_yearly,
+        )
+
+        # Execute command
+
+        with self.repository._passphrase_environment() as environment:
+            operation = await self._execute_maintenance_command(
+                command=BorgCommand.SUBCOMMAND_PRUNE,
+                arguments=arguments,
+                environment=environment,
+                progress=progress,
+                line_callback=line_callback,
+                capture=capture,
+            )
+
+        # Get archives after prune
+
+        after_archives_names = [a.name for a in await self.archives()]
+
+        pruned_archives_names = _get_pruned_archives_names(
+            before_archives_names, after_archives_names
+        )
+
+        # Remove pruned archives from index. Getting the repository ID runs a
+        # command (once), and the index may be in use by another thread, so
+        # don't block the event loop.
+
+        await asyncio.to_thread(
+            self.repository._remove_archives_from_index,
+            [
+                a.id_
+                for a in before_archives
+                if a.id_ is not None and a.name in pruned_archives_names
+            ],
+        )
+
+        if operation is None:
+            return pruned_archives_names
+
+        return operation, pruned_archives_names
+
+    @overload
+    async def compact(
+        self,
+        *,
+        progress: Literal[False] = ...,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = ...,
+        capture: Optional[ProgressCapture] = ...,
+    ) -> None: ...
+
+    @overload
+    async def compact(
+        self,
+        *,
+        progress: Literal[True],
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = ...,
+        capture: Optional[ProgressCapture] = ...,
+    ) -> Operation: ...
+
+    @async_check_repository_not_locked
+    async def compact(
+        self,
+        *,
+        progress: bool = False,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+    ) -> Optional[Operation]:
+        """Compact repository.
+
+        See 'Repository.compact'.
+        """
+
+        # Construct arguments
+
+        arguments = [self.path]
+
+        # Execute command
+
+        with self.repository._passphrase_environment() as environment:
+            return await self._execute_maintenance_command(
+                command=BorgCommand.SUBCOMMAND_COMPACT,
+                arguments=arguments,
+                environment=environment,
+                progress=progress,
+                line_callback=line_callback,
+                capture=capture,
+            )
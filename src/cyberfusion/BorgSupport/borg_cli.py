@@ -3,14 +3,19 @@
 Follow 'good and preferred' order at https://borgbackup.readthedocs.io/en/stable/usage/general.html?highlight=positional#positional-arguments-and-options-order-matters
 """
 
-import json
+import os
 import subprocess
-from typing import Dict, List, Optional
+import tempfile
+from contextlib import nullcontext
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Union
 
+from cyberfusion.BorgSupport import decoders
+from cyberfusion.BorgSupport.captures import ProgressCapture
 from cyberfusion.BorgSupport.exceptions import (
     LoggedCommandFailedError,
     RegularCommandFailedError,
 )
+from cyberfusion.BorgSupport.observers import instrument_command
 from cyberfusion.BorgSupport.utilities import find_executable, get_tmp_file
 
 
@@ -32,30 +37,143 @@ class BorgCommand:
     SUBCOMMAND_EXPORT_TAR = "export-tar"
     SUBCOMMAND_WITH_LOCK = "with-lock"
     SUBCOMMAND_COMPACT = "compact"
+    SUBCOMMAND_INFO = "info"
     SUBCOMMAND_VERSION = "--version"
 
 
-def _get_rsh_argument(identity_file_path: str) -> List[str]:
+def _get_rsh_argument(
+    identity_file_path: Optional[str],
+    ssh_control_path: Optional[str] = None,
+    ssh_control_persist: Optional[int] = None,
+) -> List[str]:
     """Get value of '--rsh' argument for Borg CLI commands.
 
     When connecting over SSH, set:
 
     - BatchMode (see https://borgbackup.readthedocs.io/en/stable/usage/notes.html?highlight=borg%20serve#ssh-batch-mode)
     - StrictHostKeyChecking, as host is unknown on first run, so non-interactive scripts would block otherwise
-    - Path to identity file
+    - Path to identity file, if any
+    - Control path, if any. The first connection starts a master, which is reused
+      by later connections, so that they don't need an SSH handshake. The master
+      exits after being idle for 'ssh_control_persist' seconds.
     """
-    return [
-        "--rsh",
-        f"ssh -oBatchMode=yes -oStrictHostKeyChecking=no -i {identity_file_path}",
+    rsh = "ssh -oBatchMode=yes -oStrictHostKeyChecking=no"
+
+    if identity_file_path:
+        rsh += f" -i {identity_file_path}"
+
+    if ssh_control_path:
+        rsh += (
+            f" -oControlMaster=auto -oControlPath={ssh_control_path}"
+            f" -oControlPersist={ssh_control_persist}"
+        )
+
+    return ["--rsh", rsh]
+
+
+def _get_regular_command(
+    *,
+    command: Optional[str],
+    arguments: Optional[List[str]],
+    json_format: bool,
+    identity_file_path: Optional[str],
+    ssh_control_path: Optional[str] = None,
+    ssh_control_persist: Optional[int] = None,
+) -> List[str]:
+    """Get command for regular Borg CLI commands."""
+    result = [BorgCommand.BORG_BIN]
+
+    # Add command
+
+    if command is not None:
+        result.append(command)
+
+    # Add --json if JSON
+
+    if json_format:
+        result.append("--json")
+
+    # Add arguments
+
+    if identity_file_path or ssh_control_path:
+        result.extend(
+            _get_rsh_argument(identity_file_path, ssh_control_path, ssh_control_persist)
+        )
+
+    if arguments is not None:
+        result.extend(arguments)
+
+    return result
+
+
+def _get_logged_command(
+    *,
+    command: str,
+    arguments: List[str],
+    identity_file_path: Optional[str],
+    ssh_control_path: Optional[str] = None,
+    ssh_control_persist: Optional[int] = None,
+    json_format: bool = False,
+) -> List[str]:
+    """Get command for logged Borg CLI commands."""
+    result = [
+        BorgCommand.BORG_BIN,
+        "--progress",
+        "--log-json",
+        command,
     ]
 
+    # Add --json if JSON
+
+    if json_format:
+        result.append("--json")
+
+    # Add arguments
+
+    if identity_file_path or ssh_control_path:
+        result.extend(
+            _get_rsh_argument(identity_file_path, ssh_control_path, ssh_control_persist)
+        )
+
+    result.extend(arguments)
+
+    return result
+
+
+def _get_logged_command_failed_error(
+    *,
+    command: List[str],
+    file: Optional[str],
+    capture: Optional[ProgressCapture],
+    return_code: int,
+) -> LoggedCommandFailedError:
+    """Get exception for failed logged command, with output of file or capture."""
+    if capture is not None:
+        return LoggedCommandFailedError(
+            command=command,
+            output_file_path=capture.spill_path,
+            return_code=return_code,
+            output=capture.get_output(),
+        )
+
+    return LoggedCommandFailedError(
+        command=command,
+        output_file_path=file,
+        return_code=return_code,
+    )
+
 
 class BorgRegularCommand:
     """Abstract Borg CLI implementation for use in scripts."""
 
-    def __init__(self) -> None:
-        """Do nothing."""
-        pass
+    stderr: Optional[str]
+
+    def __init__(self, *, repository_path: Optional[str] = None) -> None:
+        """Set attributes.
+
+        'repository_path' is only used to inform observers, see 'observers'.
+        """
+        self.repository_path = repository_path
 
     def execute(
         self,
@@ -64,61 +182,159 @@ class BorgRegularCommand:
         arguments: Optional[List[str]] = None,
         json_format: bool = False,
         identity_file_path: Optional[str] = None,
+        ssh_control_path: Optional[str] = None,
+        ssh_control_persist: Optional[int] = None,
         environment: Optional[Dict[str, str]] = None,
         run: bool = True,
         capture_stderr: bool = False,
     ) -> None:
         """Set attributes and execute command."""
-        self.command = [BorgCommand.BORG_BIN]
+        self.command = _get_regular_command(
+            command=command,
+            arguments=arguments,
+            json_format=json_format,
+            identity_file_path=identity_file_path,
+            ssh_control_path=ssh_control_path,
+            ssh_control_persist=ssh_control_persist,
+        )
 
-        # Add command
+        # Execute command
 
-        if command is not None:
-            self.command.append(command)
+        if not run:
+            return
 
-        # Add --json if JSON
+        with instrument_command(
+            self.command, subcommand=command, repository_path=self.repository_path
+        ) as event:
+            try:
+                output = subprocess.run(
+                    self.command,
+                    env=environment,
+                    check=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE if capture_stderr else None,
+                )
+            except subprocess.CalledProcessError as e:
+                event.return_code = e.returncode
+                event.stdout_bytes = len(e.stdout)
+                event.stderr_bytes = len(e.stderr) if e.stderr is not None else None
 
-        if json_format:
-            self.command.append("--json")
+                raise RegularCommandFailedError(
+                    command=self.command,
+                    stderr=e.stderr.decode() if e.stderr is not None else None,
+                    return_code=e.returncode,
+                )
 
-        # Add arguments
+            event.return_code = output.returncode
+            event.stdout_bytes = len(output.stdout)
+            event.stderr_bytes = (
+                len(output.stderr) if output.stderr is not None else None
+            )
 
-        if identity_file_path:
-            self.command.extend(_get_rsh_argument(identity_file_path))
+        # Set attributes
 
-        if arguments is not None:
-            self.command.extend(arguments)
+        self.stderr = output.stderr.decode() if output.stderr is not None else None
 
-        # Execute command
+        # Cast if JSON. Bytes are decoded directly, without decoding to text first.
 
-        if not run:
-            return
+        if json_format:
+            self.stdout = decoders.loads(output.stdout)
+        else:
+            self.stdout = output.stdout.decode()
 
-        try:
-            output = subprocess.run(
+    def execute_streaming(
+        self,
+        *,
+        command: Optional[str],
+        arguments: Optional[List[str]] = None,
+        json_lines: bool = False,
+        identity_file_path: Optional[str] = None,
+        ssh_control_path: Optional[str] = None,
+        ssh_control_persist: Optional[int] = None,
+        environment: Optional[Dict[str, str]] = None,
+        capture_stderr: bool = False,
+    ) -> Iterator[Any]:
+        """Set attributes, execute command and yield stdout lines as they are written.
+
+        Unlike 'execute', stdout is never held in memory as a whole, so memory
+        usage does not depend on the size of the output. Lines are yielded
+        without trailing newline. If 'json_lines' is True, every line is decoded
+        as JSON (use with Borg's '--json-lines' option).
+
+        If the caller stops iterating before all lines were yielded, the command
+        is terminated. RegularCommandFailedError is raised once stdout is exhausted
+        if the command failed.
+        """
+        self.command = _get_regular_command(
+            command=command,
+            arguments=arguments,
+            json_format=False,
+            identity_file_path=identity_file_path,
+            ssh_control_path=ssh_control_path,
+            ssh_control_persist=ssh_control_persist,
+        )
+
+        self.stderr = None
+
+        # Stderr is written to a file rather than a pipe, as a pipe could fill up
+        # while we're only reading stdout, which would block Borg
+
+        with (
+            instrument_command(
+                self.command, subcommand=command, repository_path=self.repository_path
+            ) as event,
+            (
+                tempfile.TemporaryFile("w+b") if capture_stderr else nullcontext()
+            ) as stderr_file,
+        ):
+            process = subprocess.Popen(
                 self.command,
                 env=environment,
-                check=True,
                 stdout=subprocess.PIPE,
-                text=True,
-                stderr=subprocess.PIPE if capture_stderr else None,
-            )
-        except subprocess.CalledProcessError as e:
-            raise RegularCommandFailedError(
-                command=self.command,
-                stderr=e.stderr,
-                return_code=e.returncode,
+                stderr=stderr_file,
             )
 
-        # Set attributes
+            finished = False
+            stdout_bytes = 0
 
-        self.stdout = output.stdout
-        self.stderr = output.stderr
+            try:
+                for _line in process.stdout:  # type: ignore[union-attr]
+                    stdout_bytes += len(_line)
 
-        # Cast if JSON
+                    if json_lines:
+                        yield decoders.loads(_line)
+                    else:
+                        yield _line.decode().rstrip("\n")
 
-        if json_format:
-            self.stdout = json.loads(self.stdout)
+                finished = True
+            finally:
+                if not finished:
+                    process.kill()
+
+                process.stdout.close()  # type: ignore[union-attr]
+
+                return_code = process.wait()
+
+                event.return_code = return_code
+                event.stdout_bytes = stdout_bytes
+
+            # Set attributes
+
+            if stderr_file is not None:
+                stderr_file.seek(0)
+
+                stderr = stderr_file.read()
+
+                self.stderr = stderr.decode()
+
+                event.stderr_bytes = len(stderr)
+
+        if return_code != 0:
+            raise RegularCommandFailedError(
+                command=self.command,
+                stderr=self.stderr,
+                return_code=return_code,
+            )
 
 
 class BorgLoggedCommand:
@@ -129,9 +345,16 @@ class BorgLoggedCommand:
     commands that should be run in this way.
     """
 
-    def __init__(self) -> None:
-        """Do nothing."""
-        pass
+    def __init__(self, *, repository_path: Optional[str] = None) -> None:
+        """Set attributes.
+
+        'repository_path' is only used to inform observers, see 'observers'.
+        """
+        self.repository_path = repository_path
+
+        self.file: Optional[str] = None
+        self.capture: Optional[ProgressCapture] = None
+        self.stdout: Optional[Any] = None
 
     def execute(
         self,
@@ -139,49 +362,235 @@ class BorgLoggedCommand:
         command: str,
         arguments: List[str],
         identity_file_path: Optional[str] = None,
+        ssh_control_path: Optional[str] = None,
+        ssh_control_persist: Optional[int] = None,
         working_directory: Optional[str] = None,
         environment: Optional[Dict[str, str]] = None,
         run: bool = True,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+        json_format: bool = False,
     ) -> None:
-        """Set attributes and execute command."""
-        self.command = [
-            BorgCommand.BORG_BIN,
-            "--progress",
-            "--log-json",
-            command,
-        ]
+        """Set attributes and execute command.
+
+        If 'line_callback' is set, it is called with every decoded JSON line as
+        soon as Borg writes it, e.g. to monitor progress while the command runs.
+
+        Lines are written to 'file', unless 'capture' is set. In that case, lines
+        are written to the capture, and 'file' is None. See 'ProgressCapture'.
+
+        If 'json_format' is True, '--json' is passed, and the JSON that Borg
+        writes to stdout is decoded to 'stdout'. Otherwise, stdout is not
+        captured, and 'stdout' is None.
+        """
+        self.command = _get_logged_command(
+            command=command,
+            arguments=arguments,
+            identity_file_path=identity_file_path,
+            ssh_control_path=ssh_control_path,
+            ssh_control_persist=ssh_control_persist,
+            json_format=json_format,
+        )
+
+        self.stdout = None
+
+        if capture is not None:
+            self.file = None
+            self.capture = capture
+
+            if not run:
+                return
+
+            with capture:
+                for line in self._execute_streaming(
+                    subcommand=command,
+                    working_directory=working_directory,
+                    environment=environment,
+                    output=capture,
+                    json_format=json_format,
+                ):
+                    if line_callback is not None:
+                        line_callback(line)
 
-        self.file = get_tmp_file()
-
-        # Add arguments
-
-        if identity_file_path:
-            self.command.extend(_get_rsh_argument(identity_file_path))
+            return
 
-        self.command.extend(arguments)
+        self.file = get_tmp_file()
+        self.capture = None
 
         # Execute command
 
         if not run:
             return
 
+        if line_callback is not None:
+            with open(self.file, "wb") as f:
+                for line in self._execute_streaming(
+                    subcommand=command,
+                    working_directory=working_directory,
+                    environment=environment,
+                    output=f,
+                    json_format=json_format,
+                ):
+                    line_callback(line)
+
+            return
+
         # Execute command
 
-        with open(self.file, "w") as f:
+        with (
+            instrument_command(
+                self.command, subcommand=command, repository_path=self.repository_path
+            ) as event,
+            open(self.file, "w") as f,
+        ):
+            output = subprocess.run(
+                self.command,
+                env=environment,
+                cwd=working_directory,
+                # Write to file so that callers can pass this to 'Operation'
+                # as 'progress_file'. Also, stderr should be written to file
+                # as output can be extremely large, mostly with SUBCOMMAND_CHECK.
+                stderr=f,
+                stdout=subprocess.PIPE if json_format else None,
+            )
+
+            event.return_code = output.returncode
+            event.stderr_bytes = os.path.getsize(self.file)
+
+            if output.stdout is not None:
+                event.stdout_bytes = len(output.stdout)
+
+        if output.returncode != 0:
+            raise LoggedCommandFailedError(
+                command=self.command,
+                output_file_path=self.file,
+                return_code=output.returncode,
+            )
+
+        if json_format:
+            self.stdout = decoders.loads(output.stdout)
+
+    def execute_streaming(
+        self,
+        *,
+        command: str,
+        arguments: List[str],
+        identity_file_path: Optional[str] = None,
+        ssh_control_path: Optional[str] = None,
+        ssh_control_persist: Optional[int] = None,
+        working_directory: Optional[str] = None,
+        environment: Optional[Dict[str, str]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Set attributes, execute command and yield decoded JSON lines as they are written.
+
+        Lines are also written to 'file', so that it can be passed to 'Operation'
+        as before. If the caller stops iterating before all lines were yielded,
+        the command is terminated.
+        """
+        self.command = _get_logged_command(
+            command=command,
+            arguments=arguments,
+            identity_file_path=identity_file_path,
+            ssh_control_path=ssh_control_path,
+            ssh_control_persist=ssh_control_persist,
+        )
+
+        self.file = get_tmp_file()
+        self.capture = None
+
+        with open(self.file, "wb") as f:
+            yield from self._execute_streaming(
+                subcommand=command,
+                working_directory=working_directory,
+                environment=environment,
+                output=f,
+            )
+
+    def _execute_streaming(
+        self,
+        *,
+        subcommand: str,
+        working_directory: Optional[str],
+        environment: Optional[Dict[str, str]],
+        output: Union[BinaryIO, ProgressCapture],
+        json_format: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        """Execute set command, write lines to output, and yield decoded JSON lines as they are written.
+
+        If 'json_format' is True, stdout is decoded to 'stdout' once the command
+        succeeded.
+        """
+
+        # Stdout is written to a file rather than a pipe, as a pipe could fill up
+        # while we're only reading stderr, which would block Borg
+
+        with (
+            instrument_command(
+                self.command,
+                subcommand=subcommand,
+                repository_path=self.repository_path,
+            ) as event,
+            (
+                tempfile.TemporaryFile("w+b") if json_format else nullcontext()
+            ) as stdout_file,
+        ):
+            process = subprocess.Popen(
+                self.command,
+                env=environment,
+                cwd=working_directory,
+                stderr=subprocess.PIPE,
+                stdout=stdout_file,
+            )
+
+            finished = False
+            start_position = output.tell()  # Capture may be reused
+
             try:
-                subprocess.run(
-                    self.command,
-                    env=environment,
-                    cwd=working_directory,
-                    check=True,
-                    # Write to file so that callers can pass this to 'Operation'
-                    # as 'progress_file'. Also, stderr should be written to file
-                    # as output can be extremely large, mostly with SUBCOMMAND_CHECK.
-                    stderr=f,
-                )
-            except subprocess.CalledProcessError as e:
-                raise LoggedCommandFailedError(
-                    command=self.command,
-                    output_file_path=self.file,
-                    return_code=e.returncode,
-                )
+                for _line in process.stderr:  # type: ignore[union-attr]
+                    # Flush every line, so that the file is up-to-date for
+                    # anyone reading it while the command runs
+
+                    output.write(_line)
+                    output.flush()
+
+                    try:
+                        line = decoders.loads(_line)
+                    except ValueError:
+                        # Not written by Borg, e.g. by SSH
+
+                        continue
+
+                    if isinstance(output, ProgressCapture):
+                        output.count(line)
+
+                    yield line
+
+                finished = True
+            finally:
+                if not finished:
+                    process.kill()
+
+                process.stderr.close()  # type: ignore[union-attr]
+
+                return_code = process.wait()
+
+                event.return_code = return_code
+                event.stderr_bytes = output.tell() - start_position
+
+            if stdout_file is not None:
+                stdout_file.seek(0)
+
+                stdout = stdout_file.read()
+
+                event.stdout_bytes = len(stdout)
+
+        if return_code != 0:
+            raise _get_logged_command_failed_error(
+                command=self.command,
+                file=self.file,
+                capture=self.capture,
+                return_code=return_code,
+            )
+
+        if stdout_file is not None:
+            self.stdout = decoders.loads(stdout)
@@ -0,0 +1,135 @@
+"""Classes for capturing output of logged commands in memory.
+
+By default, logged commands write all output to a file, see 'BorgLoggedCommand'.
+Output can be huge (mostly of 'check'), and the files are not deleted. Pass a
+'ProgressCapture' to keep only the last lines in memory instead.
+"""
+
+import gzip
+from collections import Counter, deque
+from types import TracebackType
+from typing import Any, Deque, Iterator, List, Optional, Tuple, Type
+
+DEFAULT_MAX_LINES = 1000
+
+
+class ProgressCapture:
+    """Keep last lines of output of logged command in a ring buffer.
+
+    At most 'max_lines' lines and/or 'max_bytes' bytes are kept. The last line
+    is always kept, even if it is larger than 'max_bytes'. Lines are counted per
+    type and message ID (see 'JSONLineType' and 'MessageID' in 'operations'),
+    including lines that are no longer kept.
+
+    If 'spill_path' is set, all lines are also written to it, gzip-compressed.
+    The spill file is appended to, and complete once the command ended.
+
+    A capture may be used for multiple commands. Pass it to 'Operation' as
+    'capture' to parse the kept lines.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_lines: Optional[int] = DEFAULT_MAX_LINES,
+        max_bytes: Optional[int] = None,
+        spill_path: Optional[str] = None,
+    ) -> None:
+        """Set attributes."""
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+
+        self.lines: Deque[bytes] = deque(maxlen=max_lines)
+        self.size = 0  # Of kept lines
+
+        self.total_lines = 0
+        self.total_bytes = 0
+
+        self.counts_by_type: Counter = Counter()
+        self.counts_by_msgid: Counter = Counter()
+
+        self._spill_file: Optional[gzip.GzipFile] = None
+
+    def __enter__(self) -> "ProgressCapture":
+        """Open spill file."""
+        if self.spill_path is not None:
+            self._spill_file = gzip.open(self.spill_path, "ab")
+
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close spill file."""
+        if self._spill_file is not None:
+            self._spill_file.close()
+
+            self._spill_file = None
+
+    def write(self, _line: bytes) -> None:
+        """Add raw line, including trailing newline."""
+        _line = _line.rstrip(b"\n")
+
+        if self._spill_file is not None:
+            self._spill_file.write(_line + b"\n")
+
+        if len(self.lines) == self.lines.maxlen:
+            self.size -= len(self.lines[0])
+
+        self.lines.append(_line)
+
+        self.size += len(_line)
+        self.total_lines += 1
+        self.total_bytes += len(_line) + 1
+
+        if self.max_bytes is not None:
+            while self.size > self.max_bytes and len(self.lines) > 1:
+                self.size -= len(self.lines.popleft())
+
+    def flush(self) -> None:
+        """Do nothing.
+
+        Kept lines are always up-to-date. The spill file is not flushed for
+        every line, as that would impair compression.
+        """
+        pass
+
+    def tell(self) -> int:
+        """Get amount of bytes written."""
+        return self.total_bytes
+
+    def count(self, line: Any) -> None:
+        """Count decoded line by type and message ID."""
+        if not isinstance(line, dict):
+            return
+
+        self.counts_by_type[line.get("type")] += 1
+
+        msgid = line.get("msgid")
+
+        if msgid is not None:
+            self.counts_by_msgid[msgid] += 1
+
+    def get_lines_since(self, total_lines: int) -> Tuple[List[bytes], int]:
+        """Get kept lines added after 'total_lines' lines, and the current total.
+
+        Lines that are no longer kept are missing.
+        """
+        new_lines = min(self.total_lines - total_lines, len(self.lines))
+
+        if new_lines <= 0:
+            return [], self.total_lines
+
+        return list(self.lines)[-new_lines:], self.total_lines
+
+    def iter_lines_reversed(self) -> Iterator[bytes]:
+        """Yield kept lines from last to first."""
+        return reversed(self.lines)
+
+    def get_output(self) -> str:
+        """Get kept lines as text."""
+        return "\n".join(_line.decode(errors="replace") for _line in self.lines)
@@ -0,0 +1,93 @@
+"""JSON decoding of Borg output.
+
+Decoding JSON is the main CPU cost of parsing Borg output, e.g. a line per file
+when listing archive contents. All output is decoded by 'loads', which uses the
+fastest available backend: orjson, msgspec, or the standard library. The faster
+backends are optional dependencies.
+
+'loads' accepts bytes, so that output doesn't have to be decoded to text first.
+It raises ValueError for invalid JSON, regardless of the backend.
+"""
+
+import json
+from typing import Any, Callable, List, Optional, Union
+
+BACKEND_ORJSON = "orjson"
+BACKEND_MSGSPEC = "msgspec"
+BACKEND_STDLIB = "json"
+
+# In order of preference
+
+BACKENDS = (BACKEND_ORJSON, BACKEND_MSGSPEC, BACKEND_STDLIB)
+
+Loads = Callable[[Union[str, bytes]], Any]
+
+
+def _get_loads(backend: str) -> Loads:
+    """Get decode function of backend.
+
+    Raises ImportError if the backend is not installed.
+    """
+    if backend == BACKEND_ORJSON:
+        import orjson
+
+        return orjson.loads
+
+    if backend == BACKEND_MSGSPEC:
+        import msgspec
+
+        decoder = msgspec.json.Decoder()
+
+        def loads(data: Union[str, bytes]) -> Any:
+            """Decode JSON, raising ValueError like the other backends."""
+            try:
+                return decoder.decode(data)
+            except msgspec.DecodeError as e:
+                raise ValueError(str(e)) from e
+
+        return loads
+
+    if backend == BACKEND_STDLIB:
+        return json.loads
+
+    raise ValueError(f"Unknown JSON backend '{backend}'")
+
+
+def get_available_backends() -> List[str]:
+    """Get installed backends, in order of preference."""
+    backends = []
+
+    for backend in BACKENDS:
+        try:
+            _get_loads(backend)
+        except ImportError:
+            continue
+
+        backends.append(backend)
+
+    return backends
+
+
+def get_backend() -> str:
+    """Get backend used by 'loads'."""
+    return _backend
+
+
+def set_backend(backend: Optional[str] = None) -> None:
+    """Set backend used by 'loads'. If None, the fastest available backend is used.
+
+    Raises ImportError if the backend is not installed.
+    """
+    global _backend, loads
+
+    if backend is None:
+        backend = get_available_backends()[0]
+
+    loads = _get_loads(backend)
+    _backend = backend
+
+
+_backend: str
+loads: Loads
+
+set_backend()
@@ -1,7 +1,7 @@
 """Exceptions."""
 
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 
 class RepositoryLockedError(Exception):
@@ -39,12 +39,20 @@ class CommandFailedError(Exception):
 
 @dataclass
 class LoggedCommandFailedError(CommandFailedError):
-    """Logged command failed."""
+    """Logged command failed.
 
-    output_file_path: str
+    If output was captured (see 'ProgressCapture'), 'output' contains the kept
+    lines, and 'output_file_path' is the spill file, if any.
+    """
+
+    output_file_path: Optional[str]
+    output: Optional[str] = None
 
     def __str__(self) -> str:
         """Get string representation."""
+        if self.output is not None:
+            return f"Command '{self.command}' failed with RC {self.return_code}. Last output:\n\n{self.output}"
+
         return f"Command '{self.command}' failed with RC {self.return_code}. Output was logged to {self.output_file_path}"
 
 
@@ -59,6 +67,16 @@ class RegularCommandFailedError(CommandFailedError):
         return f"Command '{self.command}' failed with RC {self.return_code}. Stderr:\n\n{self.stderr}"
 
 
+@dataclass
+class DirectoryNotPrivateError(Exception):
+    """Directory is not private to the current user.
+
+    It may be a symlink, be owned by another user, or be accessible by others.
+    """
+
+    path: str
+
+
 class PathNotExistsError(Exception):
     """Path doesn't exist."""
 
@@ -0,0 +1,200 @@
+"""Classes for running operations on many repositories."""
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+from urllib.parse import urlparse
+
+from cyberfusion.BorgSupport.repositories import Repository
+
+DEFAULT_MAX_WORKERS = 8
+
+
+@dataclass
+class FleetResult:
+    """Result of operation on repository in fleet."""
+
+    repository: Repository
+    result: Any
+    exception: Optional[BaseException]
+    duration: float
+
+    @property
+    def succeeded(self) -> bool:
+        """Get if operation did not raise an exception."""
+        return self.exception is None
+
+
+class RepositoryFleet:
+    """Run operation on many repositories concurrently.
+
+    Example:
+
+    >>> fleet = RepositoryFleet(repositories, max_workers=32, max_workers_per_host=4)
+    >>> for result in fleet.run(lambda repository: repository.check()):
+    ...     print(result.repository.path, result.result, result.exception)
+    """
+
+    def __init__(
+        self,
+        repositories: List[Repository],
+        *,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_workers_per_host: Optional[int] = None,
+        expected_duration: Optional[Callable[[Repository], float]] = None,
+    ) -> None:
+        """Set attributes.
+
+        At most 'max_workers' operations run at the same time. If
+        'max_workers_per_host' is set, at most that many operations run at the
+        same time on repositories on the same remote host. Local repositories
+        are only limited by 'max_workers'.
+
+        If 'expected_duration' is set, operations on repositories with the
+        longest expected duration (in seconds) are started first, so that a
+        long operation does not start last and delay the whole run. Otherwise,
+        operations are started in the order of 'repositories'.
+        """
+        self.repositories = repositories
+        self.max_workers = max_workers
+        self.max_workers_per_host = max_workers_per_host
+        self.expected_duration = expected_duration
+
+    @staticmethod
+    def _get_host(repository: Repository) -> Optional[str]:
+        """Get host of repository, or None if local."""
+        if not repository._is_remote:
+            return None
+
+        return urlparse(repository.path).hostname
+
+    @staticmethod
+    def _run_operation(
+        operation: Callable[[Repository], Any], repository: Repository
+    ) -> FleetResult:
+        """Run operation on repository, and return result or exception.
+
+        All exceptions are caught (including e.g. SystemExit), so that the run
+        continues.
+        """
+        start_time = time.monotonic()
+
+        try:
+            result = operation(repository)
+        except BaseException as e:
+            return FleetResult(
+                repository=repository,
+                result=None,
+                exception=e,
+                duration=time.monotonic() - start_time,
+            )
+
+        return FleetResult(
+            repository=repository,
+            result=result,
+            exception=None,
+            duration=time.monotonic() - start_time,
+        )
+
+    def run(self, operation: Callable[[Repository], Any]) -> List[FleetResult]:
+        """Run operation on all repositories.
+
+        'operation' is called with the repository as only argument. Exceptions
+        raised by it, or by getting the host or expected duration of the
+        repository, don't stop the run, but are returned in the result.
+
+        Results are returned in the order of 'repositories'.
+        """
+        results: List[Optional[FleetResult]] = [None] * len(self.repositories)
+
+        # Get host and expected duration of every repository. If that fails
+        # (e.g. because the path is invalid), the exception is the result of the
+        # repository, and the operation is not run on it.
+
+        hosts: List[Optional[str]] = [None] * len(self.repositories)
+        expected_durations = [0.0] * len(self.repositories)
+
+        pending = []
+
+        for index, repository in enumerate(self.repositories):
+            try:
+                hosts[index] = self._get_host(repository)
+
+                if self.expected_duration is not None:
+                    expected_durations[index] = self.expected_duration(repository)
+            except Exception as e:
+                results[index] = FleetResult(
+                    repository=repository, result=None, exception=e, duration=0.0
+                )
+
+                continue
+
+            pending.append(index)
+
+        pending.sort(key=lambda i: -expected_durations[i])  # Stable
+
+        running_per_host: Counter = Counter()
+        running = 0
+
+        # The callback of a future that is already done runs in the thread that
+        # adds it, while holding the condition. So the lock must be reentrant.
+
+        condition = threading.Condition(threading.RLock())
+
+        def get_next_index() -> Optional[int]:
+            """Get first pending repository of which the host has capacity left."""
+            for position, index in enumerate(pending):
+                host = hosts[index]
+
+                if (
+                    host is not None
+                    and self.max_workers_per_host is not None
+                    and running_per_host[host] >= self.max_workers_per_host
+                ):
+                    continue
+
+                return pending.pop(position)
+
+            return None
+
+        def finish(index: int, host: Optional[str], future: Future) -> None:
+            """Store result, and free capacity."""
+            nonlocal running
+
+            with condition:
+                try:
+                    results[index] = future.result()
+                finally:
+                    running -= 1
+                    running_per_host[host] -= 1
+
+                    condition.notify()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            with condition:
+                while pending or running:
+                    next_index = (
+                        get_next_index() if running < self.max_workers else None
+                    )
+
+                    if next_index is None:
+                        condition.wait()
+
+                        continue
+
+                    repository = self.repositories[next_index]
+                    host = hosts[next_index]
+
+                    running += 1
+                    running_per_host[host] += 1
+
+                    future = executor.submit(self._run_operation, operation, repository)
+
+                    future.add_done_callback(
+                        lambda f, i=next_index, h=host: finish(i, h, f)  # type: ignore[misc]
+                    )
+
+        return [r for r in results if r is not None]
@@ -0,0 +1,361 @@
+"""Classes for indexing archive contents on disk.
+
+Archives never change once created, but listing an archive requires Borg to
+decrypt it, which is slow (especially for remote repositories). An index lists
+every archive once, stores its contents in an SQLite database, and answers
+later queries from it. If the index is set on the repository (see
+'Repository'), 'Archive.contents' uses it as well.
+
+Archives are identified by the ID of their repository and their own ID (see
+'Repository.id_' and 'Archive.id_'), so that an index may be shared by
+repositories. Entries of archives are removed when the archives are pruned, or
+when their repository is deleted, if the index is set on the repository (see
+'Repository').
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple, cast
+
+from cyberfusion.BorgSupport.archives import (
+    Archive,
+    FilesystemObject,
+    UNIXFileType,
+)
+from cyberfusion.BorgSupport.exceptions import PathNotExistsError
+
+# Amount of rows per 'executemany' call when indexing
+
+SIZE_INSERT_BATCH = 10_000
+
+# Amount of rows per fetch when iterating contents. The database is not used by
+# other threads while fetching.
+
+SIZE_FETCH_BATCH = 10_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY,
+    repository_id TEXT NOT NULL,
+    archive_id TEXT NOT NULL,
+    UNIQUE (repository_id, archive_id)
+);
+
+CREATE TABLE IF NOT EXISTS contents (
+    archive INTEGER NOT NULL REFERENCES archives (id),
+    path TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    user TEXT NOT NULL,
+    "group" TEXT NOT NULL,
+    link_target TEXT,
+    mtime TEXT NOT NULL,
+    size INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS contents_path ON contents (archive, path);
+
+CREATE INDEX IF NOT EXISTS contents_depth ON contents (archive, depth, path);
+"""
+
+_COLUMNS = 'path, depth, type, mode, user, "group", link_target, mtime, size'
+
+_Row = Tuple[str, int, str, str, str, str, Optional[str], str, Optional[int]]
+
+
+def _get_depth(path: str) -> int:
+    """Get amount of components of path in archive, e.g. 2 for 'home/example'."""
+    return path.count(os.path.sep) + 1
+
+
+def _get_mtime(value: datetime) -> str:
+    """Get modification time in the format that Borg uses, which sorts chronologically."""
+    return value.isoformat(timespec="microseconds")
+
+
+def _get_row(filesystem_object: FilesystemObject) -> _Row:
+    """Get row from filesystem object."""
+    return (
+        filesystem_object.path,
+        _get_depth(filesystem_object.path),
+        filesystem_object._type_value,  # Unsupported types are indexed as well
+        filesystem_object.symbolic_mode,
+        filesystem_object.user,
+        filesystem_object.group,
+        filesystem_object.link_target,
+        _get_mtime(filesystem_object.modification_time),
+        filesystem_object.size,
+    )
+
+
+def _get_filesystem_object(row: _Row) -> FilesystemObject:
+    """Get filesystem object from row."""
+    path, _, type_, mode, user, group, link_target, mtime, size = row
+
+    return FilesystemObject(
+        {
+            "path": path,
+            "type": type_,
+            "mode": mode,
+            "user": user,
+            "group": group,
+            "linktarget": link_target,
+            "mtime": mtime,
+            "size": size,
+        }
+    )
+
+
+def _iter_borg_contents(archive: Archive) -> Iterator[FilesystemObject]:
+    """Yield contents of archive as Borg lists them.
+
+    Borg lists nothing for an empty archive, which is not an error here.
+    """
+    try:
+        yield from archive._iter_borg_contents(path=None)
+    except PathNotExistsError:
+        return
+
+
+class ArchiveContentsIndex:
+    """Index of archive contents in SQLite database.
+
+    'path' is the path to the database, which is created if it doesn't exist.
+    Use ':memory:' for an index that is not persisted.
+
+    An index may be used by multiple threads, e.g. by repositories that are
+    pruned in parallel (see 'RepositoryFleet'). They share one connection, which is used
+    by one thread at a time.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Set attributes, and create database."""
+        self.path = path
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close database."""
+        with self._lock:
+            self._connection.close()
+
+    def _get_key(self, archive: Archive) -> Tuple[str, str]:
+        """Get repository ID and archive ID of archive.
+
+        If the archive ID is not known (e.g. when the archive was just created),
+        it is looked up.
+        """
+        archive_id = archive.id_
+
+        if archive_id is None:
+            archive_id = cast(str, archive.repository.get_archive(archive.name).id_)
+
+        return archive.repository.id_, archive_id
+
+    def _get_archive(self, repository_id: str, archive_id: str) -> Optional[int]:
+        """Get row ID of indexed archive, or None if it is not indexed."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id FROM archives WHERE repository_id = ? AND archive_id = ?",
+                (repository_id, archive_id),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return row[0]
+
+    def is_indexed(self, archive: Archive) -> bool:
+        """Get if contents of archive are indexed."""
+        return self._get_archive(*self._get_key(archive)) is not None
+
+    def _index(self, archive: Archive, repository_id: str, archive_id: str) -> int:
+        """Index contents of archive, and return row ID of archive."""
+        rows = map(_get_row, _iter_borg_contents(archive))
+
+        with self._lock, self._connection:
+            self._remove(repository_id=repository_id, archive_ids=[archive_id])
+
+            key = cast(
+                int,
+                self._connection.execute(
+                    "INSERT INTO archives (repository_id, archive_id) VALUES (?, ?)",
+                    (repository_id, archive_id),
+                ).lastrowid,
+            )
+
+            while True:
+                batch = [(key, *row) for _, row in zip(range(SIZE_INSERT_BATCH), rows)]
+
+                if not batch:
+                    break
+
+                self._connection.executemany(
+                    f"INSERT INTO contents (archive, {_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    batch,
+                )
+
+        return key
+
+    def index(self, archive: Archive) -> None:
+        """Index contents of archive, replacing existing entries.
+
+        Contents are inserted as Borg lists them, so the listing is never held
+        in memory as a whole. Entries are only visible once the whole archive
+        was indexed. An empty archive is indexed without entries.
+        """
+        self._index(archive, *self._get_key(archive))
+
+    def iter_contents(
+        self,
+        archive: Archive,
+        *,
+        path: Optional[str] = None,
+        depth: Optional[int] = None,
+        max_depth: Optional[int] = None,
+        type_: Optional[UNIXFileType] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+    ) -> Iterator[FilesystemObject]:
+        """Yield indexed contents of archive, in the order that Borg lists them.
+
+        The archive is indexed first if it is not indexed yet.
+
+        If 'path' is set, only the filesystem object at that path and objects
+        below it are yielded. If 'depth' is set, only objects with that amount
+        of path components are yielded. E.g. to get the objects directly in
+        'home', pass 'path="home", depth=2'. If 'max_depth' is set, only objects
+        with at most that amount of path components are yielded.
+
+        If 'modified_after' and/or 'modified_before' are set, only objects with a
+        modification time in that range are yielded. The former is inclusive,
+        the latter exclusive. Like 'FilesystemObject.modification_time', they
+        are naive timestamps in the local timezone.
+        """
+        repository_id, archive_id = self._get_key(archive)
+
+        key = self._get_archive(repository_id, archive_id)
+
+        if key is None:
+            key = self._index(archive, repository_id, archive_id)
+
+        conditions = ["archive = ?"]
+        parameters: List[object] = [key]
+
+        normalized_path = os.path.normpath(path).strip(os.path.sep) if path else ""
+
+        if normalized_path:  # Not root
+            # The path itself, and paths that start with it and a separator. The
+            # latter are bounded by the character after the separator ('0'), so
+            # that the index is used (unlike with 'LIKE', which is also
+            # case-insensitive).
+
+            conditions.append("(path = ? OR (path >= ? AND path < ?))")
+            parameters.extend(
+                [
+                    normalized_path,
+                    normalized_path + os.path.sep,
+                    normalized_path + chr(ord(os.path.sep) + 1),
+                ]
+            )
+
+        if depth is not None:
+            conditions.append("depth = ?")
+            parameters.append(depth)
+
+        if max_depth is not None:
+            conditions.append("depth <= ?")
+            parameters.append(max_depth)
+
+        if type_ is not None:
+            conditions.append("type = ?")
+            parameters.append(type_.value)
+
+        if modified_after is not None:
+            conditions.append("mtime >= ?")
+            parameters.append(_get_mtime(modified_after))
+
+        if modified_before is not None:
+            conditions.append("mtime < ?")
+            parameters.append(_get_mtime(modified_before))
+
+        # Rows are fetched in batches, so that the database is not held by this
+        # thread while yielding
+
+        with self._lock:
+            cursor = self._connection.execute(
+                f"SELECT {_COLUMNS} FROM contents WHERE {' AND '.join(conditions)} ORDER BY rowid",
+                parameters,
+            )
+
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(SIZE_FETCH_BATCH)
+
+            if not rows:
+                break
+
+            for row in rows:
+                yield _get_filesystem_object(row)
+
+    def contents(
+        self,
+        archive: Archive,
+        *,
+        path: Optional[str] = None,
+        depth: Optional[int] = None,
+        max_depth: Optional[int] = None,
+        type_: Optional[UNIXFileType] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+    ) -> List[FilesystemObject]:
+        """Get indexed contents of archive.
+
+        See 'iter_contents'.
+        """
+        return list(
+            self.iter_contents(
+                archive,
+                path=path,
+                depth=depth,
+                max_depth=max_depth,
+                type_=type_,
+                modified_after=modified_after,
+                modified_before=modified_before,
+            )
+        )
+
+    def _remove(self, *, repository_id: str, archive_ids: List[str]) -> None:
+        """Remove entries of archives, without committing."""
+        for archive_id in archive_ids:
+            self._connection.execute(
+                "DELETE FROM contents WHERE archive IN (SELECT id FROM archives WHERE repository_id = ? AND archive_id = ?)",
+                (repository_id, archive_id),
+            )
+            self._connection.execute(
+                "DELETE FROM archives WHERE repository_id = ? AND archive_id = ?",
+                (repository_id, archive_id),
+            )
+
+    def remove_archives(self, *, repository_id: str, archive_ids: List[str]) -> None:
+        """Remove entries of archives, e.g. when they were pruned."""
+        with self._lock, self._connection:
+            self._remove(repository_id=repository_id, archive_ids=archive_ids)
+
+    def remove_repository(self, repository_id: str) -> None:
+        """Remove entries of all archives in repository, e.g. when it was deleted."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM contents WHERE archive IN (SELECT id FROM archives WHERE repository_id = ?)",
+                (repository_id,),
+            )
+            self._connection.execute(
+                "DELETE FROM archives WHERE repository_id = ?", (repository_id,)
+            )
@@ -0,0 +1,462 @@
+"""Classes for monitoring many running operations from one thread.
+
+Progress files are watched with inotify where available (Linux), so that only
+progress files that were written to are read. Otherwise, the size and
+modification time of every progress file are polled. In both cases, only bytes
+appended since the last read are parsed, see 'Operation.refresh'.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from cyberfusion.BorgSupport.operations import (
+    ArchiveProgressLine,
+    Operation,
+    OperationLine,
+    ProgressMessageLine,
+    ProgressPercentLine,
+    Throughput,
+    _ArchiveProgressSample,
+    _get_archive_progress_sample,
+    _get_throughput,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_STALL_TIMEOUT = 300.0
+
+# From 'inotify.h'
+
+IN_MODIFY = 0x00000002
+
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (of name)
+
+SIZE_INOTIFY_READ = 64 * 1024
+
+_PROGRESS_LINE_CLASSES = (
+    ArchiveProgressLine,
+    ProgressMessageLine,
+    ProgressPercentLine,
+)
+
+
+class _Inotify:
+    """Minimal inotify binding, using ctypes.
+
+    Raises OSError if inotify is not available, e.g. on other platforms than
+    Linux.
+    """
+
+    def __init__(self) -> None:
+        """Set attributes, and create inotify instance."""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+            self._inotify_init1 = libc.inotify_init1
+            self._inotify_add_watch = libc.inotify_add_watch
+            self._inotify_rm_watch = libc.inotify_rm_watch
+        except AttributeError as e:  # Not in libc
+            raise OSError(str(e)) from e
+
+        self._inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        self._inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = self._inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        if self.fd < 0:
+            raise _get_errno_error()
+
+    def add_watch(self, path: str) -> int:
+        """Watch file for modifications, and return watch descriptor."""
+        wd = self._inotify_add_watch(self.fd, os.fsencode(path), IN_MODIFY)
+
+        if wd < 0:
+            raise _get_errno_error()
+
+        return wd
+
+    def remove_watch(self, wd: int) -> None:
+        """Stop watching file. Errors are ignored, as the file may be gone."""
+        self._inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: float) -> Set[int]:
+        """Wait up to 'timeout' seconds for events, and return watch descriptors of modified files."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+
+        if not readable:
+            return set()
+
+        data = os.read(self.fd, SIZE_INOTIFY_READ)
+
+        results = set()
+        position = 0
+
+        while position < len(data):
+            wd, _, _, length = _INOTIFY_EVENT.unpack_from(data, position)
+
+            results.add(wd)
+
+            position += _INOTIFY_EVENT.size + length
+
+        return results
+
+    def close(self) -> None:
+        """Close inotify instance, which removes all watches."""
+        os.close(self.fd)
+
+
+def _get_errno_error() -> OSError:
+    """Get exception for errno set by last libc call."""
+    errno = ctypes.get_errno()
+
+    return OSError(errno, os.strerror(errno))
+
+
+@dataclass
+class OperationStatus:
+    """Status of monitored operation.
+
+    'last_change' is the monotonic time (see 'time.monotonic') at which new
+    lines were last parsed, or at which the operation was registered.
+
+    'finished' is whether the last progress line (of type 'archive_progress',
+    'progress_message' or 'progress_percent') says that its operation finished.
+    """
+
+    operation: Operation
+    last_line: Optional[OperationLine]
+    finished: bool
+    throughput: Optional[Throughput]
+    last_change: float
+    stall_timeout: float
+
+    @property
+    def stalled(self) -> bool:
+        """Get if no lines were written for 'stall_timeout' seconds, while not finished."""
+        return (
+            not self.finished
+            and time.monotonic() - self.last_change > self.stall_timeout
+        )
+
+
+class _Entry:
+    """Registered operation.
+
+    Lines are read with a separate reader, so that the operation does not keep
+    them (see 'Operation.refresh'). Only what is needed for the status is kept.
+    """
+
+    __slots__ = (
+        "operation",
+        "reader",
+        "wd",
+        "stat",
+        "last_line",
+        "finished",
+        "samples",
+        "last_change",
+    )
+
+    def __init__(self, operation: Operation) -> None:
+        """Set attributes."""
+        self.operation = operation
+        self.reader = operation._get_reader()
+        self.wd: Optional[int] = None
+        self.stat: Optional[Tuple[int, int]] = None  # See '_get_changed_by_poll'
+        self.last_line: Optional[OperationLine] = None
+        self.finished = False
+        self.samples: List[_ArchiveProgressSample] = []  # Last two
+        self.last_change = time.monotonic()
+
+
+class OperationMonitor:
+    """Monitor many running operations from one thread.
+
+    Register operations with 'register'. Then, call 'poll' repeatedly, or call
+    'start' to poll in a background thread. Get statuses with 'get_statuses'.
+
+    Operations of which lines are captured (see 'ProgressCapture') are polled, as
+    they have no progress file to watch. So are progress files that could not
+    be watched, e.g. because the inotify watch limit was reached.
+
+    Example:
+
+    >>> monitor = OperationMonitor()
+    >>> monitor.register(Operation(progress_file=command.file))
+    >>> monitor.start()
+    >>> for status in monitor.get_statuses():
+    ...     print(status.operation.progress_file, status.finished, status.stalled)
+    """
+
+    def __init__(
+        self,
+        *,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+        use_inotify: bool = True,
+    ) -> None:
+        """Set attributes.
+
+        If 'use_inotify' is False, or inotify is not available, progress files
+        are polled every 'poll_interval' seconds.
+        """
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+
+        self._inotify: Optional[_Inotify] = None
+
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except OSError:
+                pass
+
+        self._entries: Dict[int, _Entry] = {}  # By ID of operation
+        self._entries_by_wd: Dict[int, List[_Entry]] = {}
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def uses_inotify(self) -> bool:
+        """Get if progress files are watched with inotify."""
+        return self._inotify is not None
+
+    def register(self, operation: Operation) -> None:
+        """Start monitoring operation."""
+        entry = _Entry(operation)
+
+        with self._lock:
+            if self._inotify is not None and operation.progress_file is not None:
+                try:
+                    entry.wd = self._inotify.add_watch(operation.progress_file)
+                except OSError:  # Polled instead
+                    pass
+                else:
+                    self._entries_by_wd.setdefault(entry.wd, []).append(entry)
+
+            self._entries[id(operation)] = entry
+
+            # Parse lines written before the watch was added
+
+            self._update(entry, self._read(entry))
+
+    def unregister(self, operation: Operation) -> None:
+        """Stop monitoring operation."""
+        with self._lock:
+            entry = self._entries.pop(id(operation))
+
+            if entry.wd is None or self._inotify is None:
+                return
+
+            entries = self._entries_by_wd[entry.wd]
+
+            entries.remove(entry)
+
+            if entries:  # Same file registered by other operation
+                return
+
+            del self._entries_by_wd[entry.wd]
+
+            self._inotify.remove_watch(entry.wd)
+
+    @staticmethod
+    def _read(entry: _Entry) -> List[OperationLine]:
+        """Parse lines written since last read, skipping lines that aren't JSON."""
+        results = []
+
+        for _line in entry.reader.read_new_lines():
+            if not _line:
+                continue
+
+            try:
+                line = entry.operation._parse_line(_line)
+            except ValueError:
+                # Not written by Borg, e.g. by SSH
+
+                continue
+
+            if line is None:
+                continue
+
+            results.append(line)
+
+        return results
+
+    def _update(self, entry: _Entry, lines: List[OperationLine]) -> bool:
+        """Update status with new lines, and return if there were any."""
+        if not lines:
+            return False
+
+        entry.last_change = time.monotonic()
+        entry.last_line = lines[-1]
+
+        for line in lines:
+            # Only progress lines say whether an operation finished. Other lines,
+            # such as log messages, may follow the last progress line.
+
+            if isinstance(line, _PROGRESS_LINE_CLASSES):
+                entry.finished = line.finished
+
+            sample = _get_archive_progress_sample(line)
+
+            if sample is None:
+                continue
+
+            # See 'Operation._get_archive_progress_samples'
+
+            if entry.samples and sample.original_size < entry.samples[-1].original_size:
+                continue
+
+            entry.samples = entry.samples[-1:] + [sample]
+
+        return True
+
+    def _get_candidates(self, timeout: float) -> List[_Entry]:
+        """Wait up to 'timeout' seconds for any progress, and get entries that may have new lines."""
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                candidates, polled = self._get_changed_by_poll()
+
+            remaining = max(0.0, deadline - time.monotonic())
+
+            wait = 0.0 if candidates else remaining
+
+            if polled:  # Poll again after interval
+                wait = min(wait, self.poll_interval)
+
+            if self._inotify is not None:
+                wds = self._inotify.read(wait)
+
+                with self._lock:
+                    for wd in wds:
+                        candidates.extend(self._entries_by_wd.get(wd, []))
+            elif wait:
+                time.sleep(wait)
+
+            if candidates or time.monotonic() >= deadline:
+                return candidates
+
+    def _get_changed_by_poll(self) -> Tuple[List[_Entry], bool]:
+        """Get polled entries that changed, and whether there are polled entries.
+
+        Progress files are polled when they are not watched with inotify. Their
+        size and modification time are compared. Captures are always polled.
+        Their total amount of lines is compared.
+        """
+        results = []
+        polled = False
+
+        for entry in self._entries.values():
+            if entry.operation.capture is not None:
+                current = (entry.operation.capture.total_lines, 0)
+            elif entry.wd is None and entry.operation.progress_file is not None:
+                try:
+                    stat = os.stat(entry.operation.progress_file)
+                except FileNotFoundError:
+                    continue
+
+                current = (stat.st_size, stat.st_mtime_ns)
+            else:
+                continue
+
+            polled = True
+
+            if current == entry.stat:
+                continue
+
+            entry.stat = current
+
+            results.append(entry)
+
+        return results, polled
+
+    def poll(self, timeout: float = 0.0) -> List[Operation]:
+        """Wait up to 'timeout' seconds for progress, parse new lines, and return operations that had any."""
+        candidates = self._get_candidates(timeout)
+
+        results = []
+
+        with self._lock:
+            for entry in candidates:
+                # Don't let one operation break monitoring of others, or stop the
+                # background thread
+
+                try:
+                    updated = self._update(entry, self._read(entry))
+                except Exception:
+                    logger.exception(
+                        "Reading lines of operation %r failed", entry.operation
+                    )
+
+                    continue
+
+                if updated:
+                    results.append(entry.operation)
+
+        return results
+
+    def get_statuses(self) -> List[OperationStatus]:
+        """Get status of all registered operations."""
+        with self._lock:
+            return [
+                OperationStatus(
+                    operation=entry.operation,
+                    last_line=entry.last_line,
+                    finished=entry.finished,
+                    throughput=(
+                        _get_throughput(*entry.samples)
+                        if len(entry.samples) == 2
+                        else None
+                    ),
+                    last_change=entry.last_change,
+                    stall_timeout=self.stall_timeout,
+                )
+                for entry in self._entries.values()
+            ]
+
+    def _run(self) -> None:
+        """Poll until stopped."""
+        while not self._stop_event.is_set():
+            self.poll(self.poll_interval)
+
+    def start(self) -> None:
+        """Poll in background thread, until 'stop' is called."""
+        self._stop_event.clear()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop polling in background thread, and wait for it to end."""
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+            self._thread = None
+
+    def close(self) -> None:
+        """Stop polling, and release inotify instance."""
+        self.stop()
+
+        if self._inotify is not None:
+            self._inotify.close()
+
+            self._inotify = None
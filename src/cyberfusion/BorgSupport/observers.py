@@ -0,0 +1,255 @@
+"""Classes for observing Borg CLI commands.
+
+Observers are notified when every Borg command starts and ends, e.g. to log
+commands, or to find slow repositories and regressions. Register an observer
+with 'register_observer'.
+"""
+
+import bisect
+import logging
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of histogram buckets, in seconds
+
+DEFAULT_BUCKETS = (
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+    900.0,
+    3600.0,
+    float("inf"),
+)
+
+
+@dataclass
+class CommandEvent:
+    """Borg command, of which the result is set when it ended.
+
+    'user_time' and 'system_time' are the CPU time used by child processes
+    that ended while the command ran. When commands run concurrently (e.g. in
+    threads), this includes the other commands. 'max_rss' is the maximum
+    resident set size of any child process so far, in kilobytes, as reported
+    by 'getrusage'.
+
+    'stdout_bytes' and 'stderr_bytes' are None when the output was not captured.
+    """
+
+    command: List[str]
+    subcommand: Optional[str]
+    repository_path: Optional[str]
+    start_time: float
+    wall_time: Optional[float] = None
+    user_time: Optional[float] = None
+    system_time: Optional[float] = None
+    max_rss: Optional[int] = None
+    stdout_bytes: Optional[int] = None
+    stderr_bytes: Optional[int] = None
+    return_code: Optional[int] = None
+
+
+class CommandObserver:
+    """Observer of Borg commands.
+
+    Override 'command_started' and/or 'command_ended'. These are called from the
+    thread that runs the command, so must be thread-safe.
+    """
+
+    def command_started(self, event: CommandEvent) -> None:
+        """Handle start of command."""
+        pass
+
+    def command_ended(self, event: CommandEvent) -> None:
+        """Handle end of command."""
+        pass
+
+
+_observers: List[CommandObserver] = []
+_observers_lock = threading.Lock()
+
+
+def register_observer(observer: CommandObserver) -> None:
+    """Notify observer of all Borg commands."""
+    with _observers_lock:
+        _observers.append(observer)
+
+
+def unregister_observer(observer: CommandObserver) -> None:
+    """Stop notifying observer of Borg commands."""
+    with _observers_lock:
+        _observers.remove(observer)
+
+
+def _notify(observers: List[CommandObserver], method: str, event: CommandEvent) -> None:
+    """Call method on observers, without letting them break the command."""
+    for observer in observers:
+        try:
+            getattr(observer, method)(event)
+        except Exception:
+            logger.exception("Observer %r failed", observer)
+
+
+@contextmanager
+def instrument_command(
+    command: List[str],
+    *,
+    subcommand: Optional[str],
+    repository_path: Optional[str],
+) -> Iterator[CommandEvent]:
+    """Notify observers of command run inside this context.
+
+    The caller sets the result attributes of the yielded event, such as
+    'return_code'. The others are set on leaving the context.
+    """
+    event = CommandEvent(
+        command=command,
+        subcommand=subcommand,
+        repository_path=repository_path,
+        start_time=time.time(),
+    )
+
+    observers = list(_observers)
+
+    if not observers:  # Don't spend time on measuring
+        yield event
+
+        return
+
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    monotonic_before = time.monotonic()
+
+    _notify(observers, "command_started", event)
+
+    try:
+        yield event
+    finally:
+        usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        event.wall_time = time.monotonic() - monotonic_before
+        event.user_time = usage_after.ru_utime - usage_before.ru_utime
+        event.system_time = usage_after.ru_stime - usage_before.ru_stime
+        event.max_rss = usage_after.ru_maxrss
+
+        _notify(observers, "command_ended", event)
+
+
+class LoggingObserver(CommandObserver):
+    """Log ended commands.
+
+    Attributes of the event are passed as 'extra', for use with structured
+    logging formatters.
+    """
+
+    def __init__(
+        self, logger: Optional[logging.Logger] = None, level: int = logging.INFO
+    ) -> None:
+        """Set attributes."""
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def command_ended(self, event: CommandEvent) -> None:
+        """Log command."""
+        self.logger.log(
+            self.level,
+            "Borg command '%s' for repository '%s' ended with RC %s in %.3fs",
+            event.subcommand,
+            event.repository_path,
+            event.return_code,
+            event.wall_time,
+            extra={"borg_command": vars(event)},
+        )
+
+
+@dataclass
+class Histogram:
+    """Histogram of durations."""
+
+    buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    counts: List[int] = field(default_factory=list)
+    count: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+
+    def __post_init__(self) -> None:
+        """Set counts."""
+        if not self.counts:
+            self.counts = [0] * len(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Add value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    @property
+    def mean(self) -> float:
+        """Get mean value."""
+        if not self.count:
+            return 0.0
+
+        return self.total / self.count
+
+    def quantile(self, q: float) -> float:
+        """Get upper bound of bucket that contains quantile, e.g. 0.95."""
+        threshold = q * self.count
+        cumulative = 0
+
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative += count
+
+            if count and cumulative >= threshold:
+                return min(bucket, self.maximum)
+
+        return 0.0
+
+
+class HistogramObserver(CommandObserver):
+    """Keep histograms of wall time of ended commands in memory.
+
+    Histograms are kept per subcommand and repository.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """Set attributes."""
+        self.buckets = buckets
+
+        self.histograms: Dict[Tuple[Optional[str], Optional[str]], Histogram] = {}
+
+        self._lock = threading.Lock()
+
+    def command_ended(self, event: CommandEvent) -> None:
+        """Add wall time to histogram."""
+        if event.wall_time is None:
+            return
+
+        key = (event.subcommand, event.repository_path)
+
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets=self.buckets)
+
+            self.histograms[key].observe(event.wall_time)
+
+    def get_slowest(
+        self, limit: int = 10
+    ) -> List[Tuple[Tuple[Optional[str], Optional[str]], Histogram]]:
+        """Get histograms of subcommands and repositories with highest mean wall time."""
+        with self._lock:
+            items = list(self.histograms.items())
+
+        return sorted(items, key=lambda item: item[1].mean, reverse=True)[:limit]
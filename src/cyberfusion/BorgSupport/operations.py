@@ -1,20 +1,47 @@
 """Classes for interacting with Borg operations."""
 
 import json
+import os
+import sys
+from dataclasses import dataclass
 from enum import Enum
-from typing import List, Optional, Union
-
+from typing import (
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
+
+from cyberfusion.BorgSupport import decoders
+from cyberfusion.BorgSupport.captures import ProgressCapture
 from cyberfusion.BorgSupport.exceptions import OperationLineNotImplementedError
 
 
 class JSONLineType(Enum):
-    """JSON line types."""
+    """JSON line types.
+
+    From https://borgbackup.readthedocs.io/en/stable/internals/frontends.html#logging
+    """
 
     ARCHIVE_PROGRESS = "archive_progress"
     PROGRESS_MESSAGE = "progress_message"
     PROGRESS_PERCENT = "progress_percent"
-    # FILE_STATUS = "file_status"
+    FILE_STATUS = "file_status"
     LOG_MESSAGE = "log_message"
+    QUESTION_PROMPT = "question_prompt"
+    QUESTION_PROMPT_RETRY = "question_prompt_retry"
+    QUESTION_INVALID_ANSWER = "question_invalid_answer"
+    QUESTION_ACCEPTED_DEFAULT = "question_accepted_default"
+    QUESTION_ACCEPTED_TRUE = "question_accepted_true"
+    QUESTION_ACCEPTED_FALSE = "question_accepted_false"
+    QUESTION_ENV_ANSWER = "question_env_answer"
 
 
 class MessageID(Enum):
@@ -27,91 +54,698 @@ class MessageID(Enum):
     LOCK_TIMEOUT = "LockTimeout"  # Not documented
 
 
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Intern string, so that lines share equal values (such as message IDs)."""
+    if value is None:
+        return None
+
+    return sys.intern(value)
+
+
 class ArchiveProgressLine:
-    """Abstraction of JSON line in progress file."""
+    """Abstraction of JSON line in progress file.
+
+    Like other line classes, only fields that are used are kept, in slots
+    rather than a dict, as progress files may contain millions of lines.
+    """
+
+    __slots__ = (
+        "time",
+        "finished",
+        "original_size",
+        "compressed_size",
+        "deduplicated_size",
+        "nfiles",
+    )
+
+    type_ = JSONLineType.ARCHIVE_PROGRESS
 
     def __init__(self, line: dict) -> None:
         """Set attributes."""
-        self._line = line
+        self.time: Optional[float] = line.get("time")
+        self.finished: bool = line.get("finished", False)  # Since Borg 1.2
+        self.original_size: Optional[int] = line.get("original_size")
+        self.compressed_size: Optional[int] = line.get("compressed_size")
+        self.deduplicated_size: Optional[int] = line.get("deduplicated_size")
+        self.nfiles: Optional[int] = line.get("nfiles")
 
 
 class ProgressMessageLine:
     """Abstraction of JSON line in progress file."""
 
+    __slots__ = ("time", "finished", "operation", "msgid")
+
+    type_ = JSONLineType.PROGRESS_MESSAGE
+
     def __init__(self, line: dict) -> None:
         """Set attributes."""
-        self._line = line
-
-    @property
-    def finished(self) -> bool:
-        """Get finished attribute."""
-        return self._line["finished"]
+        self.time: Optional[float] = line.get("time")
+        self.finished: bool = line["finished"]
+        self.operation: int = line["operation"]
+        self.msgid: Optional[str] = _intern(line.get("msgid"))
 
 
 class ProgressPercentLine:
     """Abstraction of JSON line in progress file."""
 
+    __slots__ = ("time", "finished", "operation", "msgid", "current", "total")
+
+    type_ = JSONLineType.PROGRESS_PERCENT
+
     def __init__(self, line: dict) -> None:
         """Set attributes."""
-        self._line = line
+        self.time: Optional[float] = line.get("time")
+        self.finished: bool = line["finished"]
+        self.operation: int = line["operation"]
+        self.msgid: Optional[str] = _intern(line.get("msgid"))
+        self.current: Optional[int] = line.get("current")
+        self.total: Optional[int] = line.get("total")
 
-    @property
-    def finished(self) -> bool:
-        """Get finished attribute."""
-        return self._line["finished"]
+
+class FileStatusLine:
+    """Abstraction of JSON line in progress file."""
+
+    __slots__ = ("status", "path")
+
+    type_ = JSONLineType.FILE_STATUS
+
+    def __init__(self, line: dict) -> None:
+        """Set attributes."""
+        self.status: str = sys.intern(line["status"])
+        self.path: str = line["path"]
+
+
+class LogMessageLine:
+    """Abstraction of JSON line in progress file."""
+
+    __slots__ = ("time", "levelname", "name", "message", "msgid")
+
+    type_ = JSONLineType.LOG_MESSAGE
+
+    def __init__(self, line: dict) -> None:
+        """Set attributes."""
+        self.time: Optional[float] = line.get("time")
+        self.levelname: str = sys.intern(line["levelname"])
+        self.name: str = sys.intern(line["name"])
+        self.message: str = line["message"]
+        self.msgid: Optional[str] = _intern(line.get("msgid"))
+
+
+class QuestionLine:
+    """Abstraction of JSON line in progress file, for all question types."""
+
+    __slots__ = ("type_", "msgid", "message")
+
+    def __init__(self, line: dict) -> None:
+        """Set attributes."""
+        self.type_ = JSONLineType(line["type"])
+        self.msgid: Optional[str] = _intern(line.get("msgid"))
+        self.message: Optional[str] = line.get("message")
+
+
+@dataclass
+class Throughput:
+    """Throughput of operation."""
+
+    bytes_per_second: float
+    files_per_second: float
+
+
+@dataclass
+class ArchiveStats:
+    """Statistics of created archive.
+
+    From the output of 'borg create --stats --json'. Sizes are in bytes, and
+    'duration' is in seconds.
+    """
+
+    original_size: int
+    compressed_size: int
+    deduplicated_size: int
+    nfiles: int
+    duration: float
+
+
+def _get_archive_stats(output: dict) -> ArchiveStats:
+    """Get archive statistics from JSON output of 'borg create --stats --json'."""
+    archive = output["archive"]
+
+    return ArchiveStats(
+        original_size=archive["stats"]["original_size"],
+        compressed_size=archive["stats"]["compressed_size"],
+        deduplicated_size=archive["stats"]["deduplicated_size"],
+        nfiles=archive["stats"]["nfiles"],
+        duration=archive["duration"],
+    )
+
+
+class _ArchiveProgressSample(NamedTuple):
+    """Archive progress line of which all used fields are set."""
+
+    time: float
+    original_size: int
+    compressed_size: int
+    deduplicated_size: int
+    nfiles: int
+
+
+class _ProgressPercentSample(NamedTuple):
+    """Progress percent line of which all used fields are set."""
+
+    time: Optional[float]
+    operation: int
+    current: int
+    total: int
+
+
+def _get_archive_progress_sample(line: object) -> Optional[_ArchiveProgressSample]:
+    """Get sample from line, or None if it is not an archive progress line with sizes."""
+    if not isinstance(line, ArchiveProgressLine):
+        return None
+
+    if (
+        line.time is None
+        or line.original_size is None
+        or line.compressed_size is None
+        or line.deduplicated_size is None
+        or line.nfiles is None
+    ):
+        return None
+
+    return _ArchiveProgressSample(
+        time=line.time,
+        original_size=line.original_size,
+        compressed_size=line.compressed_size,
+        deduplicated_size=line.deduplicated_size,
+        nfiles=line.nfiles,
+    )
+
+
+def _get_throughput(
+    first: _ArchiveProgressSample, last: _ArchiveProgressSample
+) -> Optional[Throughput]:
+    """Get throughput between two samples, or None if no time passed."""
+    duration = last.time - first.time
+
+    if duration <= 0:
+        return None
+
+    return Throughput(
+        bytes_per_second=(last.original_size - first.original_size) / duration,
+        files_per_second=(last.nfiles - first.nfiles) / duration,
+    )
+
+
+OperationLine = Union[
+    ArchiveProgressLine,
+    ProgressMessageLine,
+    ProgressPercentLine,
+    FileStatusLine,
+    LogMessageLine,
+    QuestionLine,
+]
+
+LINE_CLASSES: Dict[JSONLineType, Type[OperationLine]] = {
+    JSONLineType.ARCHIVE_PROGRESS: ArchiveProgressLine,
+    JSONLineType.PROGRESS_MESSAGE: ProgressMessageLine,
+    JSONLineType.PROGRESS_PERCENT: ProgressPercentLine,
+    JSONLineType.FILE_STATUS: FileStatusLine,
+    JSONLineType.LOG_MESSAGE: LogMessageLine,
+    JSONLineType.QUESTION_PROMPT: QuestionLine,
+    JSONLineType.QUESTION_PROMPT_RETRY: QuestionLine,
+    JSONLineType.QUESTION_INVALID_ANSWER: QuestionLine,
+    JSONLineType.QUESTION_ACCEPTED_DEFAULT: QuestionLine,
+    JSONLineType.QUESTION_ACCEPTED_TRUE: QuestionLine,
+    JSONLineType.QUESTION_ACCEPTED_FALSE: QuestionLine,
+    JSONLineType.QUESTION_ENV_ANSWER: QuestionLine,
+}
+
+# Types of which 'Operation.last_lines_by_type' gets the last lines if lazy, and
+# 'line_types' is not set. Lines of other types (e.g. questions) are rare, so
+# looking for them would usually read the whole progress file.
+
+LAZY_LAST_LINES_TYPES = (
+    JSONLineType.ARCHIVE_PROGRESS,
+    JSONLineType.PROGRESS_MESSAGE,
+    JSONLineType.PROGRESS_PERCENT,
+    JSONLineType.LOG_MESSAGE,
+)
+
+# Size of blocks in which progress files are read backwards
+
+SIZE_REVERSE_READ_BLOCK = 64 * 1024
+
+
+def _iter_raw_lines_reversed(path: str) -> Iterator[Tuple[bytes, bool]]:
+    """Yield lines in file from end to start, without reading the whole file.
+
+    Yields tuples of line and whether the line ends with a newline. Only the
+    first yielded line can lack a newline.
+    """
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b""
+        terminated = True
+
+        is_last_block = True
+
+        while position > 0:
+            size = min(SIZE_REVERSE_READ_BLOCK, position)
+            position -= size
+
+            f.seek(position)
+
+            block = f.read(size) + remainder
+
+            if is_last_block:
+                terminated = block.endswith(b"\n")
+                is_last_block = False
+
+            # The first part may be the end of a line that starts in the
+            # previous block
+
+            remainder, *_lines = block.split(b"\n")
+
+            for _line in reversed(_lines):
+                if not _line:
+                    continue
+
+                yield _line, terminated
+
+                terminated = True
+
+        if remainder:
+            yield remainder, terminated
+
+
+class _ProgressFileReader:
+    """Read lines from progress file."""
+
+    def __init__(self, path: str) -> None:
+        """Set attributes."""
+        self.path = path
+
+        self._offset = 0
+
+    def read_lines(self) -> List[bytes]:
+        """Read all lines."""
+        with open(self.path, "rb") as f:
+            return f.read().splitlines()
+
+    def read_new_lines(self) -> List[bytes]:
+        """Read lines written since last call.
+
+        While Borg is writing a line, the file may end with part of it. Such a
+        partial line is read by a later call, when it is complete.
+        """
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+
+            data = f.read()
+
+        # Only read up to and including the last newline. The first line is
+        # empty if the previous call read a trailing line without newline.
+
+        end = data.rfind(b"\n") + 1
+
+        lines = data[:end].splitlines()
+
+        # A trailing line without newline is complete if it is a valid JSON
+        # document, as a partial JSON object lacks at least its closing brace
+
+        trailing_line = data[end:]
+
+        if trailing_line.strip():
+            try:
+                decoders.loads(trailing_line)
+            except ValueError:  # Partial
+                pass
+            else:
+                lines.append(trailing_line)
+
+                end = len(data)
+
+        self._offset += end
+
+        return lines
+
+    def iter_lines_reversed(self) -> Iterator[Tuple[bytes, bool]]:
+        """Yield lines and whether they are terminated, from end to start."""
+        return _iter_raw_lines_reversed(self.path)
+
+
+class _ProgressCaptureReader:
+    """Read lines from capture."""
+
+    def __init__(self, capture: ProgressCapture) -> None:
+        """Set attributes."""
+        self.capture = capture
+
+        self._total_lines = 0
+
+    def read_lines(self) -> List[bytes]:
+        """Read all kept lines."""
+        return list(self.capture.lines)
+
+    def read_new_lines(self) -> List[bytes]:
+        """Read kept lines added since last call."""
+        lines, self._total_lines = self.capture.get_lines_since(self._total_lines)
+
+        return lines
+
+    def iter_lines_reversed(self) -> Iterator[Tuple[bytes, bool]]:
+        """Yield kept lines and whether they are terminated (always), from end to start."""
+        for _line in self.capture.iter_lines_reversed():
+            yield _line, True
 
 
 class Operation:
-    """Abstraction of Borg operation."""
+    """Abstraction of Borg operation.
+
+    To follow a running operation, call 'refresh' to parse lines that were
+    written since the last call. Only new lines are read.
 
-    def __init__(self, *, progress_file: str) -> None:
+    If 'lazy' is True, lines are not parsed until 'refresh' is called. Instead,
+    'last_line' and 'last_lines_by_type' read the progress file backwards from
+    the end, and only parse the lines they need. Use this when only the current
+    status is needed, as progress files can be very large.
+
+    If 'line_types' is set, only lines of those types are parsed, and others
+    are skipped. Lines are checked for their type before decoding them, so
+    skipping lines (such as many 'file_status' lines) is cheap. If 'line_types'
+    is not set, all lines are parsed, and OperationLineNotImplementedError is
+    raised for lines of unknown types.
+
+    Lines are read from 'progress_file', or from 'capture' (see
+    'ProgressCapture'). In the latter case, only kept lines are parsed, and
+    at most as many parsed lines are kept as the capture keeps.
+
+    'archive_stats' is set for archives created with statistics, see
+    'Archive.create'.
+    """
+
+    def __init__(
+        self,
+        *,
+        progress_file: Optional[str] = None,
+        lazy: bool = False,
+        line_types: Optional[Set[JSONLineType]] = None,
+        capture: Optional[ProgressCapture] = None,
+        archive_stats: Optional[ArchiveStats] = None,
+    ) -> None:
         """Set attributes."""
         self.progress_file = progress_file
+        self.lazy = lazy
+        self.line_types = line_types
+        self.capture = capture
+        self.archive_stats = archive_stats
 
-        self._lines = self.get_lines()
+        if self.capture is None and self.progress_file is None:
+            raise ValueError("Either 'progress_file' or 'capture' must be set")
 
-    def get_lines(
-        self,
-    ) -> List[Union[ArchiveProgressLine, ProgressMessageLine, ProgressPercentLine]]:
+        self._reader = self._get_reader()
+
+        # Any line of a type contains the type as JSON string, e.g. '"file_status"'.
+        # The reverse is not true, so lines that contain it are checked after
+        # decoding.
+
+        self._line_type_needles: Optional[Tuple[bytes, ...]] = None
+
+        if self.line_types is not None:
+            self._line_type_needles = tuple(
+                json.dumps(type_.value).encode() for type_ in self.line_types
+            )
+
+        self._lines: List[OperationLine] = []
+
+        if not self.lazy:
+            self.refresh()
+
+    def _get_reader(self) -> Union[_ProgressFileReader, _ProgressCaptureReader]:
+        """Get reader of lines, which reads from the start."""
+        if self.capture is not None:
+            return _ProgressCaptureReader(self.capture)
+
+        return _ProgressFileReader(cast(str, self.progress_file))
+
+    def _parse_line(self, _line: bytes) -> Optional[OperationLine]:
+        """Get JSON line object from raw line, or None if its type is not wanted."""
+        if self._line_type_needles is not None and not any(
+            needle in _line for needle in self._line_type_needles
+        ):
+            return None
+
+        line = decoders.loads(_line)
+
+        try:
+            type_ = JSONLineType(line["type"])
+        except ValueError:
+            if self.line_types is not None:
+                return None
+
+            raise OperationLineNotImplementedError(
+                f"Got unknown line of type '{line['type']}': '{line}'"
+            )
+
+        if self.line_types is not None and type_ not in self.line_types:
+            return None
+
+        return LINE_CLASSES[type_](line)
+
+    def _parse_lines(self, _lines: List[bytes]) -> List[OperationLine]:
+        """Get JSON line objects from raw lines, skipping empty and unwanted lines."""
+        results = []
+
+        for _line in _lines:
+            if not _line:
+                continue
+
+            line = self._parse_line(_line)
+
+            if line is None:
+                continue
+
+            results.append(line)
+
+        return results
+
+    def get_lines(self) -> List[OperationLine]:
         """Get JSON lines from progress file.
 
         Each line is a JSON document, see https://borgbackup.readthedocs.io/en/stable/internals/frontends.html#logging
+
+        This reads the whole file. To read only new lines, use 'refresh'.
         """
-        lines: List[
-            Union[ArchiveProgressLine, ProgressMessageLine, ProgressPercentLine]
-        ] = []
+        return self._parse_lines(self._reader.read_lines())
 
-        with open(self.progress_file, "r") as f:
-            for _line in f.read().splitlines():
-                line = json.loads(_line)
+    def refresh(self) -> List[OperationLine]:
+        """Parse lines written to progress file since last refresh, and return them.
 
-                if line["type"] == JSONLineType.ARCHIVE_PROGRESS.value:
-                    lines.append(ArchiveProgressLine(line))
+        While Borg is writing a line, the file may end with part of it. Such a
+        partial line is parsed by a later refresh, when it is complete.
+        """
+        lines = self._parse_lines(self._reader.read_new_lines())
 
-                elif line["type"] == JSONLineType.PROGRESS_MESSAGE.value:
-                    lines.append(ProgressMessageLine(line))
+        self._lines.extend(lines)
 
-                elif line["type"] == JSONLineType.PROGRESS_PERCENT.value:
-                    lines.append(ProgressPercentLine(line))
+        if self.capture is not None:
+            excess = len(self._lines) - len(self.capture.lines)
 
-                else:
-                    raise OperationLineNotImplementedError(
-                        f"Got unknown line of type '{line['type']}': '{line}'"
-                    )
+            if excess > 0:
+                del self._lines[:excess]
 
         return lines
 
+    def _get_archive_progress_samples(self) -> List[_ArchiveProgressSample]:
+        """Get archive progress lines with sizes, in order.
+
+        When done, Borg writes a line with zero sizes (or without sizes). Lines
+        with smaller sizes than an earlier line are therefore skipped.
+        """
+        results: List[_ArchiveProgressSample] = []
+
+        for line in self._lines:
+            sample = _get_archive_progress_sample(line)
+
+            if sample is None:
+                continue
+
+            if results and sample.original_size < results[-1].original_size:
+                continue
+
+            results.append(sample)
+
+        return results
+
     @property
-    def last_line(
-        self,
-    ) -> Optional[Union[ArchiveProgressLine, ProgressMessageLine, ProgressPercentLine]]:
+    def instantaneous_throughput(self) -> Optional[Throughput]:
+        """Get throughput between last two archive progress lines.
+
+        Like other analytics, this uses lines parsed so far (see 'refresh'), and
+        is None if there is not enough data.
+        """
+        samples = self._get_archive_progress_samples()
+
+        if len(samples) < 2:
+            return None
+
+        return _get_throughput(samples[-2], samples[-1])
+
+    def get_throughput(self, window: Optional[float] = None) -> Optional[Throughput]:
+        """Get average throughput over last 'window' seconds, or the whole operation."""
+        samples = self._get_archive_progress_samples()
+
+        if len(samples) < 2:
+            return None
+
+        last = samples[-1]
+
+        if window is not None:
+            samples = [s for s in samples if s.time >= last.time - window]
+
+        return _get_throughput(samples[0], last)
+
+    @property
+    def compression_ratio(self) -> Optional[float]:
+        """Get compressed size divided by original size, so far."""
+        samples = self._get_archive_progress_samples()
+
+        if not samples or not samples[-1].original_size:
+            return None
+
+        return samples[-1].compressed_size / samples[-1].original_size
+
+    @property
+    def deduplication_ratio(self) -> Optional[float]:
+        """Get deduplicated size divided by compressed size, so far.
+
+        The deduplicated size is the size of new data, that is not already in
+        the repository.
+        """
+        samples = self._get_archive_progress_samples()
+
+        if not samples or not samples[-1].compressed_size:
+            return None
+
+        return samples[-1].deduplicated_size / samples[-1].compressed_size
+
+    def _get_progress_percent_samples(self) -> List[_ProgressPercentSample]:
+        """Get progress percent lines of last progress percent operation."""
+        samples = [
+            _ProgressPercentSample(
+                time=line.time,
+                operation=line.operation,
+                current=line.current,
+                total=line.total,
+            )
+            for line in self._lines
+            if isinstance(line, ProgressPercentLine)
+            and line.current is not None
+            and line.total
+        ]
+
+        if not samples:
+            return []
+
+        return [s for s in samples if s.operation == samples[-1].operation]
+
+    @property
+    def percentage(self) -> Optional[float]:
+        """Get percentage of last progress percent operation."""
+        samples = self._get_progress_percent_samples()
+
+        if not samples:
+            return None
+
+        return samples[-1].current / samples[-1].total * 100
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Get estimated seconds until last progress percent operation is done.
+
+        Based on the average rate since the first line of the operation.
+        """
+        samples = [s for s in self._get_progress_percent_samples() if s.time]
+
+        if len(samples) < 2:
+            return None
+
+        first, last = samples[0], samples[-1]
+
+        duration = last.time - first.time  # type: ignore[operator]
+
+        if duration <= 0:
+            return None
+
+        rate = (last.current - first.current) / duration
+
+        if rate <= 0:
+            return None
+
+        return (last.total - last.current) / rate
+
+    def _iter_lines_reversed(self) -> Iterator[OperationLine]:
+        """Parse and yield lines from end to start of progress file.
+
+        A trailing partial line (see 'refresh') is skipped.
+        """
+        for _line, terminated in self._reader.iter_lines_reversed():
+            try:
+                line = self._parse_line(_line)
+            except ValueError:
+                if terminated:
+                    raise
+
+                continue
+
+            if line is not None:
+                yield line
+
+    @property
+    def last_line(self) -> Optional[OperationLine]:
         """Get last JSON line from progress file.
 
         The last line contains the most recent status.
         """
+        if self.lazy:
+            return next(self._iter_lines_reversed(), None)
+
         try:
             return self._lines[-1]
         except IndexError:
             # No lines yet
 
             return None
+
+    @property
+    def last_lines_by_type(self) -> Dict[JSONLineType, OperationLine]:
+        """Get last JSON line of every type in progress file.
+
+        Types without lines are missing. If 'lazy' is True, the progress file is
+        read backwards until there is a line of every type, so if it lacks lines
+        of a type, the whole file is read. Therefore, only the types in
+        'LAZY_LAST_LINES_TYPES' are looked for, unless 'line_types' is set.
+        """
+        results: Dict[JSONLineType, OperationLine] = {}
+
+        if self.lazy:
+            lines: Iterator[OperationLine] = self._iter_lines_reversed()
+            types: Collection[JSONLineType] = (
+                self.line_types
+                if self.line_types is not None
+                else LAZY_LAST_LINES_TYPES
+            )
+        else:
+            lines = reversed(self._lines)
+            types = self.line_types if self.line_types is not None else LINE_CLASSES
+
+        for line in lines:
+            if line.type_ in results or line.type_ not in types:
+                continue
+
+            results[line.type_] = line
+
+            if len(results) == len(types):
+                break
+
+        return results
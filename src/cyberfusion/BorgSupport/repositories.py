@@ -1,17 +1,37 @@
 """Classes for managing repositories."""
 
-import json
+import hashlib
+import logging
+import os
+import subprocess
+import threading
+import time
+from contextlib import ExitStack, contextmanager
 from enum import Enum
-from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+    overload,
+)
 from urllib.parse import urlparse
 
-from cyberfusion.BorgSupport import Borg, PassphraseFile
+from cyberfusion.BorgSupport import Borg, PassphraseFile, decoders
 from cyberfusion.BorgSupport.archives import Archive
 from cyberfusion.BorgSupport.borg_cli import (
     BorgCommand,
     BorgLoggedCommand,
     BorgRegularCommand,
 )
+from cyberfusion.BorgSupport.captures import ProgressCapture
 from cyberfusion.BorgSupport.exceptions import (
     ArchiveNotExistsError,
     LoggedCommandFailedError,
@@ -19,13 +39,24 @@ from cyberfusion.BorgSupport.exceptions import (
     RepositoryLockedError,
     RepositoryPathInvalidError,
 )
-from cyberfusion.BorgSupport.operations import JSONLineType, MessageID
+from cyberfusion.BorgSupport.operations import JSONLineType, MessageID, Operation
+from cyberfusion.BorgSupport.utilities import get_ssh_control_directory
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cyberfusion.BorgSupport.indexes import ArchiveContentsIndex
+
+logger = logging.getLogger(__name__)
 
 SCHEME_SSH = "ssh"
 DEFAULT_PORT_SSH = 22
+DEFAULT_SSH_CONTROL_PERSIST = 60
+
+SSH_BIN = "ssh"
 
 CHARACTER_AT = "@"
 
+MESSAGE_FAILED_ACQUIRE_LOCK = "Failed to create/acquire the lock"
+
 
 F = TypeVar("F", bound=Callable[..., Any])
 
@@ -34,10 +65,8 @@ def check_repository_not_locked(f: F) -> Any:
     """Check that repository is not locked."""
 
     def wrapper(self: Any, *args: tuple, **kwargs: dict) -> Any:
-        if self.is_locked:
-            raise RepositoryLockedError
-
-        return f(self, *args, **kwargs)
+        with self._lock_check_scope():
+            return f(self, *args, **kwargs)
 
     return wrapper
 
@@ -56,6 +85,125 @@ def compact_repository(f: F) -> Any:
     return wrapper
 
 
+def _has_lock_timeout_line(output: str) -> bool:
+    """Get if JSON log lines in output say that a lock could not be acquired."""
+    for _line in output.splitlines():
+        line = decoders.loads(_line)
+
+        if line["type"] != JSONLineType.LOG_MESSAGE.value:
+            continue
+
+        if line.get("msgid", None) != MessageID.LOCK_TIMEOUT.value:
+            continue
+
+        return True
+
+    return False
+
+
+def _has_lock_timeout_output(output: str) -> bool:
+    """Get if output says that a lock could not be acquired.
+
+    Unlike '_has_lock_timeout_line', output may contain both JSON log lines and
+    other lines.
+    """
+    for _line in output.splitlines():
+        if _line.startswith(MESSAGE_FAILED_ACQUIRE_LOCK):
+            return True
+
+        try:
+            line = decoders.loads(_line)
+        except ValueError:
+            continue
+
+        if not isinstance(line, dict):
+            continue
+
+        if line.get("type") != JSONLineType.LOG_MESSAGE.value:
+            continue
+
+        if line.get("msgid", None) != MessageID.LOCK_TIMEOUT.value:
+            continue
+
+        return True
+
+    return False
+
+
+def _is_lock_timeout_error(
+    error: Union[RegularCommandFailedError, LoggedCommandFailedError],
+) -> bool:
+    """Get if command failed because a lock could not be acquired."""
+    if isinstance(error, LoggedCommandFailedError):
+        if error.output is not None:  # Captured
+            return _has_lock_timeout_output(error.output)
+
+        if error.output_file_path is None:
+            return False
+
+        with open(error.output_file_path, "r") as f:
+            return _has_lock_timeout_output(f.read())
+
+    if error.stderr is None:  # Not captured
+        return False
+
+    return _has_lock_timeout_output(error.stderr)
+
+
+def _get_prune_arguments(
+    *,
+    path: str,
+    keep_last: Optional[int],
+    keep_hourly: Optional[int],
+    keep_daily: Optional[int],
+    keep_weekly: Optional[int],
+    keep_monthly: Optional[int],
+    keep_yearly: Optional[int],
+) -> List[str]:
+    """Get arguments for 'prune' command."""
+    arguments = []
+
+    if keep_last:
+        arguments.append(f"--keep-last={keep_last}")
+
+    if keep_hourly:
+        arguments.append(f"--keep-hourly={keep_hourly}")
+
+    if keep_daily:
+        arguments.append(f"--keep-daily={keep_daily}")
+
+    if keep_weekly:
+        arguments.append(f"--keep-weekly={keep_weekly}")
+
+    if keep_monthly:
+        arguments.append(f"--keep-monthly={keep_monthly}")
+
+    if keep_yearly:
+        arguments.append(f"--keep-yearly={keep_yearly}")
+
+    arguments.append(path)
+
+    return arguments
+
+
+def _get_pruned_archives_names(
+    before_archives_names: List[str], after_archives_names: List[str]
+) -> List[str]:
+    """Get names of archives removed by prune (in before list, not in after list).
+
+    Not possible to get neatly, see: https://github.com/borgbackup/borg/discussions/7021
+    """
+    pruned_archives_names = []
+
+    for archive_name in before_archives_names:
+        if archive_name in after_archives_names:
+            continue
+
+        pruned_archives_names.append(archive_name)
+
+    return pruned_archives_names
+
+
 class BorgRepositoryEncryptionName(Enum):
     """Repository encryption names."""
 
@@ -72,6 +220,11 @@ class Repository:
         passphrase: str,
         identity_file_path: Optional[str] = None,
         create_if_not_exists: bool = False,
+        ssh_multiplexing: bool = False,
+        ssh_control_persist: int = DEFAULT_SSH_CONTROL_PERSIST,
+        lock_check_ttl: Optional[float] = None,
+        lock_check_probe: bool = True,
+        contents_index: Optional["ArchiveContentsIndex"] = None,
     ) -> None:
         """Set variables.
 
@@ -86,10 +239,48 @@ class Repository:
         it does not exist yet. The encryption 'KEYFILE_BLAKE2' will be used. Note
         that using this option causes a slight delay, as it checks whether the
         repository exists or not.
+
+        If 'ssh_multiplexing' is true and the repository is remote, all commands
+        share one SSH connection (per host, port, user and identity file), instead
+        of doing an SSH handshake per command. The connection is closed when it
+        has been idle for 'ssh_control_persist' seconds, or when calling
+        'close_ssh_connection'. Control sockets are placed in a directory that is
+        private to the current user. If another user created it first,
+        DirectoryNotPrivateError is raised when running commands.
+
+        Before running an operation, it is checked that the repository is not
+        locked. This is done once per top-level call: operations that call other
+        operations (e.g. 'prune' calls 'archives') don't check again. If
+        'lock_check_ttl' is set, the result of a check is also reused by later
+        calls within that many seconds. If 'lock_check_probe' is false, no check
+        is done beforehand at all. Instead, RepositoryLockedError is raised when
+        the command itself fails because of a lock. This saves a Borg process
+        per operation.
+
+        If 'contents_index' is set, contents of archives are listed from it, and
+        archives are indexed when first listed (see 'Archive.iter_contents').
+        Entries of archives are removed from it when they are pruned, and
+        entries of all archives when the repository is deleted. See
+        'ArchiveContentsIndex'.
         """
         self._path = path
         self.passphrase = passphrase
         self.identity_file_path = identity_file_path
+        self.ssh_multiplexing = ssh_multiplexing
+        self.ssh_control_persist = ssh_control_persist
+        self.lock_check_ttl = lock_check_ttl
+        self.lock_check_probe = lock_check_probe
+        self.contents_index = contents_index
+
+        self._id: Optional[str] = None
+
+        self._lock_checked_at: Optional[float] = None
+        self._lock_check_state = threading.local()
+
+        self._session_environment: Optional[Dict[str, str]] = None
+        self._session_depth = 0
+        self._session_lock = threading.Lock()
+        self._session_stack = ExitStack()
 
         if create_if_not_exists:
             if not self.exists:
@@ -124,20 +315,222 @@ class Repository:
 
         return self._path
 
+    @property
+    def id_(self) -> str:
+        """Get repository ID.
+
+        The ID is cached, as it never changes.
+        """
+        if self._id is None:
+            command = BorgRegularCommand(repository_path=self.path)
+
+            with self._passphrase_environment() as environment:
+                command.execute(
+                    command=BorgCommand.SUBCOMMAND_INFO,
+                    arguments=[self.path],
+                    json_format=True,
+                    capture_stderr=self._capture_stderr,
+                    **self._cli_options,
+                    environment=environment,
+                )
+
+            self._id = command.stdout["repository"]["id"]
+
+        return self._id
+
     @property
     def _is_remote(self) -> bool:
         """Get if repository is remote."""
         return urlparse(self.path).scheme == SCHEME_SSH
 
+    @property
+    def _ssh_control_path(self) -> Optional[str]:
+        """Get path to SSH control socket.
+
+        Returns None if SSH multiplexing is not used.
+
+        The socket is shared by all repositories on the same host, port and user,
+        that use the same identity file. The path is hashed, as socket paths
+        have a short maximum length.
+        """
+        if not self.ssh_multiplexing or not self._is_remote:
+            return None
+
+        url = urlparse(self.path)
+
+        key = ":".join(
+            [
+                url.username or "",
+                url.hostname or "",
+                str(url.port or DEFAULT_PORT_SSH),
+                self.identity_file_path or "",
+            ]
+        )
+
+        return os.path.join(
+            get_ssh_control_directory(),
+            hashlib.sha256(key.encode()).hexdigest()[:16],
+        )
+
     @property
     def _cli_options(
         self,
-    ) -> Dict[str, Union[Optional[str], Dict[str, str]]]:
+    ) -> Dict[str, Union[Optional[str], Optional[int], Dict[str, str]]]:
         """Get CLI options for Borg command."""
-        return {
+        options: Dict[str, Union[Optional[str], Optional[int], Dict[str, str]]] = {
             "identity_file_path": self.identity_file_path,
         }
 
+        ssh_control_path = self._ssh_control_path
+
+        if ssh_control_path:
+            options["ssh_control_path"] = ssh_control_path
+            options["ssh_control_persist"] = self.ssh_control_persist
+
+        return options
+
+    @property
+    def _capture_stderr(self) -> bool:
+        """Get if stderr of regular commands should be captured.
+
+        Needed to detect locks from the output of commands, when not probing.
+        """
+        return not self.lock_check_probe
+
+    @property
+    def _is_lock_check_fresh(self) -> bool:
+        """Get if result of last lock check may be reused (see 'lock_check_ttl')."""
+        return (
+            self.lock_check_ttl is not None
+            and self._lock_checked_at is not None
+            and time.monotonic() - self._lock_checked_at < self.lock_check_ttl
+        )
+
+    def _is_locked_error(
+        self, error: Union[RegularCommandFailedError, LoggedCommandFailedError]
+    ) -> bool:
+        """Get if command failed because repository is locked.
+
+        Only detected from the output of commands when not probing.
+        """
+        return not self.lock_check_probe and _is_lock_timeout_error(error)
+
+    def _remove_archives_from_index(self, archive_ids: List[str]) -> None:
+        """Remove entries of archives from index, if set, e.g. when they were pruned.
+
+        Failing to remove entries doesn't fail the operation (and e.g. doesn't
+        skip compaction after pruning), as they are never used again.
+        """
+        if self.contents_index is None:
+            return
+
+        try:
+            self.contents_index.remove_archives(
+                repository_id=self.id_, archive_ids=archive_ids
+            )
+        except Exception:
+            logger.exception("Removing archives from contents index failed")
+
+    @contextmanager
+    def _lock_check_scope(self) -> Iterator[None]:
+        """Check that repository is not locked, once for all nested operations.
+
+        See '__init__' for when the check is done.
+        """
+        depth = getattr(self._lock_check_state, "depth", 0)
+
+        if depth == 0 and self.lock_check_probe:
+            if not self._is_lock_check_fresh:
+                if self.is_locked:
+                    raise RepositoryLockedError
+
+                self._lock_checked_at = time.monotonic()
+
+        self._lock_check_state.depth = depth + 1
+
+        try:
+            yield
+        except (RegularCommandFailedError, LoggedCommandFailedError) as e:
+            if depth == 0 and self._is_locked_error(e):
+                raise RepositoryLockedError from e
+
+            raise
+        finally:
+            self._lock_check_state.depth = depth
+
+    @contextmanager
+    def session(self) -> Iterator["Repository"]:
+        """Reuse passphrase delivery for all commands run inside this context.
+
+        Without a session, a passphrase file is created and deleted for every
+        command. Inside a session, one passphrase file is used for all commands,
+        which is deleted when leaving the session. Sessions may be nested, and
+        used from multiple threads at the same time.
+
+        Leaving the outermost session doesn't close the shared SSH connection, if
+        any, as other repositories on the same host may use it (see
+        'ssh_multiplexing').
+        """
+        with self._session_lock:
+            if self._session_depth == 0:
+                self._session_environment = self._session_stack.enter_context(
+                    PassphraseFile(self.passphrase)
+                )
+
+            self._session_depth += 1
+
+        try:
+            yield self
+        finally:
+            with self._session_lock:
+                self._session_depth -= 1
+
+                if self._session_depth == 0:
+                    self._session_environment = None
+
+                    self._session_stack.close()
+
+    @contextmanager
+    def _passphrase_environment(self) -> Iterator[Dict[str, str]]:
+        """Get environment for use with Borg CLI, using session if any.
+
+        See 'PassphraseFile' and 'session'.
+        """
+        session_environment = self._session_environment
+
+        if session_environment is not None:
+            yield dict(session_environment)
+
+            return
+
+        with PassphraseFile(self.passphrase) as environment:
+            yield environment
+
+    def close_ssh_connection(self, *, force: bool = True) -> None:
+        """Close shared SSH connection, if any.
+
+        Other repositories on the same host may use the same connection. If
+        'force' is true, commands running over it are cut off. Otherwise, the
+        connection only stops accepting new commands, and is closed once running
+        commands finish. In both cases, new commands open a new connection.
+        """
+        ssh_control_path = self._ssh_control_path
+
+        if not ssh_control_path or not os.path.exists(ssh_control_path):
+            return
+
+        subprocess.run(
+            [
+                SSH_BIN,
+                f"-oControlPath={ssh_control_path}",
+                "-O",
+                "exit" if force else "stop",
+                urlparse(self.path).hostname or "",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
     @check_repository_not_locked
     def create(self, *, encryption: BorgRepositoryEncryptionName) -> None:
         """Create repository."""
@@ -148,17 +541,101 @@ class Repository:
 
         # Execute command
 
-        with PassphraseFile(self.passphrase) as environment:
-            BorgRegularCommand().execute(
+        with self._passphrase_environment() as environment:
+            BorgRegularCommand(repository_path=self.path).execute(
                 command=BorgCommand.SUBCOMMAND_INIT,
                 arguments=arguments,
+                capture_stderr=self._capture_stderr,
+                **self._cli_options,
+                environment=environment,
+            )
+
+    def _execute_maintenance_command(
+        self,
+        *,
+        command: str,
+        arguments: List[str],
+        environment: Dict[str, str],
+        progress: bool,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]],
+        capture: Optional[ProgressCapture],
+    ) -> Optional[Operation]:
+        """Execute command that doesn't log progress by default.
+
+        If 'progress' is True, the command is run as logged command, and an
+        operation is returned. See 'BorgLoggedCommand.execute' for 'line_callback'
+        and 'capture'. Otherwise, None is returned.
+        """
+        if not progress:
+            BorgRegularCommand(repository_path=self.path).execute(
+                command=command,
+                arguments=arguments,
+                capture_stderr=self._capture_stderr,
                 **self._cli_options,
                 environment=environment,
             )
 
+            return None
+
+        logged_command = BorgLoggedCommand(repository_path=self.path)
+
+        logged_command.execute(
+            command=command,
+            arguments=arguments,
+            **self._cli_options,
+            environment=environment,
+            line_callback=line_callback,
+            capture=capture,
+        )
+
+        return Operation(
+            progress_file=logged_command.file, capture=logged_command.capture
+        )
+
+    @overload
+    def delete(
+        self,
+        *,
+        progress: Literal[False] = ...,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = ...,
+        capture: Optional[ProgressCapture] = ...,
+    ) -> None: ...
+
+    @overload
+    def delete(
+        self,
+        *,
+        progress: Literal[True],
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = ...,
+        capture: Optional[ProgressCapture] = ...,
+    ) -> Operation: ...
+
     @check_repository_not_locked
-    def delete(self) -> None:
-        """Delete repository."""
+    def delete(
+        self,
+        *,
+        progress: bool = False,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+    ) -> Optional[Operation]:
+        """Delete repository.
+
+        If 'progress' is True, progress is logged, and an operation is returned.
+        See 'BorgLoggedCommand.execute' for 'line_callback' and 'capture'.
+        """
+
+        # Remove entries from index. This is done beforehand, as the ID can't be
+        # gotten once the repository is deleted. If deleting fails, archives are
+        # indexed again when needed. Failing to remove entries doesn't stop the
+        # repository from being deleted, as they are never used again.
+
+        if self.contents_index is not None:
+            try:
+                self.contents_index.remove_repository(self.id_)
+            except Exception:
+                logger.exception("Removing repository from contents index failed")
+
+        self._id = None
 
         # Construct arguments
 
@@ -166,12 +643,14 @@ class Repository:
 
         # Execute command
 
-        with PassphraseFile(self.passphrase) as environment:
-            BorgRegularCommand().execute(
+        with self._passphrase_environment() as environment:
+            return self._execute_maintenance_command(
                 command=BorgCommand.SUBCOMMAND_DELETE,
                 arguments=arguments,
-                **self._cli_options,
                 environment=environment | {"BORG_DELETE_I_KNOW_WHAT_I_AM_DOING": "YES"},
+                progress=progress,
+                line_callback=line_callback,
+                capture=capture,
             )
 
     @property
@@ -182,11 +661,9 @@ class Repository:
         Therefore, we try getting archives. Inspired by:
         https://github.com/borgbackup/borg/issues/271#issuecomment-378091437
         """
-        MESSAGE_FAILED_ACQUIRE_LOCK = "Failed to create/acquire the lock"
-
         try:
-            with PassphraseFile(self.passphrase) as environment:
-                BorgRegularCommand().execute(
+            with self._passphrase_environment() as environment:
+                BorgRegularCommand(repository_path=self.path).execute(
                     command=BorgCommand.SUBCOMMAND_LIST,
                     arguments=[self.path],
                     capture_stderr=True,
@@ -233,10 +710,10 @@ class Repository:
 
         # Execute command
 
-        command = BorgRegularCommand()
+        command = BorgRegularCommand(repository_path=self.path)
 
         try:
-            with PassphraseFile(self.passphrase) as environment:
+            with self._passphrase_environment() as environment:
                 command.execute(
                     command=BorgCommand.SUBCOMMAND_WITH_LOCK,
                     arguments=arguments,
@@ -249,15 +726,7 @@ class Repository:
             # any of these log lines say that the command failed because there
             # was a lock, return False.
 
-            for line in e.stderr.splitlines():
-                line = json.loads(line)
-
-                if line["type"] != JSONLineType.LOG_MESSAGE.value:
-                    continue
-
-                if line.get("msgid", None) != MessageID.LOCK_TIMEOUT.value:
-                    continue
-
+            if _has_lock_timeout_line(e.stderr):
                 return True
 
         # RC is 0, so there was no lock
@@ -285,13 +754,14 @@ class Repository:
 
         # Execute command
 
-        command = BorgRegularCommand()
+        command = BorgRegularCommand(repository_path=self.path)
 
-        with PassphraseFile(self.passphrase) as environment:
+        with self._passphrase_environment() as environment:
             command.execute(
                 command=BorgCommand.SUBCOMMAND_LIST,
                 arguments=arguments,
                 json_format=True,
+                capture_stderr=self._capture_stderr,
                 **self._cli_options,
                 environment=environment,
             )
@@ -302,16 +772,24 @@ class Repository:
                     repository=self,
                     name=archive["name"],
                     comment=archive["comment"],
+                    id_=archive["id"],
                 )
             )
 
         return results
 
     @check_repository_not_locked
-    def check(self) -> bool:
+    def check(
+        self,
+        *,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+    ) -> bool:
         """Check repository.
 
         Returns False in case issues were found.
+
+        See 'BorgLoggedCommand.execute' for 'line_callback' and 'capture'.
         """
 
         # Construct arguments
@@ -321,18 +799,53 @@ class Repository:
         # Execute command
 
         try:
-            with PassphraseFile(self.passphrase) as environment:
-                BorgLoggedCommand().execute(
+            with self._passphrase_environment() as environment:
+                BorgLoggedCommand(repository_path=self.path).execute(
                     command=BorgCommand.SUBCOMMAND_CHECK,
                     arguments=arguments,
                     **self._cli_options,
                     environment=environment,
+                    line_callback=line_callback,
+                    capture=capture,
                 )
-        except LoggedCommandFailedError:
+        except LoggedCommandFailedError as e:
+            if _is_lock_timeout_error(e):  # Not an issue with the repository
+                raise RepositoryLockedError from e
+
             return False
 
         return True
 
+    @overload
+    def prune(
+        self,
+        *,
+        keep_last: Optional[int] = ...,
+        keep_hourly: Optional[int] = ...,
+        keep_daily: Optional[int] = ...,
+        keep_weekly: Optional[int] = ...,
+        keep_monthly: Optional[int] = ...,
+        keep_yearly: Optional[int] = ...,
+        progress: Literal[False] = ...,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = ...,
+        capture: Optional[ProgressCapture] = ...,
+    ) -> List[str]: ...
+
+    @overload
+    def prune(
+        self,
+        *,
+        keep_last: Optional[int] = ...,
+        keep_hourly: Optional[int] = ...,
+        keep_daily: Optional[int] = ...,
+        keep_weekly: Optional[int] = ...,
+        keep_monthly: Optional[int] = ...,
+        keep_yearly: Optional[int] = ...,
+        progress: Literal[True],
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = ...,
+        capture: Optional[ProgressCapture] = ...,
+    ) -> Tuple[Operation, List[str]]: ...
+
     @check_repository_not_locked
     @compact_repository
     def prune(
@@ -344,69 +857,100 @@ class Repository:
         keep_weekly: Optional[int] = None,
         keep_monthly: Optional[int] = None,
         keep_yearly: Optional[int] = None,
-    ) -> List[str]:
-        """Prune repository archives."""
-        pruned_archives_names = []
+        progress: bool = False,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+    ) -> Union[List[str], Tuple[Operation, List[str]]]:
+        """Prune repository archives, and return names of pruned archives.
+
+        If 'progress' is True, progress is logged, and an operation is returned
+        as well. See 'BorgLoggedCommand.execute' for 'line_callback' and 'capture'.
+        The repository is compacted afterwards without progress. To follow the
+        compaction as well, call 'compact' with 'progress'.
+        """
 
         # Get archives before prune
 
-        before_archives_names = [a.name for a in self.archives()]
+        before_archives = self.archives()
+        before_archives_names = [a.name for a in before_archives]
 
         # Construct arguments
 
-        arguments = []
-
-        if keep_last:
-            arguments.append(f"--keep-last={keep_last}")
-
-        if keep_hourly:
-            arguments.append(f"--keep-hourly={keep_hourly}")
-
-        if keep_daily:
-            arguments.append(f"--keep-daily={keep_daily}")
-
-        if keep_weekly:
-            arguments.append(f"--keep-weekly={keep_weekly}")
-
-        if keep_monthly:
-            arguments.append(f"--keep-monthly={keep_monthly}")
-
-        if keep_yearly:
-            arguments.append(f"--keep-yearly={keep_yearly}")
-
-        arguments.append(self.path)
+        arguments = _get_prune_arguments(
+            path=self.path,
+            keep_last=keep_last,
+            keep_hourly=keep_hourly,
+            keep_daily=keep_daily,
+            keep_weekly=keep_weekly,
+            keep_monthly=keep_monthly,
+            keep_yearly=keep_yearly,
+        )
 
         # Execute command
 
-        with PassphraseFile(self.passphrase) as environment:
-            BorgRegularCommand().execute(
+        with self._passphrase_environment() as environment:
+            operation = self._execute_maintenance_command(
                 command=BorgCommand.SUBCOMMAND_PRUNE,
                 arguments=arguments,
-                **self._cli_options,
                 environment=environment,
+                progress=progress,
+                line_callback=line_callback,
+                capture=capture,
             )
 
         # Get archives after prune
 
         after_archives_names = [a.name for a in self.archives()]
 
-        # Get removed archives (in before list, not in after list)
-        #
-        # Not possible to get neatly, see: https://github.com/borgbackup/borg/discussions/7021
+        pruned_archives_names = _get_pruned_archives_names(
+            before_archives_names, after_archives_names
+        )
 
-        for archive_name in before_archives_names:
-            if archive_name in after_archives_names:
-                continue
+        self._remove_archives_from_index(
+            [
+                a.id_
+                for a in before_archives
+                if a.id_ is not None and a.name in pruned_archives_names
+            ]
+        )
 
-            pruned_archives_names.append(archive_name)
+        if operation is None:
+            return pruned_archives_names
 
-        return pruned_archives_names
+        return operation, pruned_archives_names
+
+    @overload
+    def compact(
+        self,
+        *,
+        progress: Literal[False] = ...,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = ...,
+        capture: Optional[ProgressCapture] = ...,
+    ) -> None: ...
+
+    @overload
+    def compact(
+        self,
+        *,
+        progress: Literal[True],
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = ...,
+        capture: Optional[ProgressCapture] = ...,
+    ) -> Operation: ...
 
     @check_repository_not_locked
-    def compact(self) -> None:
+    def compact(
+        self,
+        *,
+        progress: bool = False,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
+    ) -> Optional[Operation]:
         """Compact repository.
 
         Run after deleting archives. See: https://borgbackup.readthedocs.io/en/stable/usage/notes.html#separate-compaction
+
+        If 'progress' is True, progress is logged, and an operation is returned.
+        See 'BorgLoggedCommand.execute' for 'line_callback' and 'capture'.
         """
 
         # Construct arguments
@@ -415,10 +959,12 @@ class Repository:
 
         # Execute command
 
-        with PassphraseFile(self.passphrase) as environment:
-            BorgRegularCommand().execute(
+        with self._passphrase_environment() as environment:
+            return self._execute_maintenance_command(
                 command=BorgCommand.SUBCOMMAND_COMPACT,
                 arguments=arguments,
-                **self._cli_options,
                 environment=environment,
+                progress=progress,
+                line_callback=line_callback,
+                capture=capture,
             )
@@ -0,0 +1,191 @@
+"""Classes for navigating archive contents as a tree.
+
+'Archive.contents' returns a flat list of filesystem objects. An 'ArchiveTree'
+is built from the same listing in one pass, and allows navigating directories
+without running Borg again, e.g. for a file browser. It also aggregates sizes
+and amounts of files per directory, like 'du'.
+"""
+
+import os
+import sys
+from typing import Dict, Iterator, List, Optional
+
+from cyberfusion.BorgSupport.archives import Archive, FilesystemObject
+from cyberfusion.BorgSupport.exceptions import PathNotExistsError
+
+
+class ArchiveTreeNode:
+    """Node in archive tree.
+
+    'filesystem_object' is None for directories that were not listed themselves,
+    such as the root, and parents of the path that the tree was built from.
+
+    'total_size' and 'total_files' are the size and amount of regular files in
+    the node and all nodes below it.
+    """
+
+    __slots__ = (
+        "name",
+        "parent",
+        "filesystem_object",
+        "children",
+        "total_size",
+        "total_files",
+    )
+
+    def __init__(self, name: str, parent: Optional["ArchiveTreeNode"]) -> None:
+        """Set attributes."""
+        self.name = name
+        self.parent = parent
+
+        self.filesystem_object: Optional[FilesystemObject] = None
+        self.children: Optional[Dict[str, ArchiveTreeNode]] = None  # By name
+
+        self.total_size = 0
+        self.total_files = 0
+
+    @property
+    def path(self) -> str:
+        """Get path in archive. The root has an empty path."""
+        names = []
+        node: Optional[ArchiveTreeNode] = self
+
+        while node is not None and node.parent is not None:
+            names.append(node.name)
+
+            node = node.parent
+
+        return os.path.sep.join(reversed(names))
+
+    def get_child(self, name: str) -> Optional["ArchiveTreeNode"]:
+        """Get child by name, or None if it doesn't exist."""
+        if self.children is None:
+            return None
+
+        return self.children.get(name)
+
+    def get_children(self) -> List["ArchiveTreeNode"]:
+        """Get children, in the order that Borg listed them."""
+        if self.children is None:
+            return []
+
+        return list(self.children.values())
+
+    def iter_subtree(self) -> Iterator["ArchiveTreeNode"]:
+        """Yield this node and all nodes below it, depth-first, parents before children."""
+        stack = [self]
+
+        while stack:
+            node = stack.pop()
+
+            yield node
+
+            if node.children is not None:
+                stack.extend(reversed(node.children.values()))
+
+    def _add_child(self, name: str) -> "ArchiveTreeNode":
+        """Get child by name, adding it if it doesn't exist."""
+        if self.children is None:
+            self.children = {}
+
+        child = self.children.get(name)
+
+        if child is None:
+            child = self.children[name] = ArchiveTreeNode(name, self)
+
+        return child
+
+
+class ArchiveTree:
+    """Tree of archive contents.
+
+    The tree is built from the contents of 'archive' below 'path', which are
+    streamed (see 'Archive.iter_contents'). Names of nodes are interned, as the
+    same names occur in many directories.
+    """
+
+    def __init__(self, *, archive: Archive, path: Optional[str] = None) -> None:
+        """Set attributes, and build tree."""
+        self.archive = archive
+        self.root = ArchiveTreeNode("", None)
+
+        # Borg lists objects in a directory consecutively, so the parent of an
+        # object is usually the parent of the previous one
+
+        self._last_parent_path = ""
+        self._last_parent = self.root
+
+        for filesystem_object in archive.iter_contents(path=path):
+            self._add(filesystem_object)
+
+    def _get_parent(self, parent_path: str) -> ArchiveTreeNode:
+        """Get node for path of parent, adding nodes that don't exist."""
+        if parent_path == self._last_parent_path:
+            return self._last_parent
+
+        node = self.root
+
+        if parent_path:  # Empty for objects in root
+            for name in parent_path.split(os.path.sep):
+                node = node._add_child(sys.intern(name))
+
+        self._last_parent_path = parent_path
+        self._last_parent = node
+
+        return node
+
+    def _add(self, filesystem_object: FilesystemObject) -> None:
+        """Add filesystem object to tree, and update aggregates of its parents."""
+        parent_path, _, name = filesystem_object.path.rpartition(os.path.sep)
+
+        node = self._get_parent(parent_path)._add_child(sys.intern(name))
+
+        node.filesystem_object = filesystem_object
+
+        # Only set for regular files. Unlike 'type_', doesn't raise for unsupported
+        # types (such as FIFOs)
+
+        size = filesystem_object.size
+
+        if size is None:
+            return
+
+        ancestor: Optional[ArchiveTreeNode] = node
+
+        while ancestor is not None:
+            ancestor.total_size += size
+            ancestor.total_files += 1
+
+            ancestor = ancestor.parent
+
+    def get_node(self, path: str) -> ArchiveTreeNode:
+        """Get node by path in archive.
+
+        Raises PathNotExistsError if there is no node at the path.
+        """
+        node = self.root
+
+        normalized_path = os.path.normpath(path).strip(os.path.sep)
+
+        if normalized_path in ("", "."):
+            return node
+
+        for name in normalized_path.split(os.path.sep):
+            child = node.get_child(name)
+
+            if child is None:
+                raise PathNotExistsError
+
+            node = child
+
+        return node
+
+    def iter_subtree(self, path: Optional[str] = None) -> Iterator[ArchiveTreeNode]:
+        """Yield node at path (or the root) and all nodes below it.
+
+        See 'ArchiveTreeNode.iter_subtree'.
+        """
+        if path is None:
+            return self.root.iter_subtree()
+
+        return self.get_node(path).iter_subtree()
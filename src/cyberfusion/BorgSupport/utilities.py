@@ -4,11 +4,15 @@ import base64
 import os
 import secrets
 import shutil
+import stat
 import string
 import uuid
 from hashlib import md5
 
-from cyberfusion.BorgSupport.exceptions import ExecutableNotFoundError
+from cyberfusion.BorgSupport.exceptions import (
+    DirectoryNotPrivateError,
+    ExecutableNotFoundError,
+)
 
 
 def get_md5_hash(path: str) -> str:
@@ -53,3 +57,43 @@ def get_tmp_file() -> str:
     os.chmod(path, 0o600)  # Do not allow regular users to view file contents
 
     return path
+
+
+def check_directory_private(path: str) -> None:
+    """Check that directory is private to the current user.
+
+    Raises DirectoryNotPrivateError if the path is a symlink, is owned by another
+    user, or has another mode than 0700.
+    """
+    stat_ = os.lstat(path)
+
+    if (
+        not stat.S_ISDIR(stat_.st_mode)
+        or stat_.st_uid != os.getuid()
+        or stat.S_IMODE(stat_.st_mode) != 0o700
+    ):
+        raise DirectoryNotPrivateError(path)
+
+
+def get_ssh_control_directory() -> str:
+    """Create directory for SSH control sockets and return path.
+
+    The directory is specific to the current user, and not accessible by others.
+    As its path is predictable, another user may have created it first, to plant
+    control sockets. Therefore, DirectoryNotPrivateError is raised if it is not
+    private (see 'check_directory_private').
+    """
+    path = os.path.join(
+        os.path.sep, "tmp", "cyberfusion-borg-support-ssh-" + str(os.getuid())
+    )
+
+    try:
+        os.mkdir(path, mode=0o700)
+    except FileExistsError:
+        pass
+    else:
+        os.chmod(path, 0o700)  # Mode passed to 'mkdir' is affected by umask
+
+    check_directory_private(path)
+
+    return path
@@ -126,6 +126,93 @@ def archives(
     pass
 
 
+@pytest.fixture
+def archive_contents_lines() -> List[dict]:
+    """Get lines that Borg lists for archive contents, e.g. to mock listing."""
+    return [
+        {
+            "type": "d",
+            "mode": "drwxr-xr-x",
+            "user": "root",
+            "group": "root",
+            "path": "home",
+            "linktarget": "",
+            "mtime": "2024-01-01T00:00:00.000000",
+            "size": 0,
+        },
+        {
+            "type": "-",
+            "mode": "-rw-r--r--",
+            "user": "example",
+            "group": "example",
+            "path": "home/example.txt",
+            "linktarget": "",
+            "mtime": "2024-01-02T00:00:00.000000",
+            "size": 5,
+        },
+        {
+            "type": "d",
+            "mode": "drwxr-xr-x",
+            "user": "example",
+            "group": "example",
+            "path": "home/example",
+            "linktarget": "",
+            "mtime": "2024-01-03T00:00:00.000000",
+            "size": 0,
+        },
+        {
+            "type": "-",
+            "mode": "-rw-r--r--",
+            "user": "example",
+            "group": "example",
+            "path": "home/example/example.txt",
+            "linktarget": "",
+            "mtime": "2024-01-04T00:00:00.000000",
+            "size": 10,
+        },
+        {
+            "type": "l",
+            "mode": "lrwxrwxrwx",
+            "user": "example",
+            "group": "example",
+            "path": "home/link",
+            "linktarget": "/home/example.txt",
+            "mtime": "2024-01-05T00:00:00.000000",
+            "size": 0,
+        },
+        {
+            "type": "d",
+            "mode": "drwxr-xr-x",
+            "user": "root",
+            "group": "root",
+            "path": "home2",
+            "linktarget": "",
+            "mtime": "2024-01-06T00:00:00.000000",
+            "size": 0,
+        },
+        {
+            "type": "-",
+            "mode": "-rw-r--r--",
+            "user": "root",
+            "group": "root",
+            "path": "var/log/example.log",
+            "linktarget": "",
+            "mtime": "2024-01-07T00:00:00.000000",
+            "size": 20,
+        },
+        {
+            "type": "d",
+            "mode": "drwxrwxrwt",
+            "user": "root",
+            "group": "root",
+            "path": "tmp",
+            "linktarget": "",
+            "mtime": "2024-01-08T00:00:00.000000",
+            "size": 0,
+        },
+    ]
+
+
 @pytest.fixture
 def borg_regular_command() -> BorgRegularCommand:
     return BorgRegularCommand()
@@ -1,5 +1,6 @@
 import os
 import stat
+import subprocess
 import tarfile
 from pathlib import Path
 from typing import Generator, List
@@ -7,11 +8,19 @@ from typing import Generator, List
 import pytest
 from pytest_mock import MockerFixture  # type: ignore[attr-defined]
 
-from cyberfusion.BorgSupport.archives import Archive, UNIXFileType
+from cyberfusion.BorgSupport.archives import (
+    Archive,
+    FilesystemObject,
+    UNIXFileType,
+    _get_not_recursive_exclude_pattern,
+)
+from cyberfusion.BorgSupport.borg_cli import BorgRegularCommand
+from cyberfusion.BorgSupport.captures import ProgressCapture
 from cyberfusion.BorgSupport.exceptions import (
     PathNotExistsError,
     RepositoryLockedError,
 )
+from cyberfusion.BorgSupport.indexes import ArchiveContentsIndex
 from cyberfusion.BorgSupport.operations import Operation
 from cyberfusion.BorgSupport.repositories import Repository
 from cyberfusion.BorgSupport.utilities import generate_random_string
@@ -61,6 +70,64 @@ def test_archive_create_paths_removed(
     assert os.path.isdir(path2)
 
 
+def test_archive_create_stats(
+    repository_init: Generator[Repository, None, None],
+    dummy_files: Generator[None, None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    archive = Archive(
+        repository=repository_init, name="test", comment="Free-form comment!"
+    )
+
+    operation = archive.create(
+        paths=[os.path.join(workspace_directory, "backmeupdir1")],
+        excludes=[],
+        stats=True,
+    )
+
+    assert operation.archive_stats is not None
+    assert operation.archive_stats.original_size > 0
+    assert operation.archive_stats.nfiles > 0
+    assert operation.archive_stats.duration >= 0
+
+    # Progress lines are still written to progress file
+
+    assert operation.progress_file is not None
+    assert operation.get_lines()
+
+
+def test_archive_create_stats_capture(
+    repository_init: Generator[Repository, None, None],
+    dummy_files: Generator[None, None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    archive = Archive(
+        repository=repository_init, name="test", comment="Free-form comment!"
+    )
+
+    operation = archive.create(
+        paths=[os.path.join(workspace_directory, "backmeupdir1")],
+        excludes=[],
+        capture=ProgressCapture(),
+        stats=True,
+    )
+
+    assert operation.archive_stats is not None
+    assert operation.archive_stats.nfiles > 0
+
+
+def test_archive_create_without_stats(
+    archives: Generator[List[Archive], None, None],
+) -> None:
+    archive = Archive(
+        repository=archives[0].repository, name="test2", comment="Free-form comment!"
+    )
+
+    operation = archive.create(paths=[], excludes=[])
+
+    assert operation.archive_stats is None
+
+
 def test_archive_extract(
     repository_init: Generator[Repository, None, None],
     archives: Generator[List[Archive], None, None],
@@ -385,9 +452,117 @@ def test_archive_contents_not_recursive(
     assert contents[2].path == f"{dir1}/testdir"
 
 
+def test_archive_contents_not_recursive_excluded_by_borg(
+    mocker: MockerFixture,
+    archives: Generator[List[Archive], None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    dir1 = os.path.join(workspace_directory, "backmeupdir1")[len(os.path.sep) :]
+
+    spy_execute_streaming = mocker.spy(BorgRegularCommand, "execute_streaming")
+
+    contents = archives[0].contents(path=f"/{dir1}/", recursive=False)
+
+    assert [content.path for content in contents] == [
+        dir1,
+        f"{dir1}/test1.txt",
+        f"{dir1}/testdir",
+    ]
+
+    arguments = spy_execute_streaming.call_args.kwargs["arguments"]
+
+    assert arguments[:3] == ["--json-lines", "--exclude", f"sh:{dir1}/*/*"]
+
+
+def test_get_not_recursive_exclude_pattern() -> None:
+    assert _get_not_recursive_exclude_pattern("home/example") == "sh:home/example/*/*"
+    assert _get_not_recursive_exclude_pattern("") == "sh:*/*"
+    assert (
+        _get_not_recursive_exclude_pattern("home/[*?]/test")
+        == "sh:home/[[][*][?]]/test/*/*"
+    )
+
+
 def test_archive_contents_path_not_exists(
     archives: Generator[List[Archive], None, None],
     workspace_directory: Generator[str, None, None],
 ) -> None:
     with pytest.raises(PathNotExistsError):
         archives[0].contents(path="doesntexist")
+
+
+def test_archive_iter_contents(
+    archives: Generator[List[Archive], None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    dir1 = os.path.join(workspace_directory, "backmeupdir1")[len(os.path.sep) :]
+
+    assert [content.path for content in archives[0].iter_contents(path=dir1)] == [
+        content.path for content in archives[0].contents(path=dir1)
+    ]
+
+
+def test_archive_iter_contents_stopped_early(
+    mocker: MockerFixture,
+    archives: Generator[List[Archive], None, None],
+) -> None:
+    spy_kill = mocker.spy(subprocess.Popen, "kill")
+
+    contents = archives[0].iter_contents(path=None)
+
+    assert isinstance(next(contents), FilesystemObject)
+
+    contents.close()
+
+    spy_kill.assert_called_once()
+
+
+def test_archive_iter_contents_path_not_exists(
+    archives: Generator[List[Archive], None, None],
+) -> None:
+    contents = archives[0].iter_contents(path="doesntexist")
+
+    with pytest.raises(PathNotExistsError):
+        next(contents)
+
+
+def test_archive_contents_index(
+    mocker: MockerFixture,
+    archives: Generator[List[Archive], None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    dir1 = os.path.join(workspace_directory, "backmeupdir1")[len(os.path.sep) :]
+
+    expected_recursive = [c.path for c in archives[0].contents(path=dir1)]
+    expected_not_recursive = [
+        c.path for c in archives[0].contents(path=dir1, recursive=False)
+    ]
+
+    archives[0].repository.contents_index = ArchiveContentsIndex(":memory:")
+
+    spy_iter_borg_contents = mocker.spy(Archive, "_iter_borg_contents")
+
+    assert [c.path for c in archives[0].contents(path=dir1)] == expected_recursive
+    assert [
+        c.path for c in archives[0].contents(path=dir1, recursive=False)
+    ] == expected_not_recursive
+
+    spy_iter_borg_contents.assert_called_once()  # When indexing
+
+
+def test_archive_extract_capture(
+    archives: Generator[List[Archive], None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    dir1 = os.path.join(workspace_directory, "backmeupdir1")[len(os.path.sep) :]
+
+    capture = ProgressCapture()
+
+    operation, _ = archives[0].extract(
+        destination_path=os.path.join(workspace_directory, generate_random_string()),
+        restore_paths=[dir1],
+        capture=capture,
+    )
+
+    assert operation.capture == capture
+    assert operation.progress_file is None
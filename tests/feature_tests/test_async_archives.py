@@ -0,0 +1,148 @@
+import asyncio
+import os
+import stat
+from typing import Generator, List
+
+import pytest
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
+
+from cyberfusion.BorgSupport.archives import Archive
+from cyberfusion.BorgSupport.async_archives import AsyncArchive
+from cyberfusion.BorgSupport.async_repositories import AsyncRepository
+from cyberfusion.BorgSupport.exceptions import RepositoryLockedError
+from cyberfusion.BorgSupport.operations import Operation
+from cyberfusion.BorgSupport.repositories import Repository
+from cyberfusion.BorgSupport.utilities import generate_random_string
+
+
+@pytest.fixture
+def async_archive(
+    repository_init: Generator[Repository, None, None],
+    archives: Generator[List[Archive], None, None],
+) -> AsyncArchive:
+    return AsyncArchive(
+        repository=AsyncRepository(repository=repository_init),
+        name=archives[0].name,
+        comment=archives[0].comment,
+    )
+
+
+def test_async_archive_attributes(
+    async_archive: AsyncArchive,
+    archives: Generator[List[Archive], None, None],
+) -> None:
+    assert async_archive.name == archives[0].name
+    assert async_archive.full_name == archives[0].full_name
+    assert async_archive.comment == archives[0].comment
+
+
+def test_async_archive_create_locked(
+    mocker: MockerFixture,
+    repository_init: Generator[Repository, None, None],
+) -> None:
+    mocker.patch(
+        "cyberfusion.BorgSupport.async_repositories.AsyncRepository.is_locked",
+        return_value=True,
+    )
+
+    archive = AsyncArchive(
+        repository=AsyncRepository(repository=repository_init),
+        name="test",
+        comment="Free-form comment!",
+    )
+
+    with pytest.raises(RepositoryLockedError):
+        asyncio.run(archive.create(paths=[], excludes=[]))
+
+
+def test_async_archive_create_stats(
+    repository_init: Generator[Repository, None, None],
+    dummy_files: Generator[None, None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    archive = AsyncArchive(
+        repository=AsyncRepository(repository=repository_init),
+        name="test",
+        comment="Free-form comment!",
+    )
+
+    operation = asyncio.run(
+        archive.create(
+            paths=[os.path.join(workspace_directory, "backmeupdir1")],
+            excludes=[],
+            stats=True,
+        )
+    )
+
+    assert operation.archive_stats is not None
+    assert operation.archive_stats.nfiles > 0
+
+
+def test_async_archive_create_stats_line_callback(
+    repository_init: Generator[Repository, None, None],
+    dummy_files: Generator[None, None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    lines: list = []
+
+    archive = AsyncArchive(
+        repository=AsyncRepository(repository=repository_init),
+        name="test",
+        comment="Free-form comment!",
+    )
+
+    operation = asyncio.run(
+        archive.create(
+            paths=[os.path.join(workspace_directory, "backmeupdir1")],
+            excludes=[],
+            line_callback=lines.append,
+            stats=True,
+        )
+    )
+
+    assert lines
+    assert operation.archive_stats is not None
+    assert operation.archive_stats.nfiles > 0
+
+
+def test_async_archive_extract(
+    async_archive: AsyncArchive,
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    dir1 = os.path.join(workspace_directory, "backmeupdir1")[len(os.path.sep) :]
+
+    _destination_path = os.path.join(workspace_directory, generate_random_string())
+
+    operation, destination_path = asyncio.run(
+        async_archive.extract(
+            destination_path=_destination_path,
+            restore_paths=[dir1],
+        )
+    )
+
+    assert isinstance(operation, Operation)
+    assert destination_path == _destination_path
+    assert stat.S_IMODE(os.lstat(destination_path).st_mode) == 0o700
+    assert open(f"{_destination_path}/{dir1}/test1.txt", "r").read() == "Hi! 1"
+
+
+def test_async_archive_export_tar(
+    async_archive: AsyncArchive,
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    dir1 = os.path.join(workspace_directory, "backmeupdir1")[len(os.path.sep) :]
+
+    path = f"{workspace_directory}/mytar.tar.gz"
+
+    operation, destination_path, md5_hash = asyncio.run(
+        async_archive.export_tar(
+            destination_path=path,
+            restore_paths=[dir1],
+            strip_components=1,
+        )
+    )
+
+    assert isinstance(operation, Operation)
+    assert destination_path == path
+    assert "==" in md5_hash
+    assert stat.S_IMODE(os.lstat(destination_path).st_mode) == 0o600
@@ -0,0 +1,219 @@
+import asyncio
+import os
+from typing import Generator, List
+
+import pytest
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
+
+from cyberfusion.BorgSupport.archives import Archive
+from cyberfusion.BorgSupport.async_archives import AsyncArchive
+from cyberfusion.BorgSupport.async_repositories import AsyncRepository
+from cyberfusion.BorgSupport.captures import ProgressCapture
+from cyberfusion.BorgSupport.exceptions import (
+    ArchiveNotExistsError,
+    RepositoryLockedError,
+)
+from cyberfusion.BorgSupport.indexes import ArchiveContentsIndex
+from cyberfusion.BorgSupport.operations import Operation
+from cyberfusion.BorgSupport.repositories import Repository
+
+
+def test_async_repository_attributes(
+    repository: Generator[Repository, None, None],
+) -> None:
+    async_repository = AsyncRepository(repository=repository)
+
+    assert async_repository.repository == repository
+    assert async_repository.path == repository.path
+    assert async_repository.passphrase == repository.passphrase
+
+
+def test_async_repository_not_locked(
+    repository_init: Generator[Repository, None, None],
+) -> None:
+    assert not asyncio.run(AsyncRepository(repository=repository_init).is_locked())
+
+
+def test_async_repository_archives(
+    repository_init: Generator[Repository, None, None],
+    archives: Generator[List[Archive], None, None],
+) -> None:
+    async_repository = AsyncRepository(repository=repository_init)
+
+    results = asyncio.run(async_repository.archives())
+
+    assert len(results) == 1
+
+    assert isinstance(results[0], AsyncArchive)
+    assert results[0].repository == async_repository
+    assert results[0].name == "test"
+    assert results[0].comment == "Free-form comment!"
+
+
+def test_async_repository_archives_locked(
+    mocker: MockerFixture, repository_init: Generator[Repository, None, None]
+) -> None:
+    mocker.patch(
+        "cyberfusion.BorgSupport.async_repositories.AsyncRepository.is_locked",
+        return_value=True,
+    )
+
+    with pytest.raises(RepositoryLockedError):
+        asyncio.run(AsyncRepository(repository=repository_init).archives())
+
+
+def test_async_repository_get_archive_not_exists(
+    repository_init: Generator[Repository, None, None],
+    archives: Generator[List[Archive], None, None],
+) -> None:
+    with pytest.raises(ArchiveNotExistsError):
+        asyncio.run(
+            AsyncRepository(repository=repository_init).get_archive("doesntexist")
+        )
+
+
+def test_async_repository_check_has_integrity(
+    repository_init: Generator[Repository, None, None],
+) -> None:
+    assert asyncio.run(AsyncRepository(repository=repository_init).check())
+
+
+def test_async_repository_prune(
+    repository_init: Generator[Repository, None, None],
+    dummy_files: Generator[None, None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    async_repository = AsyncRepository(repository=repository_init)
+
+    async def create_archives() -> None:
+        for name in ["prunetest1", "prunetest2"]:
+            await AsyncArchive(
+                repository=async_repository,
+                name=name,
+                comment="Free-form comment!",
+            ).create(
+                paths=[os.path.join(workspace_directory, "backmeupdir1")],
+                excludes=[],
+            )
+
+    asyncio.run(create_archives())
+
+    assert asyncio.run(async_repository.prune(keep_last=1)) == ["prunetest1"]
+    assert [a.name for a in repository_init.archives()] == ["prunetest2"]
+
+
+def test_async_repository_prune_progress(
+    repository_init: Generator[Repository, None, None],
+    dummy_files: Generator[None, None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    async_repository = AsyncRepository(repository=repository_init)
+
+    async def create_archives() -> None:
+        for name in ["prunetest1", "prunetest2"]:
+            await AsyncArchive(
+                repository=async_repository,
+                name=name,
+                comment="Free-form comment!",
+            ).create(
+                paths=[os.path.join(workspace_directory, "backmeupdir1")],
+                excludes=[],
+            )
+
+    asyncio.run(create_archives())
+
+    operation, pruned_archives_names = asyncio.run(
+        async_repository.prune(keep_last=1, progress=True)
+    )
+
+    assert pruned_archives_names == ["prunetest1"]
+    assert isinstance(operation, Operation)
+
+
+def test_async_repository_prune_contents_index(
+    repository_init: Generator[Repository, None, None],
+    dummy_files: Generator[None, None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    index = ArchiveContentsIndex(":memory:")
+
+    repository_init.contents_index = index
+
+    async_repository = AsyncRepository(repository=repository_init)
+
+    async def create_archives() -> None:
+        for name in ["prunetest1", "prunetest2"]:
+            await AsyncArchive(
+                repository=async_repository,
+                name=name,
+                comment="Free-form comment!",
+            ).create(
+                paths=[os.path.join(workspace_directory, "backmeupdir1")],
+                excludes=[],
+            )
+
+    asyncio.run(create_archives())
+
+    archives = asyncio.run(async_repository.archives())
+
+    for archive in archives:
+        index.index(archive.archive)
+
+    assert asyncio.run(async_repository.prune(keep_last=1)) == ["prunetest1"]
+
+    assert not index.is_indexed(archives[0].archive)
+    assert index.is_indexed(archives[1].archive)
+    assert archives[1].id_ == archives[1].archive.id_
+
+
+def test_async_repository_compact_progress(
+    repository_init: Generator[Repository, None, None],
+) -> None:
+    capture = ProgressCapture()
+
+    operation = asyncio.run(
+        AsyncRepository(repository=repository_init).compact(
+            progress=True, capture=capture
+        )
+    )
+
+    assert isinstance(operation, Operation)
+    assert operation.capture == capture
+
+
+def test_async_repository_many_concurrently(
+    repository_init: Generator[Repository, None, None],
+    archives: Generator[List[Archive], None, None],
+) -> None:
+    async_repository = AsyncRepository(repository=repository_init)
+
+    async def get_locked() -> list:
+        return await asyncio.gather(
+            *(async_repository.is_locked() for _ in range(5)),
+        )
+
+    assert asyncio.run(get_locked()) == [False] * 5
+
+
+def test_async_repository_check_line_callback(
+    repository_init: Generator[Repository, None, None],
+) -> None:
+    lines = []
+
+    assert asyncio.run(
+        AsyncRepository(repository=repository_init).check(line_callback=lines.append)
+    )
+
+    assert lines
+
+
+def test_async_repository_check_capture(
+    repository_init: Generator[Repository, None, None],
+) -> None:
+    capture = ProgressCapture()
+
+    assert asyncio.run(
+        AsyncRepository(repository=repository_init).check(capture=capture)
+    )
+
+    assert capture.lines
@@ -1,4 +1,9 @@
+import os
+
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
+
 from cyberfusion.BorgSupport import Borg
+from cyberfusion.BorgSupport.borg_cli import BorgCommand
 
 
 def test_borg_version() -> None:
@@ -7,3 +12,43 @@ def test_borg_version() -> None:
     assert isinstance(major, int)
     assert isinstance(minor, int)
     assert isinstance(point, int)
+
+
+def test_borg_version_cached(mocker: MockerFixture) -> None:
+    Borg.clear_version_cache()
+
+    spy_get_version = mocker.spy(Borg, "_get_version")
+
+    assert Borg().version == Borg().version
+
+    spy_get_version.assert_called_once()
+
+
+def test_borg_version_cache_invalidated(mocker: MockerFixture) -> None:
+    Borg.clear_version_cache()
+
+    version = Borg().version
+
+    # Pretend binary was replaced
+
+    path = os.path.realpath(BorgCommand.BORG_BIN)
+    inode, modification_time, _ = Borg._versions[path]
+    Borg._versions[path] = (inode, modification_time - 1, version)
+
+    spy_get_version = mocker.spy(Borg, "_get_version")
+
+    assert Borg().version == version
+
+    spy_get_version.assert_called_once()
+
+
+def test_borg_preload_version(mocker: MockerFixture) -> None:
+    Borg.clear_version_cache()
+
+    Borg().preload_version()
+
+    spy_get_version = mocker.spy(Borg, "_get_version")
+
+    Borg().version
+
+    spy_get_version.assert_not_called()
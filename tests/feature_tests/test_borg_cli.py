@@ -1,8 +1,13 @@
 import os
-from typing import Generator
+from typing import Generator, List
+
+import pytest
 
 
 from cyberfusion.BorgSupport import PassphraseFile
+from cyberfusion.BorgSupport.archives import Archive
+from cyberfusion.BorgSupport.captures import ProgressCapture
+from cyberfusion.BorgSupport.exceptions import LoggedCommandFailedError
 from cyberfusion.BorgSupport.borg_cli import (
     BorgLoggedCommand,
     BorgRegularCommand,
@@ -56,3 +61,172 @@ def test_borg_logged_command_attributes(
         )
 
     assert borg_logged_command.file
+
+
+def test_borg_regular_command_execute_streaming_lines(
+    borg_regular_command: BorgRegularCommand,
+) -> None:
+    lines = list(
+        borg_regular_command.execute_streaming(
+            command=None,
+            arguments=["--version"],
+        )
+    )
+
+    assert len(lines) == 1
+    assert lines[0].startswith("borg ")
+    assert not lines[0].endswith("\n")
+    assert borg_regular_command.stderr is None
+
+
+def test_borg_regular_command_execute_streaming_json_lines(
+    archives: Generator[List[Archive], None, None],
+    borg_regular_command: BorgRegularCommand,
+) -> None:
+    with PassphraseFile(archives[0].repository.passphrase) as environment:
+        lines = list(
+            borg_regular_command.execute_streaming(
+                command="list",
+                arguments=["--json-lines", archives[0].full_name],
+                json_lines=True,
+                environment=environment,
+            )
+        )
+
+    assert len(lines) == 7
+    assert all(isinstance(line, dict) for line in lines)
+
+
+def test_borg_regular_command_execute_streaming_stopped_early(
+    archives: Generator[List[Archive], None, None],
+    borg_regular_command: BorgRegularCommand,
+) -> None:
+    with PassphraseFile(archives[0].repository.passphrase) as environment:
+        lines = borg_regular_command.execute_streaming(
+            command="list",
+            arguments=["--json-lines", archives[0].full_name],
+            json_lines=True,
+            environment=environment,
+        )
+
+        assert isinstance(next(lines), dict)
+
+        lines.close()  # Terminates command, does not raise
+
+
+def test_borg_logged_command_line_callback(
+    repository_init: Generator[Repository, None, None],
+    borg_logged_command: BorgLoggedCommand,
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    lines = []
+
+    with PassphraseFile(repository_init.passphrase) as environment:
+        borg_logged_command.execute(
+            command="create",
+            arguments=[
+                os.path.join(workspace_directory, "repository2") + "::testarchivename",
+                "/bin/sh",
+            ],
+            environment=environment,
+            line_callback=lines.append,
+            **repository_init._cli_options,
+        )
+
+    assert lines
+    assert all(isinstance(line, dict) for line in lines)
+
+    # Lines are written to file as well
+
+    assert len(open(borg_logged_command.file).read().splitlines()) >= len(lines)
+
+
+def test_borg_logged_command_execute_streaming(
+    repository_init: Generator[Repository, None, None],
+    borg_logged_command: BorgLoggedCommand,
+) -> None:
+    with PassphraseFile(repository_init.passphrase) as environment:
+        lines = list(
+            borg_logged_command.execute_streaming(
+                command="check",
+                arguments=[repository_init.path],
+                environment=environment,
+                **repository_init._cli_options,
+            )
+        )
+
+    assert lines
+    assert all("type" in line for line in lines)
+    assert os.path.isfile(borg_logged_command.file)
+
+
+def test_borg_logged_command_execute_streaming_raises_exception(
+    borg_logged_command: BorgLoggedCommand,
+) -> None:
+    with pytest.raises(LoggedCommandFailedError):
+        list(
+            borg_logged_command.execute_streaming(
+                command="doesntexist",
+                arguments=[],
+            )
+        )
+
+
+def test_borg_logged_command_capture(
+    repository_init: Generator[Repository, None, None],
+    borg_logged_command: BorgLoggedCommand,
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    lines = []
+    capture = ProgressCapture(max_lines=2)
+
+    with PassphraseFile(repository_init.passphrase) as environment:
+        borg_logged_command.execute(
+            command="create",
+            arguments=[
+                os.path.join(workspace_directory, "repository2") + "::testarchivename",
+                "/bin/sh",
+            ],
+            environment=environment,
+            line_callback=lines.append,
+            capture=capture,
+            **repository_init._cli_options,
+        )
+
+    # Output is not written to file
+
+    assert borg_logged_command.file is None
+    assert borg_logged_command.capture == capture
+
+    assert lines
+    assert 0 < len(capture.lines) <= 2
+    assert capture.total_lines >= len(lines)
+    assert sum(capture.counts_by_type.values()) == len(lines)
+
+
+def test_borg_logged_command_capture_raises_exception(
+    borg_logged_command: BorgLoggedCommand,
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    spill_path = os.path.join(workspace_directory, "progress.json.gz")
+
+    with pytest.raises(LoggedCommandFailedError) as e:
+        borg_logged_command.execute(
+            command="doesntexist",
+            arguments=[],
+            capture=ProgressCapture(spill_path=spill_path),
+        )
+
+    assert e.value.output is not None
+    assert e.value.output_file_path == spill_path
+    assert os.path.isfile(spill_path)
+
+
+def test_borg_logged_command_capture_not_run(
+    borg_logged_command: BorgLoggedCommand,
+) -> None:
+    borg_logged_command.execute(
+        command="check", arguments=[], run=False, capture=ProgressCapture()
+    )
+
+    assert borg_logged_command.file is None
@@ -1,13 +1,42 @@
+import json
+import os
+
 import pytest
+from pytest_mock import MockerFixture
 
 from cyberfusion.BorgSupport.exceptions import OperationLineNotImplementedError
+from cyberfusion.BorgSupport import decoders
+from cyberfusion.BorgSupport.captures import ProgressCapture
 from cyberfusion.BorgSupport.operations import (
     ArchiveProgressLine,
+    ArchiveStats,
+    FileStatusLine,
+    LAZY_LAST_LINES_TYPES,
+    JSONLineType,
+    LogMessageLine,
     Operation,
     ProgressMessageLine,
     ProgressPercentLine,
+    QuestionLine,
+    _get_archive_stats,
 )
 
+ALL_TYPES_LINES = [
+    {"type": "file_status", "status": "A", "path": "home/example/file_status"},
+    {
+        "type": "log_message",
+        "time": 1648247801.0,
+        "levelname": "WARNING",
+        "name": "borg.archiver",
+        "message": "file_status",
+        "msgid": "Repository.DoesNotExist",
+    },
+    {"type": "question_prompt", "msgid": "BORG_CHECK_I_KNOW_WHAT_I_AM_DOING"},
+    {"type": "question_accepted_true", "message": "Yes"},
+    {"type": "unknown_type", "message": "log_message"},
+    {"type": "file_status", "status": "M", "path": "home/example/last"},
+]
+
 
 def test_operation_attributes() -> None:
     # Get operation
@@ -76,3 +105,484 @@ def test_operation_no_lines() -> None:
     # Test last_line is None (as there are no lines)
 
     assert operation.last_line is None
+
+
+def test_operation_refresh(workspace_directory: str) -> None:
+    progress_file = os.path.join(workspace_directory, "progress_file.txt")
+
+    with open("progress_file_with_known_types.txt", "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+
+    with open(progress_file, "wb") as f:
+        f.write(lines[0])
+
+    operation = Operation(progress_file=progress_file)
+
+    assert len(operation._lines) == 1
+
+    # Nothing new
+
+    assert operation.refresh() == []
+
+    # Partial line is parsed once complete
+
+    with open(progress_file, "ab") as f:
+        f.write(lines[1] + lines[2][:10])
+
+    new_lines = operation.refresh()
+
+    assert len(new_lines) == 1
+    assert isinstance(new_lines[0], ProgressMessageLine)
+    assert len(operation._lines) == 2
+
+    with open(progress_file, "ab") as f:
+        f.write(lines[2][10:])
+
+    assert len(operation.refresh()) == 1
+    assert len(operation._lines) == 3
+
+    # Complete line without newline
+
+    with open(progress_file, "ab") as f:
+        f.write(lines[3].rstrip(b"\n"))
+
+    assert len(operation.refresh()) == 1
+
+    with open(progress_file, "ab") as f:
+        f.write(b"\n" + b"".join(lines[4:]))
+
+    operation.refresh()
+
+    assert len(operation._lines) == 12
+    assert [type(line) for line in operation._lines] == [
+        type(line) for line in operation.get_lines()
+    ]
+
+
+def test_operation_lazy_last_line() -> None:
+    operation = Operation(progress_file="progress_file_with_known_types.txt", lazy=True)
+
+    assert not operation._lines
+
+    last_line = operation.last_line
+
+    assert isinstance(last_line, ProgressMessageLine)
+    assert last_line.time == operation.get_lines()[-1].time
+
+
+def test_operation_lazy_last_line_no_lines() -> None:
+    operation = Operation(progress_file="progress_file_with_no_lines.txt", lazy=True)
+
+    assert operation.last_line is None
+    assert operation.last_lines_by_type == {}
+
+
+def test_operation_lazy_last_line_partial(
+    mocker: MockerFixture, workspace_directory: str
+) -> None:
+    """Test that reading backwards works across blocks, and skips partial line."""
+    mocker.patch("cyberfusion.BorgSupport.operations.SIZE_REVERSE_READ_BLOCK", 16)
+
+    progress_file = os.path.join(workspace_directory, "progress_file.txt")
+
+    with open("progress_file_with_known_types.txt", "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+
+    with open(progress_file, "wb") as f:
+        f.write(b"".join(lines[:11]) + lines[11][:10])
+
+    operation = Operation(progress_file=progress_file, lazy=True)
+
+    assert isinstance(operation.last_line, ProgressPercentLine)
+
+    # Complete line without newline
+
+    with open(progress_file, "ab") as f:
+        f.write(lines[11][10:].rstrip(b"\n"))
+
+    assert isinstance(operation.last_line, ProgressMessageLine)
+
+
+def test_operation_lazy_invalid_line(workspace_directory: str) -> None:
+    progress_file = os.path.join(workspace_directory, "progress_file.txt")
+
+    with open(progress_file, "w") as f:
+        f.write("Not JSON\n")
+
+    with pytest.raises(ValueError):
+        Operation(progress_file=progress_file, lazy=True).last_line
+
+
+@pytest.mark.parametrize("lazy", [True, False])
+def test_operation_last_lines_by_type(lazy: bool) -> None:
+    operation = Operation(progress_file="progress_file_with_known_types.txt", lazy=lazy)
+
+    last_lines_by_type = operation.last_lines_by_type
+
+    lines = operation.get_lines()
+
+    assert last_lines_by_type[JSONLineType.ARCHIVE_PROGRESS].time == lines[6].time
+    assert (
+        last_lines_by_type[JSONLineType.PROGRESS_PERCENT].msgid
+        == lines[10].msgid
+        == "extract"
+    )
+    assert last_lines_by_type[JSONLineType.PROGRESS_MESSAGE].time == lines[11].time
+
+
+def test_operation_lazy_last_lines_by_type_stops_early(
+    workspace_directory: str,
+) -> None:
+    """Test that without 'line_types', only lines of usual types are looked for."""
+    progress_file = os.path.join(workspace_directory, "progress_file.txt")
+
+    with open("progress_file_with_known_types.txt", "r") as f:
+        known_types_lines = f.read()
+
+    # Lines that are not JSON, and lines of unknown types, raise if they are read
+
+    with open(progress_file, "w") as f:
+        f.write("Not JSON\n")
+
+        for line in ALL_TYPES_LINES:
+            f.write(json.dumps(line) + "\n")
+
+        f.write(known_types_lines)
+        f.write(json.dumps(ALL_TYPES_LINES[1]) + "\n")  # Log message
+
+    last_lines_by_type = Operation(
+        progress_file=progress_file, lazy=True
+    ).last_lines_by_type
+
+    assert set(last_lines_by_type) == set(LAZY_LAST_LINES_TYPES)
+
+
+def test_operation_lines_fields() -> None:
+    operation = Operation(progress_file="progress_file_with_known_types.txt")
+
+    archive_progress_line = operation._lines[6]
+
+    assert isinstance(archive_progress_line, ArchiveProgressLine)
+    assert not hasattr(archive_progress_line, "__dict__")
+    assert archive_progress_line.time == 1648247801.14391
+    assert not archive_progress_line.finished
+    assert archive_progress_line.original_size == 0
+    assert archive_progress_line.compressed_size == 0
+    assert archive_progress_line.deduplicated_size == 0
+    assert archive_progress_line.nfiles == 0
+
+    progress_percent_line = operation._lines[10]
+
+    assert isinstance(progress_percent_line, ProgressPercentLine)
+    assert not hasattr(progress_percent_line, "__dict__")
+    assert progress_percent_line.time is None
+    assert progress_percent_line.operation == 1
+    assert progress_percent_line.msgid == "extract"
+    assert progress_percent_line.current is None
+    assert progress_percent_line.total is None
+
+    progress_message_line = operation._lines[11]
+
+    assert isinstance(progress_message_line, ProgressMessageLine)
+    assert not hasattr(progress_message_line, "__dict__")
+    assert progress_message_line.time == 1648247801.2284238
+    assert progress_message_line.operation == 2
+    assert progress_message_line.msgid == "cache.commit"
+
+
+def test_progress_message_line_without_msgid() -> None:
+    assert ProgressMessageLine({"operation": 1, "finished": True}).msgid is None
+
+
+def test_operation_analytics() -> None:
+    operation = Operation(progress_file="progress_file_with_known_types.txt")
+
+    # Line with zero sizes, written when done, is skipped
+
+    throughput = operation.instantaneous_throughput
+
+    assert throughput.bytes_per_second == pytest.approx(
+        9076969 / (1648247801.093757 - 1648247800.893736)
+    )
+    assert throughput.files_per_second == pytest.approx(
+        944 / (1648247801.093757 - 1648247800.893736)
+    )
+
+    assert operation.get_throughput() == throughput
+    assert operation.get_throughput(window=0.1) is None  # One line in window
+
+    assert operation.compression_ratio == pytest.approx(1545177 / 9076969)
+    assert operation.deduplication_ratio == 0.0
+
+    # No time in progress percent line
+
+    assert operation.percentage is None
+    assert operation.eta is None
+
+
+def test_operation_analytics_no_lines() -> None:
+    operation = Operation(progress_file="progress_file_with_no_lines.txt")
+
+    assert operation.instantaneous_throughput is None
+    assert operation.get_throughput() is None
+    assert operation.compression_ratio is None
+    assert operation.deduplication_ratio is None
+    assert operation.percentage is None
+    assert operation.eta is None
+
+
+def test_operation_analytics_progress_percent(workspace_directory: str) -> None:
+    progress_file = os.path.join(workspace_directory, "progress_file.txt")
+
+    lines = [
+        {"operation": 1, "current": 5, "total": 10, "time": 1.0},
+        {"operation": 2, "current": 0, "total": 100, "time": 10.0},
+        {"operation": 2, "current": 0, "total": 100, "time": 10.0},
+        {"operation": 2, "current": 20, "total": 100, "time": 12.0},
+        {"operation": 2, "current": 40, "total": 100, "time": 14.0},
+        {"operation": 2, "total": 100, "time": 15.0},
+        {"original_size": 100, "nfiles": 1},
+    ]
+
+    with open(progress_file, "w") as f:
+        for line in lines:
+            if "current" in line or "total" in line:
+                line = line | {
+                    "type": "progress_percent",
+                    "msgid": "check",
+                    "finished": False,
+                }
+            else:
+                line = line | {"type": "archive_progress"}
+
+            f.write(json.dumps(line) + "\n")
+
+    operation = Operation(progress_file=progress_file)
+
+    assert operation.percentage == 40.0
+    assert operation.eta == 6.0
+
+    # Sizes missing
+
+    assert operation.compression_ratio is None
+
+
+def test_operation_analytics_no_progress(workspace_directory: str) -> None:
+    progress_file = os.path.join(workspace_directory, "progress_file.txt")
+
+    for times in [[1.0, 2.0], [1.0, 1.0]]:  # No progress, and no time passed
+        with open(progress_file, "w") as f:
+            for time in times:
+                f.write(
+                    json.dumps(
+                        {
+                            "type": "progress_percent",
+                            "operation": 1,
+                            "msgid": "check",
+                            "finished": False,
+                            "current": 5,
+                            "total": 10,
+                            "time": time,
+                        }
+                    )
+                    + "\n"
+                )
+
+        assert Operation(progress_file=progress_file).eta is None
+
+
+def write_all_types_lines(progress_file: str) -> None:
+    with open(progress_file, "w") as f:
+        for line in ALL_TYPES_LINES:
+            f.write(json.dumps(line) + "\n")
+
+
+def test_operation_lines_all_types(workspace_directory: str) -> None:
+    progress_file = os.path.join(workspace_directory, "progress_file.txt")
+
+    write_all_types_lines(progress_file)
+
+    with pytest.raises(OperationLineNotImplementedError):
+        Operation(progress_file=progress_file)
+
+    operation = Operation(progress_file=progress_file, line_types=set(JSONLineType))
+
+    assert len(operation._lines) == 5
+
+    file_status_line = operation._lines[0]
+
+    assert isinstance(file_status_line, FileStatusLine)
+    assert not hasattr(file_status_line, "__dict__")
+    assert file_status_line.type_ == JSONLineType.FILE_STATUS
+    assert file_status_line.status == "A"
+    assert file_status_line.path == "home/example/file_status"
+
+    log_message_line = operation._lines[1]
+
+    assert isinstance(log_message_line, LogMessageLine)
+    assert not hasattr(log_message_line, "__dict__")
+    assert log_message_line.time == 1648247801.0
+    assert log_message_line.levelname == "WARNING"
+    assert log_message_line.name == "borg.archiver"
+    assert log_message_line.message == "file_status"
+    assert log_message_line.msgid == "Repository.DoesNotExist"
+
+    question_prompt_line = operation._lines[2]
+
+    assert isinstance(question_prompt_line, QuestionLine)
+    assert not hasattr(question_prompt_line, "__dict__")
+    assert question_prompt_line.type_ == JSONLineType.QUESTION_PROMPT
+    assert question_prompt_line.msgid == "BORG_CHECK_I_KNOW_WHAT_I_AM_DOING"
+    assert question_prompt_line.message is None
+
+    question_accepted_line = operation._lines[3]
+
+    assert isinstance(question_accepted_line, QuestionLine)
+    assert question_accepted_line.type_ == JSONLineType.QUESTION_ACCEPTED_TRUE
+    assert question_accepted_line.msgid is None
+    assert question_accepted_line.message == "Yes"
+
+
+def test_operation_line_types(workspace_directory: str, mocker: MockerFixture) -> None:
+    progress_file = os.path.join(workspace_directory, "progress_file.txt")
+
+    write_all_types_lines(progress_file)
+
+    spy_loads = mocker.spy(decoders, "loads")
+
+    operation = Operation(
+        progress_file=progress_file, line_types={JSONLineType.FILE_STATUS}
+    )
+
+    # Only lines containing '"file_status"' are decoded, of which the log
+    # message is skipped after decoding
+
+    assert spy_loads.call_count == 3
+
+    assert [line.path for line in operation._lines] == [  # type: ignore[union-attr]
+        "home/example/file_status",
+        "home/example/last",
+    ]
+
+    operation = Operation(
+        progress_file="progress_file_with_known_types.txt",
+        line_types={JSONLineType.PROGRESS_MESSAGE},
+    )
+
+    assert all(isinstance(line, ProgressMessageLine) for line in operation._lines)
+    assert operation._lines
+
+
+@pytest.mark.parametrize("lazy", [True, False])
+def test_operation_line_types_last_lines_by_type(
+    workspace_directory: str, lazy: bool
+) -> None:
+    progress_file = os.path.join(workspace_directory, "progress_file.txt")
+
+    write_all_types_lines(progress_file)
+
+    operation = Operation(
+        progress_file=progress_file,
+        lazy=lazy,
+        line_types={JSONLineType.FILE_STATUS, JSONLineType.LOG_MESSAGE},
+    )
+
+    last_lines_by_type = operation.last_lines_by_type
+
+    assert set(last_lines_by_type) == {
+        JSONLineType.FILE_STATUS,
+        JSONLineType.LOG_MESSAGE,
+    }
+    assert (
+        last_lines_by_type[JSONLineType.FILE_STATUS].path  # type: ignore[union-attr]
+        == "home/example/last"
+    )
+
+    assert operation.last_line.path == "home/example/last"  # type: ignore[union-attr]
+
+
+def test_operation_line_types_refresh(workspace_directory: str) -> None:
+    progress_file = os.path.join(workspace_directory, "progress_file.txt")
+
+    # Unwanted trailing line without newline is consumed
+
+    with open(progress_file, "w") as f:
+        f.write(json.dumps(ALL_TYPES_LINES[0]))
+
+    operation = Operation(
+        progress_file=progress_file, line_types={JSONLineType.LOG_MESSAGE}
+    )
+
+    assert operation._lines == []
+
+    with open(progress_file, "a") as f:
+        f.write("\n" + json.dumps(ALL_TYPES_LINES[1]))
+
+    new_lines = operation.refresh()
+
+    assert len(new_lines) == 1
+    assert isinstance(new_lines[0], LogMessageLine)
+
+    assert operation.refresh() == []
+
+
+def test_operation_capture() -> None:
+    capture = ProgressCapture(max_lines=3)
+
+    with open("progress_file_with_known_types.txt", "rb") as f:
+        _lines = f.read().splitlines(keepends=True)
+
+    for _line in _lines[:2]:
+        capture.write(_line)
+
+    operation = Operation(capture=capture)
+
+    assert len(operation._lines) == 2
+    assert operation.refresh() == []
+
+    for _line in _lines[2:]:
+        capture.write(_line)
+
+    # Only kept lines are parsed, and kept
+
+    new_lines = operation.refresh()
+
+    assert len(new_lines) == 3
+    assert len(operation._lines) == 3
+    assert operation.last_line.time == new_lines[-1].time
+    assert len(operation.get_lines()) == 3
+
+    assert (
+        Operation(capture=capture, lazy=True).last_line.msgid
+        == operation.last_line.msgid
+        == "cache.commit"
+    )
+
+
+def test_operation_without_progress_file_or_capture() -> None:
+    with pytest.raises(ValueError):
+        Operation()
+
+
+def test_get_archive_stats() -> None:
+    assert _get_archive_stats(
+        {
+            "archive": {
+                "name": "test",
+                "duration": 1.5,
+                "stats": {
+                    "original_size": 1000,
+                    "compressed_size": 500,
+                    "deduplicated_size": 100,
+                    "nfiles": 3,
+                },
+            },
+            "repository": {},
+        }
+    ) == ArchiveStats(
+        original_size=1000,
+        compressed_size=500,
+        deduplicated_size=100,
+        nfiles=3,
+        duration=1.5,
+    )
@@ -1,11 +1,12 @@
 import os
-from typing import Dict, Generator, List, Optional
+from typing import Any, Callable, Dict, Generator, List, Optional
 
 import pytest
 from pytest_mock import MockerFixture  # type: ignore[attr-defined]
 
 from cyberfusion.BorgSupport.archives import Archive
 from cyberfusion.BorgSupport.borg_cli import BorgCommand
+from cyberfusion.BorgSupport.captures import ProgressCapture
 from cyberfusion.BorgSupport.exceptions import (
     ArchiveNotExistsError,
     LoggedCommandFailedError,
@@ -13,6 +14,13 @@ from cyberfusion.BorgSupport.exceptions import (
     RepositoryLockedError,
     RepositoryPathInvalidError,
 )
+from cyberfusion.BorgSupport.observers import (
+    HistogramObserver,
+    register_observer,
+    unregister_observer,
+)
+from cyberfusion.BorgSupport.indexes import ArchiveContentsIndex
+from cyberfusion.BorgSupport.operations import Operation
 from cyberfusion.BorgSupport.repositories import Repository
 
 
@@ -463,6 +471,8 @@ def test_repository_check_has_no_integrity(
         environment: Optional[Dict[str, str]] = None,
         run: bool = True,
         capture_stderr: bool = False,
+        line_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        capture: Optional[ProgressCapture] = None,
     ) -> None:
         """Raise exception if command is expected. Call original method otherwise."""
         if command == "check":
@@ -649,3 +659,164 @@ def test_repository_compact_locked(
 
 def test_repository_compact(repository_init: Generator[Repository, None, None]) -> None:
     repository_init.compact()
+
+
+def test_repository_compact_progress(
+    repository_init: Generator[Repository, None, None],
+) -> None:
+    capture = ProgressCapture()
+
+    operation = repository_init.compact(progress=True, capture=capture)
+
+    assert isinstance(operation, Operation)
+    assert operation.capture == capture
+    assert operation.progress_file is None
+
+
+def test_repository_prune_progress(
+    repository_init: Generator[Repository, None, None],
+    dummy_files: Generator[None, None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    lines: List[Dict[str, Any]] = []
+
+    for name in ["prunetest1", "prunetest2"]:
+        Archive(
+            repository=repository_init,
+            name=name,
+            comment="Free-form comment!",
+        ).create(
+            paths=[os.path.join(workspace_directory, "backmeupdir1")],
+            excludes=[],
+        )
+
+    operation, pruned_archives_names = repository_init.prune(
+        keep_last=1, progress=True, line_callback=lines.append
+    )
+
+    assert pruned_archives_names == ["prunetest1"]
+    assert isinstance(operation, Operation)
+    assert operation.progress_file is not None
+    assert all("type" in line for line in lines)
+
+
+def test_repository_id(
+    repository_init: Generator[Repository, None, None],
+    archives: Generator[List[Archive], None, None],
+) -> None:
+    assert len(repository_init.id_) == 64
+    assert all(archive.id_ for archive in repository_init.archives())
+
+
+def test_repository_prune_contents_index(
+    repository_init: Generator[Repository, None, None],
+    dummy_files: Generator[None, None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    index = ArchiveContentsIndex(":memory:")
+
+    repository_init.contents_index = index
+
+    for name in ["prunetest1", "prunetest2"]:
+        Archive(
+            repository=repository_init,
+            name=name,
+            comment="Free-form comment!",
+        ).create(
+            paths=[os.path.join(workspace_directory, "backmeupdir1")],
+            excludes=[],
+        )
+
+    archives = repository_init.archives()
+
+    for archive in archives:
+        assert index.contents(archive, path=workspace_directory[len(os.path.sep) :])
+
+    assert repository_init.prune(keep_last=1) == ["prunetest1"]
+
+    assert not index.is_indexed(archives[0])
+    assert index.is_indexed(archives[1])
+
+
+def test_repository_delete_contents_index(
+    repository: Repository,
+    dummy_files: Generator[None, None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    index = ArchiveContentsIndex(":memory:")
+
+    repository.contents_index = index
+    repository.create(encryption="keyfile-blake2")
+
+    archive = Archive(repository=repository, name="test", comment="Free-form comment!")
+    archive.create(
+        paths=[os.path.join(workspace_directory, "backmeupdir1")], excludes=[]
+    )
+
+    index.index(archive)  # ID is looked up
+
+    repository_id = repository.id_
+
+    repository.delete()
+
+    assert not index._connection.execute(
+        "SELECT * FROM archives WHERE repository_id = ?", (repository_id,)
+    ).fetchall()
+
+
+def test_repository_delete_progress(repository: Repository) -> None:
+    repository.create(encryption="keyfile-blake2")
+
+    operation = repository.delete(progress=True)
+
+    assert isinstance(operation, Operation)
+    assert operation.progress_file is not None
+    assert not repository.exists
+
+
+def test_repository_check_line_callback(
+    repository_init: Generator[Repository, None, None],
+) -> None:
+    lines = []
+
+    assert repository_init.check(line_callback=lines.append)
+
+    assert lines
+    assert all("type" in line for line in lines)
+
+
+def test_repository_session(
+    repository_init: Generator[Repository, None, None],
+    archives: Generator[List[Archive], None, None],
+) -> None:
+    with repository_init.session():
+        archives_names = [a.name for a in repository_init.archives()]
+
+        assert repository_init.check()
+
+    assert archives_names == [a.name for a in repository_init.archives()]
+
+
+def test_repository_observers(
+    repository_init: Generator[Repository, None, None],
+) -> None:
+    observer = HistogramObserver()
+
+    register_observer(observer)
+
+    try:
+        repository_init.archives()
+    finally:
+        unregister_observer(observer)
+
+    assert observer.histograms[("list", repository_init.path)].count == 1
+
+
+def test_repository_check_capture(
+    repository_init: Generator[Repository, None, None],
+) -> None:
+    capture = ProgressCapture()
+
+    assert repository_init.check(capture=capture)
+
+    assert capture.lines
@@ -0,0 +1,25 @@
+import os
+from typing import Generator, List
+
+from cyberfusion.BorgSupport.archives import Archive
+from cyberfusion.BorgSupport.trees import ArchiveTree
+
+
+def test_archive_tree(
+    archives: Generator[List[Archive], None, None],
+    workspace_directory: Generator[str, None, None],
+) -> None:
+    dir1 = os.path.join(workspace_directory, "backmeupdir1")[len(os.path.sep) :]
+
+    tree = ArchiveTree(archive=archives[0], path=dir1)
+
+    node = tree.get_node(dir1)
+
+    assert (node.total_size, node.total_files) == (10, 2)  # 'pleaseexcludeme' excluded
+    assert sorted(child.name for child in node.get_children()) == [
+        "test1.txt",
+        "testdir",
+    ]
+    assert [_node.path for _node in tree.iter_subtree(dir1)] == [
+        content.path for content in archives[0].contents(path=dir1)
+    ]
@@ -0,0 +1,203 @@
+import os
+from datetime import datetime
+from typing import Iterator
+
+import pytest
+from pytest_mock import MockerFixture
+
+from cyberfusion.BorgSupport import BorgCommand
+from cyberfusion.BorgSupport.archives import Archive, FilesystemObject, UNIXFileType
+from cyberfusion.BorgSupport.borg_cli import BorgRegularCommand
+from cyberfusion.BorgSupport.exceptions import (
+    RegularCommandFailedError,
+    RepositoryLockedError,
+)
+from cyberfusion.BorgSupport.repositories import Repository
+
+LINE = {
+    "type": "-",
+    "mode": "-rw-r--r--",
+    "user": "example",
+    "group": "example",
+    "uid": 1000,
+    "gid": 1000,
+    "path": "home/example.txt",
+    "healthy": True,
+    "source": "",
+    "linktarget": "",
+    "flags": None,
+    "mtime": "2024-01-02T03:04:05.678901",
+    "size": 5,
+}
+
+
+def test_filesystem_object_only_exposed_keys_kept() -> None:
+    filesystem_object = FilesystemObject(LINE)
+
+    assert not hasattr(filesystem_object, "__dict__")
+
+    assert filesystem_object.type_ is UNIXFileType.REGULAR_FILE
+    assert filesystem_object.size == 5
+    assert filesystem_object.link_target is None
+
+
+def test_filesystem_object_modification_time_cached() -> None:
+    filesystem_object = FilesystemObject(LINE)
+
+    assert filesystem_object.modification_time == datetime(2024, 1, 2, 3, 4, 5, 678901)
+    assert filesystem_object.modification_time is filesystem_object.modification_time
+
+
+def test_filesystem_object_symbolic_link() -> None:
+    filesystem_object = FilesystemObject(
+        {**LINE, "type": "l", "linktarget": "/home/example2.txt"}
+    )
+
+    assert filesystem_object.link_target == "/home/example2.txt"
+    assert filesystem_object.size is None
+
+
+def test_filesystem_object_type_not_supported() -> None:
+    filesystem_object = FilesystemObject({**LINE, "type": "s"})
+
+    assert filesystem_object.path == "home/example.txt"
+
+    with pytest.raises(ValueError):
+        filesystem_object.type_
+
+
+def test_filesystem_object_user_group_without_name() -> None:
+    filesystem_object = FilesystemObject({**LINE, "user": 1001, "group": 1002})
+
+    assert filesystem_object.user == 1001
+    assert filesystem_object.group == 1002
+
+
+def test_archive_iter_contents_locked_without_probe(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that lock timeout while iterating is raised as RepositoryLockedError."""
+
+    def execute_streaming(**kwargs: dict) -> Iterator[dict]:
+        raise RegularCommandFailedError(
+            command=[BorgCommand.BORG_BIN, "list"],
+            stderr='{"type": "log_message", "msgid": "LockTimeout"}\n',
+            return_code=2,
+        )
+
+        yield  # pragma: no cover
+
+    mocker.patch.object(
+        BorgRegularCommand, "execute_streaming", side_effect=execute_streaming
+    )
+
+    archive = Archive(
+        repository=Repository(
+            path=os.path.join(workspace_directory, "repository"),
+            passphrase=passphrase,
+            lock_check_probe=False,
+        ),
+        name="example",
+        comment="Example",
+    )
+
+    contents = archive.iter_contents(path=None)
+
+    with pytest.raises(RepositoryLockedError):
+        next(contents)
+
+
+def test_archive_iter_contents_locked(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that lock is checked when iterating, not when creating the generator."""
+    is_locked = mocker.patch(
+        "cyberfusion.BorgSupport.repositories.Repository.is_locked",
+        new_callable=mocker.PropertyMock,
+        return_value=True,
+    )
+
+    archive = Archive(
+        repository=Repository(
+            path=os.path.join(workspace_directory, "repository"),
+            passphrase=passphrase,
+        ),
+        name="example",
+        comment="Example",
+    )
+
+    contents = archive.iter_contents(path=None)
+
+    is_locked.assert_not_called()
+
+    with pytest.raises(RepositoryLockedError):
+        next(contents)
+
+
+def test_archive_iter_contents_failed(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that other errors while iterating are raised as is."""
+
+    def execute_streaming(**kwargs: dict) -> Iterator[dict]:
+        raise RegularCommandFailedError(
+            command=[BorgCommand.BORG_BIN, "list"],
+            stderr="Example error\n",
+            return_code=2,
+        )
+
+        yield  # pragma: no cover
+
+    mocker.patch.object(
+        BorgRegularCommand, "execute_streaming", side_effect=execute_streaming
+    )
+
+    archive = Archive(
+        repository=Repository(
+            path=os.path.join(workspace_directory, "repository"),
+            passphrase=passphrase,
+            lock_check_probe=False,
+        ),
+        name="example",
+        comment="Example",
+    )
+
+    with pytest.raises(RegularCommandFailedError):
+        next(archive.iter_contents(path=None))
+
+
+def test_archive_iter_contents_paused_not_nested(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that operations run while iteration is paused check lock themselves."""
+    is_locked = mocker.patch(
+        "cyberfusion.BorgSupport.repositories.Repository.is_locked",
+        new_callable=mocker.PropertyMock,
+        return_value=False,
+    )
+
+    mocker.patch.object(
+        BorgRegularCommand,
+        "execute_streaming",
+        side_effect=lambda **kwargs: (line for line in [LINE, LINE]),
+    )
+
+    repository = Repository(
+        path=os.path.join(workspace_directory, "repository"),
+        passphrase=passphrase,
+    )
+
+    contents = Archive(
+        repository=repository, name="example", comment="Example"
+    ).iter_contents(path=None)
+
+    next(contents)
+
+    assert is_locked.call_count == 1
+
+    with repository._lock_check_scope():
+        pass
+
+    assert is_locked.call_count == 2
+
+    contents.close()
@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from cyberfusion.BorgSupport.async_borg_cli import (
+    AsyncBorgLoggedCommand,
+    AsyncBorgRegularCommand,
+)
+from cyberfusion.BorgSupport.borg_cli import BorgCommand
+from cyberfusion.BorgSupport.captures import ProgressCapture
+from cyberfusion.BorgSupport.exceptions import (
+    LoggedCommandFailedError,
+    RegularCommandFailedError,
+)
+
+
+def test_async_borg_regular_command_command_and_arguments() -> None:
+    command = AsyncBorgRegularCommand()
+
+    asyncio.run(
+        command.execute(
+            run=False,
+            command="info",
+            arguments=["--test1=test1"],
+            json_format=True,
+            identity_file_path="/tmp/test.key",
+        )
+    )
+
+    assert command.command == [
+        BorgCommand.BORG_BIN,
+        "info",
+        "--json",
+        "--rsh",
+        "ssh -oBatchMode=yes -oStrictHostKeyChecking=no -i /tmp/test.key",
+        "--test1=test1",
+    ]
+
+
+def test_async_borg_logged_command_command_and_arguments() -> None:
+    command = AsyncBorgLoggedCommand()
+
+    asyncio.run(
+        command.execute(
+            run=False,
+            command="create",
+            arguments=["/tmp/repository::test", "/root"],
+        )
+    )
+
+    assert command.command == [
+        BorgCommand.BORG_BIN,
+        "--progress",
+        "--log-json",
+        "create",
+        "/tmp/repository::test",
+        "/root",
+    ]
+
+
+def test_async_borg_logged_command_json() -> None:
+    command = AsyncBorgLoggedCommand()
+
+    asyncio.run(
+        command.execute(
+            run=False,
+            command="create",
+            arguments=["/tmp/repository::test", "/root"],
+            json_format=True,
+        )
+    )
+
+    assert command.command == [
+        BorgCommand.BORG_BIN,
+        "--progress",
+        "--log-json",
+        "create",
+        "--json",
+        "/tmp/repository::test",
+        "/root",
+    ]
+    assert command.stdout is None
+
+
+def test_async_borg_regular_command_stdout() -> None:
+    command = AsyncBorgRegularCommand()
+
+    asyncio.run(command.execute(command=None, arguments=["--version"]))
+
+    assert command.stdout.startswith("borg ")
+    assert command.stderr is None
+
+
+def test_async_borg_regular_command_raises_exception() -> None:
+    with pytest.raises(RegularCommandFailedError):
+        asyncio.run(
+            AsyncBorgRegularCommand().execute(
+                command="doesntexist", capture_stderr=True
+            )
+        )
+
+
+def test_async_borg_logged_command_raises_exception() -> None:
+    with pytest.raises(LoggedCommandFailedError):
+        asyncio.run(
+            AsyncBorgLoggedCommand().execute(command="doesntexist", arguments=[])
+        )
+
+
+def test_async_borg_regular_command_timeout() -> None:
+    command = AsyncBorgRegularCommand()
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(
+            command.execute(
+                command="with-lock",
+                arguments=["/doesntexist", "sleep", "10"],
+                timeout=0,
+            )
+        )
+
+
+def test_async_borg_logged_command_execute_streaming_raises_exception() -> None:
+    async def consume() -> list:
+        return [
+            line
+            async for line in AsyncBorgLoggedCommand().execute_streaming(
+                command="doesntexist", arguments=[]
+            )
+        ]
+
+    with pytest.raises(LoggedCommandFailedError):
+        asyncio.run(consume())
+
+
+def test_async_borg_logged_command_capture_raises_exception() -> None:
+    capture = ProgressCapture()
+
+    with pytest.raises(LoggedCommandFailedError) as e:
+        asyncio.run(
+            AsyncBorgLoggedCommand().execute(
+                command="doesntexist", arguments=[], capture=capture
+            )
+        )
+
+    assert e.value.output == capture.get_output()
+    assert capture.lines
+
+
+def test_async_borg_logged_command_capture_not_run() -> None:
+    command = AsyncBorgLoggedCommand()
+
+    asyncio.run(
+        command.execute(
+            command="check", arguments=[], run=False, capture=ProgressCapture()
+        )
+    )
+
+    assert command.file is None
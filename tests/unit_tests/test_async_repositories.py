@@ -0,0 +1,212 @@
+import asyncio
+import os
+import threading
+from typing import Any
+
+import pytest
+from pytest_mock import MockerFixture
+
+from cyberfusion.BorgSupport import BorgCommand
+from cyberfusion.BorgSupport.async_repositories import AsyncRepository
+from cyberfusion.BorgSupport.exceptions import (
+    LoggedCommandFailedError,
+    RegularCommandFailedError,
+    RepositoryLockedError,
+)
+from cyberfusion.BorgSupport.repositories import Repository
+
+
+def _get_repository(
+    passphrase: str, workspace_directory: str, **kwargs: Any
+) -> AsyncRepository:
+    return AsyncRepository(
+        repository=Repository(
+            path=os.path.join(workspace_directory, "repository"),
+            passphrase=passphrase,
+            **kwargs,
+        )
+    )
+
+
+def test_async_repository_lock_check_scope_nested(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that nested operations check for a lock once."""
+    repository = _get_repository(passphrase, workspace_directory)
+
+    is_locked = mocker.patch.object(AsyncRepository, "is_locked", return_value=False)
+
+    async def run() -> None:
+        async with repository._lock_check_scope():
+            async with repository._lock_check_scope():
+                pass
+
+    asyncio.run(run())
+
+    assert is_locked.call_count == 1
+
+    asyncio.run(run())
+
+    assert is_locked.call_count == 2
+
+
+def test_async_repository_lock_check_scope_per_repository(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that operations on other repositories are not considered nested."""
+    repository = _get_repository(passphrase, workspace_directory)
+    other_repository = _get_repository(passphrase, workspace_directory)
+
+    is_locked = mocker.patch.object(AsyncRepository, "is_locked", return_value=False)
+
+    async def run() -> None:
+        async with repository._lock_check_scope():
+            async with other_repository._lock_check_scope():
+                pass
+
+    asyncio.run(run())
+
+    assert is_locked.call_count == 2
+
+
+def test_async_repository_lock_check_scope_ttl(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that lock check result is reused within TTL."""
+    repository = _get_repository(passphrase, workspace_directory, lock_check_ttl=60)
+
+    is_locked = mocker.patch.object(AsyncRepository, "is_locked", return_value=False)
+
+    async def run() -> None:
+        async with repository._lock_check_scope():
+            pass
+
+        async with repository._lock_check_scope():
+            pass
+
+    asyncio.run(run())
+
+    assert is_locked.call_count == 1
+
+
+def test_async_repository_lock_check_scope_locked(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    repository = _get_repository(passphrase, workspace_directory)
+
+    mocker.patch.object(AsyncRepository, "is_locked", return_value=True)
+
+    async def run() -> None:
+        async with repository._lock_check_scope():
+            pass  # pragma: no cover
+
+    with pytest.raises(RepositoryLockedError):
+        asyncio.run(run())
+
+
+def test_async_repository_lock_check_scope_without_probe(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that lock timeout of command is raised as RepositoryLockedError, without probing."""
+    repository = _get_repository(
+        passphrase,
+        workspace_directory,
+        lock_check_probe=False,
+    )
+
+    is_locked = mocker.patch.object(AsyncRepository, "is_locked")
+
+    async def run(stderr: str) -> None:
+        async with repository._lock_check_scope():
+            raise RegularCommandFailedError(
+                command=[BorgCommand.BORG_BIN, "list"],
+                stderr=stderr,
+                return_code=2,
+            )
+
+    with pytest.raises(RepositoryLockedError):
+        asyncio.run(run('{"type": "log_message", "msgid": "LockTimeout"}\n'))
+
+    with pytest.raises(RegularCommandFailedError):
+        asyncio.run(run("Repository does not exist.\n"))
+
+    is_locked.assert_not_called()
+
+
+def test_async_repository_check_locked_without_probe(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that lock timeout is raised as RepositoryLockedError, not as issues found."""
+    mocker.patch(
+        "cyberfusion.BorgSupport.async_repositories.AsyncBorgLoggedCommand.execute",
+        side_effect=LoggedCommandFailedError(
+            command=[BorgCommand.BORG_BIN, "check"],
+            output_file_path=None,
+            return_code=2,
+            output='{"type": "log_message", "msgid": "LockTimeout"}',
+        ),
+    )
+
+    repository = _get_repository(
+        passphrase,
+        workspace_directory,
+        lock_check_probe=False,
+    )
+
+    with pytest.raises(RepositoryLockedError):
+        asyncio.run(repository.check())
+
+
+def test_async_repository_check_issues_found(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    mocker.patch(
+        "cyberfusion.BorgSupport.async_repositories.AsyncBorgLoggedCommand.execute",
+        side_effect=LoggedCommandFailedError(
+            command=[BorgCommand.BORG_BIN, "check"],
+            output_file_path=None,
+            return_code=1,
+            output='{"type": "log_message", "msgid": "Repository.CheckNeeded"}',
+        ),
+    )
+
+    repository = _get_repository(
+        passphrase,
+        workspace_directory,
+        lock_check_probe=False,
+    )
+
+    assert not asyncio.run(repository.check())
+
+
+def test_async_repository_operation_not_on_event_loop(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that progress file is parsed outside of the event loop."""
+    mocker.patch(
+        "cyberfusion.BorgSupport.async_repositories.AsyncBorgLoggedCommand.execute"
+    )
+
+    threads = []
+
+    operation = mocker.patch(
+        "cyberfusion.BorgSupport.async_repositories.Operation",
+        side_effect=lambda **kwargs: threads.append(threading.current_thread()),
+    )
+
+    repository = _get_repository(passphrase, workspace_directory)
+
+    asyncio.run(
+        repository._execute_maintenance_command(
+            command=BorgCommand.SUBCOMMAND_COMPACT,
+            arguments=[],
+            environment={},
+            progress=True,
+            line_callback=None,
+            capture=None,
+        )
+    )
+
+    operation.assert_called_once()
+
+    assert threads[0] is not threading.main_thread()
@@ -116,6 +116,28 @@ def test_borg_logged_command_command_and_arguments(
     ]
 
 
+def test_borg_logged_command_json(
+    borg_logged_command: BorgLoggedCommand,
+) -> None:
+    borg_logged_command.execute(
+        run=False,
+        command="create",
+        arguments=["/tmp/repository::test", "/root"],
+        json_format=True,
+    )
+
+    assert borg_logged_command.command == [
+        BorgCommand.BORG_BIN,
+        "--progress",
+        "--log-json",
+        "create",
+        "--json",
+        "/tmp/repository::test",
+        "/root",
+    ]
+    assert borg_logged_command.stdout is None
+
+
 def test_borg_regular_command_json(
     borg_regular_command: BorgRegularCommand,
 ) -> None:
@@ -143,3 +165,53 @@ def test_borg_logged_command_raises_exception(
             command="doesntexist",
             arguments=[],
         )
+
+
+def test_borg_regular_command_execute_streaming_raises_exception(
+    borg_regular_command: BorgRegularCommand,
+) -> None:
+    with pytest.raises(RegularCommandFailedError) as e:
+        list(
+            borg_regular_command.execute_streaming(
+                command="doesntexist", capture_stderr=True
+            )
+        )
+
+    assert e.value.stderr
+    assert e.value.command == [BorgCommand.BORG_BIN, "doesntexist"]
+
+
+def test_get_rsh_argument_ssh_control_path() -> None:
+    assert _get_rsh_argument(
+        "/tmp/test.key", ssh_control_path="/tmp/control", ssh_control_persist=60
+    ) == [
+        "--rsh",
+        "ssh -oBatchMode=yes -oStrictHostKeyChecking=no -i /tmp/test.key -oControlMaster=auto -oControlPath=/tmp/control -oControlPersist=60",
+    ]
+
+
+def test_get_rsh_argument_ssh_control_path_without_identity_file_path() -> None:
+    assert _get_rsh_argument(
+        None, ssh_control_path="/tmp/control", ssh_control_persist=60
+    ) == [
+        "--rsh",
+        "ssh -oBatchMode=yes -oStrictHostKeyChecking=no -oControlMaster=auto -oControlPath=/tmp/control -oControlPersist=60",
+    ]
+
+
+def test_borg_regular_command_ssh_control_path(
+    borg_regular_command: BorgRegularCommand,
+) -> None:
+    borg_regular_command.execute(
+        run=False,
+        command="info",
+        ssh_control_path="/tmp/control",
+        ssh_control_persist=60,
+    )
+
+    assert borg_regular_command.command == [
+        BorgCommand.BORG_BIN,
+        "info",
+        "--rsh",
+        "ssh -oBatchMode=yes -oStrictHostKeyChecking=no -oControlMaster=auto -oControlPath=/tmp/control -oControlPersist=60",
+    ]
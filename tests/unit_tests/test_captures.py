@@ -0,0 +1,99 @@
+import gzip
+import os
+
+from cyberfusion.BorgSupport.captures import ProgressCapture
+
+
+def test_progress_capture_max_lines() -> None:
+    capture = ProgressCapture(max_lines=2)
+
+    for i in range(3):
+        capture.write(f'{{"type": "log_message", "i": {i}}}\n'.encode())
+
+    assert list(capture.lines) == [
+        b'{"type": "log_message", "i": 1}',
+        b'{"type": "log_message", "i": 2}',
+    ]
+    assert capture.size == sum(len(_line) for _line in capture.lines)
+    assert capture.total_lines == 3
+    assert capture.tell() == capture.total_bytes == 3 * 32
+
+
+def test_progress_capture_max_bytes() -> None:
+    capture = ProgressCapture(max_lines=None, max_bytes=10)
+
+    capture.write(b"12345\n")
+    capture.write(b"67890\n")
+
+    assert list(capture.lines) == [b"12345", b"67890"]
+
+    capture.write(b"a\n")
+
+    assert list(capture.lines) == [b"67890", b"a"]
+    assert capture.size == 6
+
+    # Last line is kept, even if too large
+
+    capture.write(b"abcdefghijkl\n")
+
+    assert list(capture.lines) == [b"abcdefghijkl"]
+
+
+def test_progress_capture_count() -> None:
+    capture = ProgressCapture()
+
+    capture.count({"type": "progress_percent", "msgid": "extract"})
+    capture.count({"type": "progress_percent", "msgid": "extract"})
+    capture.count({"type": "file_status"})
+    capture.count(["Not a line"])
+
+    assert capture.counts_by_type == {"progress_percent": 2, "file_status": 1}
+    assert capture.counts_by_msgid == {"extract": 2}
+
+
+def test_progress_capture_get_lines_since() -> None:
+    capture = ProgressCapture(max_lines=2)
+
+    assert capture.get_lines_since(0) == ([], 0)
+
+    capture.write(b"1\n")
+
+    assert capture.get_lines_since(0) == ([b"1"], 1)
+    assert capture.get_lines_since(1) == ([], 1)
+
+    for _line in [b"2\n", b"3\n", b"4\n"]:
+        capture.write(_line)
+
+    # Line 2 is no longer kept
+
+    assert capture.get_lines_since(1) == ([b"3", b"4"], 4)
+    assert capture.get_lines_since(3) == ([b"4"], 4)
+
+    assert list(capture.iter_lines_reversed()) == [b"4", b"3"]
+    assert capture.get_output() == "3\n4"
+
+
+def test_progress_capture_spill(workspace_directory: str) -> None:
+    spill_path = os.path.join(workspace_directory, "progress.json.gz")
+
+    capture = ProgressCapture(max_lines=1, spill_path=spill_path)
+
+    # Used for multiple commands
+
+    for _lines in [[b"1\n", b"2\n"], [b"3\n"]]:
+        with capture as output:
+            for _line in _lines:
+                output.write(_line)
+                output.flush()
+
+    assert list(capture.lines) == [b"3"]
+
+    with gzip.open(spill_path, "rb") as f:
+        assert f.read() == b"1\n2\n3\n"
+
+
+def test_progress_capture_without_spill() -> None:
+    with ProgressCapture() as capture:
+        capture.write(b"1")
+
+    assert list(capture.lines) == [b"1"]
@@ -0,0 +1,79 @@
+import json
+import types
+from typing import Any, Generator, Union
+
+import pytest
+from pytest_mock import MockerFixture
+
+from cyberfusion.BorgSupport import decoders
+
+
+class FakeMsgspecDecodeError(Exception):
+    pass
+
+
+class FakeMsgspecDecoder:
+    def decode(self, data: Union[str, bytes]) -> Any:
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise FakeMsgspecDecodeError(str(e))
+
+
+@pytest.fixture
+def fake_backends(mocker: MockerFixture) -> None:
+    """Make backends importable, whether they are installed or not."""
+    orjson = types.ModuleType("orjson")
+    orjson.loads = json.loads  # type: ignore[attr-defined]
+
+    msgspec = types.ModuleType("msgspec")
+    msgspec.DecodeError = FakeMsgspecDecodeError  # type: ignore[attr-defined]
+    msgspec.json = types.SimpleNamespace(Decoder=FakeMsgspecDecoder)  # type: ignore[attr-defined]
+
+    mocker.patch.dict("sys.modules", {"orjson": orjson, "msgspec": msgspec})
+
+
+@pytest.fixture(autouse=True)
+def restore_backend() -> Generator[None, None, None]:
+    backend = decoders.get_backend()
+
+    yield
+
+    decoders.set_backend(backend)
+
+
+@pytest.mark.parametrize("backend", decoders.BACKENDS)
+def test_loads(fake_backends: None, backend: str) -> None:
+    decoders.set_backend(backend)
+
+    assert decoders.get_backend() == backend
+
+    assert decoders.loads(b'{"type": "-", "size": 1}\n') == {"type": "-", "size": 1}
+    assert decoders.loads('{"type": "-"}') == {"type": "-"}
+
+    with pytest.raises(ValueError):
+        decoders.loads(b'{"type": ')
+
+
+def test_set_backend_fastest(fake_backends: None) -> None:
+    decoders.set_backend()
+
+    assert decoders.get_backend() == decoders.BACKEND_ORJSON
+
+
+def test_set_backend_unknown() -> None:
+    with pytest.raises(ValueError):
+        decoders.set_backend("example")
+
+
+def test_backends_not_installed(mocker: MockerFixture) -> None:
+    mocker.patch.dict("sys.modules", {"orjson": None, "msgspec": None})
+
+    assert decoders.get_available_backends() == [decoders.BACKEND_STDLIB]
+
+    decoders.set_backend()
+
+    assert decoders.get_backend() == decoders.BACKEND_STDLIB
+
+    with pytest.raises(ImportError):
+        decoders.set_backend(decoders.BACKEND_ORJSON)
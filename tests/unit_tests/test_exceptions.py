@@ -21,6 +21,24 @@ def test_LoggedCommandFailedError_string():
     )
 
 
+def test_LoggedCommandFailedError_string_output():
+    COMMAND = ["foobar"]
+    RETURN_CODE = 1
+    OUTPUT = '{"type": "log_message"}'
+
+    assert (
+        str(
+            LoggedCommandFailedError(
+                command=COMMAND,
+                output_file_path=None,
+                return_code=RETURN_CODE,
+                output=OUTPUT,
+            )
+        )
+        == f"Command '{COMMAND}' failed with RC {RETURN_CODE}. Last output:\n\n{OUTPUT}"
+    )
+
+
 def test_RegularCommandFailedError_string():
     COMMAND = ["foobar"]
     RETURN_CODE = 1
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import Counter
+from typing import List
+
+from cyberfusion.BorgSupport.exceptions import RepositoryPathInvalidError
+from cyberfusion.BorgSupport.fleet import RepositoryFleet
+from cyberfusion.BorgSupport.repositories import Repository
+
+
+def get_repositories(hosts: List[str], count: int) -> List[Repository]:
+    return [
+        Repository(path=f"ssh://borg@{host}:22/repository{i}", passphrase="test")
+        for host in hosts
+        for i in range(count)
+    ]
+
+
+def test_repository_fleet_results_in_order() -> None:
+    repositories = get_repositories(["host1", "host2"], 5)
+
+    results = RepositoryFleet(repositories, max_workers=4).run(lambda r: r.path)
+
+    assert [r.repository for r in results] == repositories
+    assert [r.result for r in results] == [r.path for r in repositories]
+    assert all(r.succeeded for r in results)
+
+
+def test_repository_fleet_exceptions() -> None:
+    repositories = get_repositories(["host1"], 2)
+
+    def operation(repository: Repository) -> None:
+        if repository is repositories[0]:
+            raise ValueError
+
+    results = RepositoryFleet(repositories).run(operation)
+
+    assert isinstance(results[0].exception, ValueError)
+    assert not results[0].succeeded
+    assert results[1].succeeded
+
+
+def test_repository_fleet_max_workers_per_host() -> None:
+    repositories = get_repositories(["host1", "host2"], 6)
+
+    lock = threading.Lock()
+    running: Counter = Counter()
+    max_running: Counter = Counter()
+
+    def operation(repository: Repository) -> None:
+        host = RepositoryFleet._get_host(repository)
+
+        with lock:
+            running[host] += 1
+            running[None] += 1
+
+            max_running[host] = max(max_running[host], running[host])
+            max_running[None] = max(max_running[None], running[None])
+
+        time.sleep(0.01)
+
+        with lock:
+            running[host] -= 1
+            running[None] -= 1
+
+    results = RepositoryFleet(repositories, max_workers=3, max_workers_per_host=2).run(
+        operation
+    )
+
+    assert len(results) == 12
+    assert max_running["host1"] <= 2
+    assert max_running["host2"] <= 2
+    assert max_running[None] <= 3
+
+
+def test_repository_fleet_expected_duration() -> None:
+    repositories = get_repositories(["host1"], 4)
+
+    started = []
+
+    def operation(repository: Repository) -> None:
+        started.append(repository)
+
+    RepositoryFleet(
+        repositories,
+        max_workers=1,
+        expected_duration=lambda r: repositories.index(r),
+    ).run(operation)
+
+    assert started == list(reversed(repositories))
+
+
+def test_repository_fleet_local_repositories_not_limited_per_host() -> None:
+    repositories = [
+        Repository(path=f"/tmp/repository{i}", passphrase="test") for i in range(3)
+    ]
+
+    results = RepositoryFleet(repositories, max_workers=3, max_workers_per_host=1).run(
+        lambda r: RepositoryFleet._get_host(r)
+    )
+
+    assert [r.result for r in results] == [None, None, None]
+
+
+def test_repository_fleet_invalid_path() -> None:
+    """Test that repository with invalid path doesn't stop run."""
+    repositories = get_repositories(["host1"], 2)
+
+    repositories.insert(1, Repository(path="borg@host1:/repository", passphrase="test"))
+
+    results = RepositoryFleet(repositories, max_workers_per_host=1).run(
+        lambda r: r.path
+    )
+
+    assert [r.repository for r in results] == repositories
+    assert isinstance(results[1].exception, RepositoryPathInvalidError)
+    assert results[0].succeeded
+    assert results[2].succeeded
+
+
+def test_repository_fleet_expected_duration_exception() -> None:
+    repositories = get_repositories(["host1"], 2)
+
+    def expected_duration(repository: Repository) -> float:
+        if repository is repositories[0]:
+            raise ValueError
+
+        return 1.0
+
+    results = RepositoryFleet(repositories, expected_duration=expected_duration).run(
+        lambda r: r.path
+    )
+
+    assert isinstance(results[0].exception, ValueError)
+    assert results[1].succeeded
+
+
+def test_repository_fleet_base_exception() -> None:
+    """Test that exceptions that aren't 'Exception' don't stop run."""
+    repositories = get_repositories(["host1"], 2)
+
+    def operation(repository: Repository) -> None:
+        if repository is repositories[0]:
+            raise SystemExit
+
+    results = RepositoryFleet(repositories, max_workers=1).run(operation)
+
+    assert isinstance(results[0].exception, SystemExit)
+    assert results[1].succeeded
@@ -0,0 +1,313 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Generator, Iterator, List
+
+import pytest
+from pytest_mock import MockerFixture
+
+from cyberfusion.BorgSupport.archives import Archive, FilesystemObject, UNIXFileType
+from cyberfusion.BorgSupport.exceptions import PathNotExistsError
+from cyberfusion.BorgSupport.indexes import ArchiveContentsIndex
+from cyberfusion.BorgSupport.repositories import Repository
+
+
+@pytest.fixture
+def index() -> Generator[ArchiveContentsIndex, None, None]:
+    index = ArchiveContentsIndex(":memory:")
+
+    yield index
+
+    index.close()
+
+
+@pytest.fixture
+def archive(mocker: MockerFixture, archive_contents_lines: List[dict]) -> Archive:
+    mocker.patch.object(
+        Repository, "id_", new_callable=mocker.PropertyMock, return_value="r1"
+    )
+    mocker.patch.object(
+        Archive,
+        "_iter_borg_contents",
+        side_effect=lambda **kwargs: iter(
+            FilesystemObject(line) for line in archive_contents_lines
+        ),
+    )
+
+    return Archive(
+        repository=Repository(path="/tmp/repository", passphrase="test"),
+        name="example",
+        comment="Example",
+        id_="a1",
+    )
+
+
+def _get_paths(contents: List[FilesystemObject]) -> List[str]:
+    return [content.path for content in contents]
+
+
+def test_archive_contents_index_filled_once(
+    index: ArchiveContentsIndex, archive: Archive, archive_contents_lines: List[dict]
+) -> None:
+    assert not index.is_indexed(archive)
+
+    assert _get_paths(index.contents(archive)) == [
+        line["path"] for line in archive_contents_lines
+    ]
+    assert _get_paths(index.contents(archive)) == [
+        line["path"] for line in archive_contents_lines
+    ]
+
+    assert index.is_indexed(archive)
+
+    archive._iter_borg_contents.assert_called_once_with(path=None)  # type: ignore[attr-defined]
+
+
+def test_archive_contents_index_filesystem_objects(
+    index: ArchiveContentsIndex, archive: Archive, archive_contents_lines: List[dict]
+) -> None:
+    contents = index.contents(archive)
+
+    for content, line in zip(contents, archive_contents_lines):
+        expected = FilesystemObject(line)
+
+        assert content.type_ == expected.type_
+        assert content.symbolic_mode == expected.symbolic_mode
+        assert content.user == expected.user
+        assert content.group == expected.group
+        assert content.path == expected.path
+        assert content.link_target == expected.link_target
+        assert content.modification_time == expected.modification_time
+        assert content.size == expected.size
+
+
+def test_archive_contents_index_path(
+    index: ArchiveContentsIndex, archive: Archive
+) -> None:
+    assert _get_paths(index.contents(archive, path="home/example")) == [
+        "home/example",
+        "home/example/example.txt",
+    ]
+
+    # Normalized, and 'home2' is not below 'home'
+
+    assert "home2" not in _get_paths(index.contents(archive, path="/home/"))
+
+
+def test_archive_contents_index_depth(
+    index: ArchiveContentsIndex, archive: Archive
+) -> None:
+    assert _get_paths(index.contents(archive, depth=1)) == ["home", "home2", "tmp"]
+    assert _get_paths(index.contents(archive, path="home", depth=2)) == [
+        "home/example.txt",
+        "home/example",
+        "home/link",
+    ]
+
+
+def test_archive_contents_index_max_depth(
+    index: ArchiveContentsIndex, archive: Archive
+) -> None:
+    assert _get_paths(index.contents(archive, max_depth=1)) == [
+        "home",
+        "home2",
+        "tmp",
+    ]
+    assert _get_paths(index.contents(archive, path="home", max_depth=2)) == [
+        "home",
+        "home/example.txt",
+        "home/example",
+        "home/link",
+    ]
+
+
+def test_archive_contents_index_type(
+    index: ArchiveContentsIndex, archive: Archive
+) -> None:
+    assert _get_paths(index.contents(archive, type_=UNIXFileType.REGULAR_FILE)) == [
+        "home/example.txt",
+        "home/example/example.txt",
+        "var/log/example.log",
+    ]
+
+
+def test_archive_contents_index_modification_time(
+    index: ArchiveContentsIndex, archive: Archive
+) -> None:
+    assert _get_paths(
+        index.contents(
+            archive,
+            modified_after=datetime(2024, 1, 2),
+            modified_before=datetime(2024, 1, 4),
+        )
+    ) == ["home/example.txt", "home/example"]
+
+
+def test_archive_contents_index_remove_archives(
+    index: ArchiveContentsIndex, archive: Archive
+) -> None:
+    index.index(archive)
+
+    index.remove_archives(repository_id="r1", archive_ids=["a2"])
+
+    assert index.is_indexed(archive)
+
+    index.remove_archives(repository_id="r1", archive_ids=["a1"])
+
+    assert not index.is_indexed(archive)
+
+
+def test_archive_contents_index_remove_repository(
+    index: ArchiveContentsIndex, archive: Archive, archive_contents_lines: List[dict]
+) -> None:
+    index.index(archive)
+
+    index.remove_repository("r1")
+
+    assert not index.is_indexed(archive)
+
+    # Removed entries are not returned when indexed again
+
+    assert len(index.contents(archive)) == len(archive_contents_lines)
+
+
+def test_archive_contents_index_replaced(
+    mocker: MockerFixture,
+    index: ArchiveContentsIndex,
+    archive: Archive,
+    archive_contents_lines: List[dict],
+) -> None:
+    mocker.patch("cyberfusion.BorgSupport.indexes.SIZE_INSERT_BATCH", 2)
+
+    index.index(archive)
+    index.index(archive)
+
+    assert len(index.contents(archive)) == len(archive_contents_lines)
+
+
+def test_archive_contents_index_archive_id_looked_up(
+    mocker: MockerFixture, index: ArchiveContentsIndex, archive: Archive
+) -> None:
+    mocker.patch.object(Repository, "get_archive", return_value=archive)
+
+    index.index(archive)
+
+    assert index.is_indexed(
+        Archive(repository=archive.repository, name=archive.name, comment="")
+    )
+
+
+def test_archive_contents_index_persisted(
+    workspace_directory: str, archive: Archive
+) -> None:
+    path = os.path.join(workspace_directory, "index.sqlite3")
+
+    index = ArchiveContentsIndex(path)
+    index.index(archive)
+    index.close()
+
+    index = ArchiveContentsIndex(path)
+
+    assert index.is_indexed(archive)
+
+    index.close()
+
+
+def test_archive_contents_index_empty_archive(
+    mocker: MockerFixture, index: ArchiveContentsIndex, archive: Archive
+) -> None:
+    def iter_borg_contents(**kwargs: dict) -> Iterator[FilesystemObject]:
+        raise PathNotExistsError
+
+        yield  # pragma: no cover
+
+    mocker.patch.object(Archive, "_iter_borg_contents", side_effect=iter_borg_contents)
+
+    index.index(archive)
+
+    assert index.is_indexed(archive)
+    assert index.contents(archive) == []
+
+
+def test_archive_contents_from_index(
+    index: ArchiveContentsIndex, archive: Archive, archive_contents_lines: List[dict]
+) -> None:
+    """Test that archive contents are listed from index of repository, if any."""
+    archive.repository.contents_index = index
+
+    assert _get_paths(archive.contents(path=None)) == [
+        line["path"] for line in archive_contents_lines
+    ]
+    assert _get_paths(archive.contents(path="/home/", recursive=False)) == [
+        "home",
+        "home/example.txt",
+        "home/example",
+        "home/link",
+    ]
+    assert _get_paths(archive.contents(path="/", recursive=False)) == [
+        "home",
+        "home2",
+        "tmp",
+    ]
+
+    with pytest.raises(PathNotExistsError):
+        archive.contents(path="doesntexist")
+
+    archive._iter_borg_contents.assert_called_once_with(path=None)  # type: ignore[attr-defined]
+
+
+def test_archive_contents_index_type_not_supported(
+    mocker: MockerFixture,
+    index: ArchiveContentsIndex,
+    archive: Archive,
+    archive_contents_lines: List[dict],
+) -> None:
+    """Test that objects of unsupported types (e.g. FIFOs) are indexed."""
+    line = {
+        **archive_contents_lines[1],
+        "type": "p",
+        "mode": "prw-r--r--",
+        "path": "home/fifo",
+    }
+
+    mocker.patch.object(
+        Archive,
+        "_iter_borg_contents",
+        side_effect=lambda **kwargs: iter([FilesystemObject(line)]),
+    )
+
+    (content,) = index.contents(archive)
+
+    assert content.path == "home/fifo"
+
+    with pytest.raises(ValueError):
+        content.type_
+
+
+def test_archive_contents_index_other_thread(
+    index: ArchiveContentsIndex, archive: Archive, archive_contents_lines: List[dict]
+) -> None:
+    """Test that index may be used by other threads than the one that created it."""
+    with ThreadPoolExecutor() as executor:
+        assert _get_paths(executor.submit(index.contents, archive).result()) == [
+            line["path"] for line in archive_contents_lines
+        ]
+
+        executor.submit(
+            index.remove_archives, repository_id="r1", archive_ids=["a1"]
+        ).result()
+
+    assert not index.is_indexed(archive)
+
+
+def test_archive_contents_index_fetched_in_batches(
+    mocker: MockerFixture,
+    index: ArchiveContentsIndex,
+    archive: Archive,
+    archive_contents_lines: List[dict],
+) -> None:
+    mocker.patch("cyberfusion.BorgSupport.indexes.SIZE_FETCH_BATCH", 2)
+
+    assert _get_paths(index.contents(archive)) == [
+        line["path"] for line in archive_contents_lines
+    ]
@@ -0,0 +1,335 @@
+import json
+import os
+import time
+from typing import Generator
+
+import pytest
+from pytest_mock import MockerFixture
+
+from cyberfusion.BorgSupport.captures import ProgressCapture
+from cyberfusion.BorgSupport.monitors import OperationMonitor, _Inotify
+from cyberfusion.BorgSupport.operations import ArchiveProgressLine, Operation
+
+
+def write_archive_progress_line(
+    path: str, *, original_size: int, time_: float, finished: bool = False
+) -> None:
+    with open(path, "a") as f:
+        f.write(
+            json.dumps(
+                {
+                    "type": "archive_progress",
+                    "original_size": original_size,
+                    "compressed_size": original_size,
+                    "deduplicated_size": original_size,
+                    "nfiles": original_size,
+                    "time": time_,
+                    "finished": finished,
+                }
+            )
+            + "\n"
+        )
+
+
+@pytest.fixture
+def progress_file(workspace_directory: str) -> str:
+    path = os.path.join(workspace_directory, "progress_file.txt")
+
+    write_archive_progress_line(path, original_size=0, time_=1.0)
+
+    return path
+
+
+@pytest.fixture
+def monitor() -> Generator[OperationMonitor, None, None]:
+    monitor = OperationMonitor(poll_interval=0.01)
+
+    yield monitor
+
+    monitor.close()
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_operation_monitor(progress_file: str, use_inotify: bool) -> None:
+    monitor = OperationMonitor(poll_interval=0.01, use_inotify=use_inotify)
+
+    assert monitor.uses_inotify == use_inotify
+
+    operation = Operation(progress_file=progress_file)
+
+    monitor.register(operation)
+
+    # Lines parsed before registering are used
+
+    (status,) = monitor.get_statuses()
+
+    assert status.operation == operation
+    assert isinstance(status.last_line, ArchiveProgressLine)
+    assert not status.finished
+    assert status.throughput is None
+
+    # Nothing changed, except the modification time when polling
+
+    monitor.poll()
+
+    assert monitor.poll(timeout=0.05) == []
+
+    write_archive_progress_line(progress_file, original_size=100, time_=2.0)
+    write_archive_progress_line(progress_file, original_size=300, time_=3.0)
+
+    assert monitor.poll(timeout=1) == [operation]
+
+    (status,) = monitor.get_statuses()
+
+    assert status.last_line.original_size == 300
+    assert status.throughput.bytes_per_second == 200
+
+    # Line with smaller size than earlier line is not used for throughput
+
+    write_archive_progress_line(
+        progress_file, original_size=0, time_=4.0, finished=True
+    )
+
+    assert monitor.poll(timeout=1) == [operation]
+
+    (status,) = monitor.get_statuses()
+
+    assert status.finished
+    assert status.throughput.bytes_per_second == 200
+
+    monitor.unregister(operation)
+
+    assert monitor.get_statuses() == []
+
+    monitor.close()
+
+    assert not monitor.uses_inotify
+
+
+def test_operation_monitor_stalled(
+    monitor: OperationMonitor, progress_file: str
+) -> None:
+    monitor.stall_timeout = 0
+
+    monitor.register(Operation(progress_file=progress_file))
+
+    time.sleep(0.01)
+
+    assert monitor.get_statuses()[0].stalled
+
+    write_archive_progress_line(
+        progress_file, original_size=0, time_=2.0, finished=True
+    )
+
+    monitor.poll(timeout=1)
+
+    assert not monitor.get_statuses()[0].stalled
+
+
+def test_operation_monitor_same_file(
+    monitor: OperationMonitor, progress_file: str
+) -> None:
+    operation1 = Operation(progress_file=progress_file)
+    operation2 = Operation(progress_file=progress_file)
+
+    monitor.register(operation1)
+    monitor.register(operation2)
+
+    monitor.unregister(operation1)
+
+    write_archive_progress_line(progress_file, original_size=100, time_=2.0)
+
+    assert monitor.poll(timeout=1) == [operation2]
+
+    monitor.unregister(operation2)
+
+    assert monitor._entries_by_wd == {}
+
+
+def test_operation_monitor_capture(monitor: OperationMonitor) -> None:
+    capture = ProgressCapture()
+
+    operation = Operation(capture=capture)
+
+    monitor.register(operation)
+
+    assert monitor.poll() == []
+
+    capture.write(b'{"type": "progress_message", "operation": 1, "finished": true}\n')
+
+    assert monitor.poll(timeout=1) == [operation]
+    assert monitor.get_statuses()[0].finished
+
+
+def test_operation_monitor_progress_file_not_watchable(
+    mocker: MockerFixture, monitor: OperationMonitor, progress_file: str
+) -> None:
+    mocker.patch.object(
+        monitor._inotify, "add_watch", side_effect=OSError("Watch limit reached")
+    )
+
+    operation = Operation(progress_file=progress_file, lazy=True)
+
+    monitor.register(operation)
+
+    # Polled instead
+
+    assert monitor.poll() == []
+
+    write_archive_progress_line(progress_file, original_size=100, time_=2.0)
+
+    assert monitor.poll(timeout=1) == [operation]
+
+    os.unlink(progress_file)
+
+    assert monitor.poll() == []
+
+    monitor.unregister(operation)
+
+
+def test_operation_monitor_thread(
+    monitor: OperationMonitor, progress_file: str
+) -> None:
+    monitor.start()
+
+    monitor.register(Operation(progress_file=progress_file))
+
+    write_archive_progress_line(progress_file, original_size=100, time_=2.0)
+
+    deadline = time.monotonic() + 5
+
+    while monitor.get_statuses()[0].last_line.original_size != 100:
+        assert time.monotonic() < deadline
+
+        time.sleep(0.01)
+
+    monitor.stop()
+    monitor.stop()  # Not running
+
+
+def test_operation_monitor_inotify_not_available(mocker: MockerFixture) -> None:
+    mocker.patch(
+        "cyberfusion.BorgSupport.monitors._Inotify", side_effect=OSError("Example")
+    )
+
+    assert not OperationMonitor().uses_inotify
+
+
+def test_inotify_not_in_libc(mocker: MockerFixture) -> None:
+    mocker.patch("ctypes.CDLL", return_value=object())
+
+    with pytest.raises(OSError):
+        _Inotify()
+
+
+def test_inotify_init_fails(mocker: MockerFixture) -> None:
+    mocker.patch("ctypes.CDLL").return_value.inotify_init1.return_value = -1
+
+    with pytest.raises(OSError):
+        _Inotify()
+
+
+def test_inotify_add_watch_fails(workspace_directory: str) -> None:
+    inotify = _Inotify()
+
+    with pytest.raises(FileNotFoundError):
+        inotify.add_watch(os.path.join(workspace_directory, "doesntexist"))
+
+    inotify.close()
+
+
+def test_operation_monitor_finished_before_log_message(
+    monitor: OperationMonitor,
+) -> None:
+    """Test that lines other than progress lines don't change finished state."""
+    capture = ProgressCapture()
+
+    operation = Operation(capture=capture)
+
+    monitor.register(operation)
+
+    capture.write(b'{"type": "progress_message", "operation": 1, "finished": true}\n')
+    capture.write(
+        b'{"type": "log_message", "time": 1.0, "levelname": "INFO", "name": "borg", "message": "Done"}\n'
+    )
+
+    assert monitor.poll(timeout=1) == [operation]
+
+    (status,) = monitor.get_statuses()
+
+    assert status.finished
+    assert not status.stalled
+
+    # Next progress operation
+
+    capture.write(b'{"type": "progress_message", "operation": 2, "finished": false}\n')
+
+    monitor.poll(timeout=1)
+
+    assert not monitor.get_statuses()[0].finished
+
+
+def test_operation_monitor_lines_not_kept(
+    monitor: OperationMonitor, progress_file: str
+) -> None:
+    operation = Operation(progress_file=progress_file, lazy=True)
+
+    monitor.register(operation)
+
+    for i in range(1, 10):
+        write_archive_progress_line(progress_file, original_size=i, time_=i + 1.0)
+
+    monitor.poll(timeout=1)
+
+    assert monitor.get_statuses()[0].last_line.original_size == 9
+    assert operation._lines == []
+
+
+def test_operation_monitor_line_not_json(
+    monitor: OperationMonitor, progress_file: str
+) -> None:
+    """Test that lines not written by Borg (e.g. by SSH) are skipped."""
+    with open(progress_file, "a") as f:
+        f.write(
+            "Warning: Permanently added 'example.com' to the list of known hosts.\n"
+        )
+
+    operation = Operation(progress_file=progress_file, lazy=True)
+
+    monitor.register(operation)
+
+    write_archive_progress_line(progress_file, original_size=100, time_=2.0)
+
+    with open(progress_file, "a") as f:
+        f.write("Warning: Example\n")
+
+    assert monitor.poll(timeout=1) == [operation]
+    assert monitor.get_statuses()[0].last_line.original_size == 100
+
+
+def test_operation_monitor_line_not_supported(
+    monitor: OperationMonitor, workspace_directory: str, progress_file: str
+) -> None:
+    """Test that failing to read lines of one operation doesn't affect others."""
+    failing_progress_file = os.path.join(workspace_directory, "failing.txt")
+
+    write_archive_progress_line(failing_progress_file, original_size=0, time_=1.0)
+
+    failing_operation = Operation(progress_file=failing_progress_file)
+    operation = Operation(progress_file=progress_file)
+
+    monitor.register(failing_operation)
+    monitor.register(operation)
+
+    with open(failing_progress_file, "a") as f:
+        f.write('{"type": "doesntexist"}\n')
+
+    write_archive_progress_line(progress_file, original_size=100, time_=2.0)
+
+    deadline = time.monotonic() + 5
+
+    while operation not in monitor.poll(timeout=0.1):
+        assert time.monotonic() < deadline
+
+    assert monitor.get_statuses()[0].last_line.original_size == 0
+    assert monitor.get_statuses()[1].last_line.original_size == 100
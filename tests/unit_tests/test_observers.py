@@ -0,0 +1,192 @@
+import logging
+from typing import Generator, List
+
+import pytest
+
+from cyberfusion.BorgSupport.observers import (
+    CommandEvent,
+    CommandObserver,
+    Histogram,
+    HistogramObserver,
+    LoggingObserver,
+    instrument_command,
+    register_observer,
+    unregister_observer,
+)
+
+
+class RecordingObserver(CommandObserver):
+    def __init__(self) -> None:
+        self.started: List[CommandEvent] = []
+        self.ended: List[CommandEvent] = []
+
+    def command_started(self, event: CommandEvent) -> None:
+        self.started.append(event)
+
+    def command_ended(self, event: CommandEvent) -> None:
+        self.ended.append(event)
+
+
+class FailingObserver(CommandObserver):
+    def command_started(self, event: CommandEvent) -> None:
+        raise ValueError
+
+
+@pytest.fixture
+def recording_observer() -> Generator[RecordingObserver, None, None]:
+    observer = RecordingObserver()
+
+    register_observer(observer)
+
+    yield observer
+
+    unregister_observer(observer)
+
+
+def test_instrument_command(recording_observer: RecordingObserver) -> None:
+    with instrument_command(
+        ["borg", "list"], subcommand="list", repository_path="/tmp/repository"
+    ) as event:
+        assert recording_observer.started == [event]
+        assert recording_observer.ended == []
+
+        event.return_code = 0
+
+    assert recording_observer.ended == [event]
+
+    assert event.subcommand == "list"
+    assert event.repository_path == "/tmp/repository"
+    assert event.return_code == 0
+    assert event.wall_time is not None
+    assert event.user_time is not None
+    assert event.system_time is not None
+    assert event.max_rss is not None
+
+
+def test_instrument_command_ended_on_exception(
+    recording_observer: RecordingObserver,
+) -> None:
+    with pytest.raises(ValueError):
+        with instrument_command(
+            ["borg", "list"], subcommand="list", repository_path=None
+        ):
+            raise ValueError
+
+    assert len(recording_observer.ended) == 1
+
+
+def test_instrument_command_failing_observer(
+    recording_observer: RecordingObserver,
+) -> None:
+    observer = FailingObserver()
+
+    register_observer(observer)
+
+    try:
+        with instrument_command(
+            ["borg", "list"], subcommand="list", repository_path=None
+        ):
+            pass
+    finally:
+        unregister_observer(observer)
+
+    assert len(recording_observer.ended) == 1
+
+
+def test_logging_observer(caplog: pytest.LogCaptureFixture) -> None:
+    observer = LoggingObserver()
+
+    with caplog.at_level(logging.INFO):
+        observer.command_ended(
+            CommandEvent(
+                command=["borg", "list"],
+                subcommand="list",
+                repository_path="/tmp/repository",
+                start_time=0.0,
+                wall_time=1.5,
+                return_code=0,
+            )
+        )
+
+    assert (
+        caplog.records[0].getMessage()
+        == "Borg command 'list' for repository '/tmp/repository' ended with RC 0 in 1.500s"
+    )
+    assert caplog.records[0].borg_command["return_code"] == 0
+
+
+def test_histogram() -> None:
+    histogram = Histogram(buckets=(1.0, 10.0, float("inf")))
+
+    for value in [0.5, 0.5, 5.0, 20.0]:
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4
+    assert histogram.mean == 6.5
+    assert histogram.maximum == 20.0
+    assert histogram.quantile(0.5) == 1.0
+    assert histogram.quantile(0.75) == 10.0
+    assert histogram.quantile(1.0) == 20.0
+
+
+def test_histogram_observer_get_slowest() -> None:
+    observer = HistogramObserver()
+
+    for repository_path, wall_time in [("/fast", 0.1), ("/slow", 10.0)]:
+        observer.command_ended(
+            CommandEvent(
+                command=["borg", "list"],
+                subcommand="list",
+                repository_path=repository_path,
+                start_time=0.0,
+                wall_time=wall_time,
+            )
+        )
+
+    assert [key for key, _ in observer.get_slowest()] == [
+        ("list", "/slow"),
+        ("list", "/fast"),
+    ]
+
+
+def test_instrument_command_without_observers() -> None:
+    with instrument_command(
+        ["borg", "list"], subcommand="list", repository_path=None
+    ) as event:
+        pass
+
+    assert event.wall_time is None
+
+
+def test_histogram_empty() -> None:
+    histogram = Histogram(counts=[0] * 13)
+
+    assert histogram.mean == 0.0
+    assert histogram.quantile(0.5) == 0.0
+
+
+def test_histogram_observer() -> None:
+    observer = HistogramObserver()
+
+    register_observer(observer)
+
+    try:
+        for _ in range(2):
+            with instrument_command(
+                ["borg", "list"], subcommand="list", repository_path="/tmp/repository"
+            ):
+                pass
+    finally:
+        unregister_observer(observer)
+
+    observer.command_ended(
+        CommandEvent(
+            command=["borg", "list"],
+            subcommand="list",
+            repository_path="/tmp/repository",
+            start_time=0.0,
+        )
+    )  # Not ended, so skipped
+
+    assert observer.histograms[("list", "/tmp/repository")].count == 2
@@ -1,10 +1,23 @@
+import os
+import sqlite3
+import subprocess
 from typing import Generator
 
+import pytest
 from pytest_mock import MockerFixture
 
 from cyberfusion.BorgSupport import BorgCommand
-from cyberfusion.BorgSupport.exceptions import RegularCommandFailedError
-from cyberfusion.BorgSupport.repositories import Repository
+from cyberfusion.BorgSupport.archives import Archive
+from cyberfusion.BorgSupport.exceptions import (
+    LoggedCommandFailedError,
+    RegularCommandFailedError,
+    RepositoryLockedError,
+)
+from cyberfusion.BorgSupport.repositories import (
+    Repository,
+    _has_lock_timeout_output,
+    _is_lock_timeout_error,
+)
 from typing import Optional, Dict, List
 
 
@@ -55,3 +68,415 @@ def test_repository_is_locked_without_msgid(
     repository_init.is_locked
 
     mocker.stopall()  # Unlock for teardown
+
+
+def test_repository_cli_options_ssh_multiplexing_local(
+    repository: Generator[Repository, None, None],
+) -> None:
+    repository.ssh_multiplexing = True
+
+    assert repository._cli_options == {
+        "identity_file_path": None,
+    }
+
+
+def test_repository_cli_options_ssh_multiplexing_remote(
+    passphrase: str,
+) -> None:
+    repository = Repository(
+        path="ssh://user@host:22/path/to/repo",
+        passphrase=passphrase,
+        identity_file_path="/tmp/test.key",
+        ssh_multiplexing=True,
+        ssh_control_persist=30,
+    )
+
+    assert repository._cli_options == {
+        "identity_file_path": "/tmp/test.key",
+        "ssh_control_path": repository._ssh_control_path,
+        "ssh_control_persist": 30,
+    }
+    assert os.path.isdir(os.path.dirname(repository._ssh_control_path))
+
+
+def test_repository_ssh_control_path_shared(passphrase: str) -> None:
+    """Test that control path is shared by repositories on same host, and not by others."""
+    repository1 = Repository(
+        path="ssh://user@host:22/path/to/repo1",
+        passphrase=passphrase,
+        ssh_multiplexing=True,
+    )
+    repository2 = Repository(
+        path="ssh://user@host/path/to/repo2",
+        passphrase=passphrase,
+        ssh_multiplexing=True,
+    )
+    repository3 = Repository(
+        path="ssh://user@host:22/path/to/repo1",
+        passphrase=passphrase,
+        identity_file_path="/tmp/test.key",
+        ssh_multiplexing=True,
+    )
+
+    assert repository1._ssh_control_path == repository2._ssh_control_path
+    assert repository1._ssh_control_path != repository3._ssh_control_path
+
+
+def test_repository_close_ssh_connection_without_connection(
+    mocker: MockerFixture, passphrase: str
+) -> None:
+    spy_run = mocker.spy(subprocess, "run")
+
+    Repository(
+        path="ssh://user@host:22/path/to/repo",
+        passphrase=passphrase,
+        ssh_multiplexing=True,
+    ).close_ssh_connection()
+
+    spy_run.assert_not_called()
+
+
+@pytest.mark.parametrize("force,control_command", [(True, "exit"), (False, "stop")])
+def test_repository_close_ssh_connection_with_connection(
+    mocker: MockerFixture, passphrase: str, force: bool, control_command: str
+) -> None:
+    mock_run = mocker.patch("subprocess.run")
+
+    repository = Repository(
+        path="ssh://user@host:22/path/to/repo",
+        passphrase=passphrase,
+        ssh_multiplexing=True,
+    )
+
+    open(repository._ssh_control_path, "w").close()  # Fake socket
+
+    try:
+        repository.close_ssh_connection(force=force)
+    finally:
+        os.unlink(repository._ssh_control_path)
+
+    mock_run.assert_called_once_with(
+        [
+            "ssh",
+            f"-oControlPath={repository._ssh_control_path}",
+            "-O",
+            control_command,
+            "host",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def test_repository_session_keeps_ssh_connection(
+    mocker: MockerFixture, passphrase: str
+) -> None:
+    """Test that leaving session doesn't close shared connection."""
+    mock_run = mocker.patch("subprocess.run")
+
+    repository = Repository(
+        path="ssh://user@host:22/path/to/repo",
+        passphrase=passphrase,
+        ssh_multiplexing=True,
+    )
+
+    open(repository._ssh_control_path, "w").close()  # Fake socket
+
+    try:
+        with repository.session():
+            pass
+    finally:
+        os.unlink(repository._ssh_control_path)
+
+    mock_run.assert_not_called()
+
+
+def test_repository_lock_check_scope_nested(
+    mocker: MockerFixture, repository: Generator[Repository, None, None]
+) -> None:
+    """Test that nested operations check for a lock once."""
+    is_locked = mocker.patch(
+        "cyberfusion.BorgSupport.repositories.Repository.is_locked",
+        new_callable=mocker.PropertyMock,
+        return_value=False,
+    )
+
+    with repository._lock_check_scope():
+        with repository._lock_check_scope():
+            pass
+
+    assert is_locked.call_count == 1
+
+    with repository._lock_check_scope():
+        pass
+
+    assert is_locked.call_count == 2
+
+
+def test_repository_lock_check_scope_ttl(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that lock check result is reused within TTL."""
+    repository = Repository(
+        path=os.path.join(workspace_directory, "repository"),
+        passphrase=passphrase,
+        lock_check_ttl=60,
+    )
+
+    is_locked = mocker.patch(
+        "cyberfusion.BorgSupport.repositories.Repository.is_locked",
+        new_callable=mocker.PropertyMock,
+        return_value=False,
+    )
+
+    with repository._lock_check_scope():
+        pass
+
+    with repository._lock_check_scope():
+        pass
+
+    assert is_locked.call_count == 1
+
+
+def test_repository_lock_check_scope_without_probe(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that lock timeout of command is raised as RepositoryLockedError, without probing."""
+    repository = Repository(
+        path=os.path.join(workspace_directory, "repository"),
+        passphrase=passphrase,
+        lock_check_probe=False,
+    )
+
+    is_locked = mocker.patch(
+        "cyberfusion.BorgSupport.repositories.Repository.is_locked",
+        new_callable=mocker.PropertyMock,
+        return_value=True,
+    )
+
+    with pytest.raises(RepositoryLockedError):
+        with repository._lock_check_scope():
+            raise RegularCommandFailedError(
+                command=[BorgCommand.BORG_BIN, "list"],
+                stderr='{"type": "log_message", "msgid": "LockTimeout"}\n',
+                return_code=2,
+            )
+
+    with pytest.raises(RepositoryLockedError):
+        with repository._lock_check_scope():
+            raise RegularCommandFailedError(
+                command=[BorgCommand.BORG_BIN, "list"],
+                stderr="Failed to create/acquire the lock /path/to/repo/lock (timeout).\n",
+                return_code=2,
+            )
+
+    with pytest.raises(RegularCommandFailedError):
+        with repository._lock_check_scope():
+            raise RegularCommandFailedError(
+                command=[BorgCommand.BORG_BIN, "list"],
+                stderr="Repository does not exist.\n",
+                return_code=2,
+            )
+
+    is_locked.assert_not_called()
+
+
+def test_repository_session_reuses_passphrase_file(
+    repository: Generator[Repository, None, None],
+) -> None:
+    with repository.session():
+        with repository._passphrase_environment() as environment:
+            passphrase_file_path = environment["BORG_PASSCOMMAND"].split(" ")[1]
+
+        with repository.session():  # Nested
+            with repository._passphrase_environment() as nested_environment:
+                assert nested_environment == environment
+
+        assert os.path.exists(passphrase_file_path)
+
+    assert not os.path.exists(passphrase_file_path)
+
+
+def test_repository_passphrase_environment_without_session(
+    repository: Generator[Repository, None, None],
+) -> None:
+    with repository._passphrase_environment() as environment:
+        passphrase_file_path = environment["BORG_PASSCOMMAND"].split(" ")[1]
+
+        with open(passphrase_file_path) as f:
+            assert f.read() == repository.passphrase + "\n"
+
+    assert not os.path.exists(passphrase_file_path)
+
+
+def test_has_lock_timeout_output() -> None:
+    assert _has_lock_timeout_output(
+        'Remote: Warning\n[]\n{"type": "log_message", "msgid": "LockTimeout"}\n'
+    )
+    assert not _has_lock_timeout_output(
+        '{"type": "progress_message", "msgid": "LockTimeout"}\n'
+        '{"type": "log_message", "msgid": "Repository.DoesNotExist"}\n'
+    )
+
+
+def test_is_lock_timeout_error_logged(workspace_directory: str) -> None:
+    output_file_path = os.path.join(workspace_directory, "output")
+
+    with open(output_file_path, "w") as f:
+        f.write('{"type": "log_message", "msgid": "LockTimeout"}\n')
+
+    assert _is_lock_timeout_error(
+        LoggedCommandFailedError(
+            command=[BorgCommand.BORG_BIN, "check"],
+            output_file_path=output_file_path,
+            return_code=2,
+        )
+    )
+
+
+def test_is_lock_timeout_error_captured() -> None:
+    assert _is_lock_timeout_error(
+        LoggedCommandFailedError(
+            command=[BorgCommand.BORG_BIN, "check"],
+            output_file_path=None,
+            return_code=2,
+            output='{"type": "log_message", "msgid": "LockTimeout"}',
+        )
+    )
+
+
+def test_is_lock_timeout_error_without_output() -> None:
+    assert not _is_lock_timeout_error(
+        LoggedCommandFailedError(
+            command=[BorgCommand.BORG_BIN, "check"],
+            output_file_path=None,
+            return_code=2,
+        )
+    )
+
+
+def test_is_lock_timeout_error_stderr_not_captured() -> None:
+    assert not _is_lock_timeout_error(
+        RegularCommandFailedError(
+            command=[BorgCommand.BORG_BIN, "list"], stderr=None, return_code=2
+        )
+    )
+
+
+def test_repository_check_locked_without_probe(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    """Test that lock timeout is raised as RepositoryLockedError, not as issues found."""
+    mocker.patch(
+        "cyberfusion.BorgSupport.repositories.BorgLoggedCommand.execute",
+        side_effect=LoggedCommandFailedError(
+            command=[BorgCommand.BORG_BIN, "check"],
+            output_file_path=None,
+            return_code=2,
+            output='{"type": "log_message", "msgid": "LockTimeout"}',
+        ),
+    )
+
+    repository = Repository(
+        path=os.path.join(workspace_directory, "repository"),
+        passphrase=passphrase,
+        lock_check_probe=False,
+    )
+
+    with pytest.raises(RepositoryLockedError):
+        repository.check()
+
+
+def test_repository_check_issues_found(
+    mocker: MockerFixture, passphrase: str, workspace_directory: str
+) -> None:
+    mocker.patch(
+        "cyberfusion.BorgSupport.repositories.BorgLoggedCommand.execute",
+        side_effect=LoggedCommandFailedError(
+            command=[BorgCommand.BORG_BIN, "check"],
+            output_file_path=None,
+            return_code=1,
+            output='{"type": "log_message", "msgid": "Repository.CheckNeeded"}',
+        ),
+    )
+
+    repository = Repository(
+        path=os.path.join(workspace_directory, "repository"),
+        passphrase=passphrase,
+        lock_check_probe=False,
+    )
+
+    assert not repository.check()
+
+
+def test_repository_prune_index_failed(
+    mocker: MockerFixture,
+    caplog: pytest.LogCaptureFixture,
+    passphrase: str,
+    workspace_directory: str,
+) -> None:
+    """Test that failing to remove pruned archives from index doesn't skip compaction."""
+    contents_index = mocker.Mock()
+    contents_index.remove_archives.side_effect = sqlite3.ProgrammingError
+
+    repository = Repository(
+        path=os.path.join(workspace_directory, "repository"),
+        passphrase=passphrase,
+        lock_check_probe=False,
+        contents_index=contents_index,
+    )
+
+    mocker.patch.object(
+        Repository, "id_", new_callable=mocker.PropertyMock, return_value="r1"
+    )
+    mocker.patch.object(
+        Repository,
+        "archives",
+        side_effect=[
+            [
+                Archive(repository=repository, name="a", comment="", id_="1"),
+                Archive(repository=repository, name="b", comment="", id_="2"),
+            ],
+            [Archive(repository=repository, name="b", comment="", id_="2")],
+        ],
+    )
+    compact = mocker.patch.object(Repository, "compact")
+
+    assert repository.prune(keep_last=1) == ["a"]
+
+    contents_index.remove_archives.assert_called_once_with(
+        repository_id="r1", archive_ids=["1"]
+    )
+    compact.assert_called_once_with()
+
+    assert "Removing archives from contents index failed" in caplog.text
+
+
+def test_repository_delete_index_failed(
+    mocker: MockerFixture,
+    caplog: pytest.LogCaptureFixture,
+    passphrase: str,
+    workspace_directory: str,
+) -> None:
+    """Test that failing to remove repository from index doesn't stop deleting it."""
+    contents_index = mocker.Mock()
+    contents_index.remove_repository.side_effect = sqlite3.ProgrammingError
+
+    execute = mocker.patch(
+        "cyberfusion.BorgSupport.repositories.BorgRegularCommand.execute"
+    )
+
+    mocker.patch.object(
+        Repository, "id_", new_callable=mocker.PropertyMock, return_value="r1"
+    )
+
+    Repository(
+        path=os.path.join(workspace_directory, "repository"),
+        passphrase=passphrase,
+        lock_check_probe=False,
+        contents_index=contents_index,
+    ).delete()
+
+    assert execute.call_args.kwargs["command"] == BorgCommand.SUBCOMMAND_DELETE
+
+    assert "Removing repository from contents index failed" in caplog.text
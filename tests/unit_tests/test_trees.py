@@ -0,0 +1,146 @@
+from typing import List
+
+import pytest
+from pytest_mock import MockerFixture
+
+from cyberfusion.BorgSupport.archives import Archive, FilesystemObject
+from cyberfusion.BorgSupport.exceptions import PathNotExistsError
+from cyberfusion.BorgSupport.repositories import Repository
+from cyberfusion.BorgSupport.trees import ArchiveTree
+
+
+@pytest.fixture
+def tree(mocker: MockerFixture, archive_contents_lines: List[dict]) -> ArchiveTree:
+    mocker.patch.object(
+        Archive,
+        "iter_contents",
+        side_effect=lambda **kwargs: iter(
+            FilesystemObject(line) for line in archive_contents_lines
+        ),
+    )
+
+    return ArchiveTree(
+        archive=Archive(
+            repository=Repository(path="/tmp/repository", passphrase="test"),
+            name="example",
+            comment="Example",
+        ),
+        path="home",
+    )
+
+
+def test_archive_tree_streamed(tree: ArchiveTree) -> None:
+    tree.archive.iter_contents.assert_called_once_with(path="home")  # type: ignore[attr-defined]
+
+
+def test_archive_tree_get_node(tree: ArchiveTree) -> None:
+    node = tree.get_node("/home/example/")
+
+    assert node.name == "example"
+    assert node.path == "home/example"
+    assert node.filesystem_object is not None
+    assert node.filesystem_object.path == "home/example"
+
+    assert tree.get_node("") is tree.root
+    assert tree.get_node("/") is tree.root
+    assert tree.root.path == ""
+
+
+def test_archive_tree_get_node_not_exists(tree: ArchiveTree) -> None:
+    with pytest.raises(PathNotExistsError):
+        tree.get_node("home/doesntexist")
+
+    # Below file
+
+    with pytest.raises(PathNotExistsError):
+        tree.get_node("home/example.txt/example")
+
+
+def test_archive_tree_implicit_parents(tree: ArchiveTree) -> None:
+    assert tree.get_node("var").filesystem_object is None
+    assert tree.get_node("var/log").filesystem_object is None
+
+    assert tree.root.filesystem_object is None
+
+
+def test_archive_tree_children(tree: ArchiveTree) -> None:
+    assert [child.name for child in tree.get_node("home").get_children()] == [
+        "example.txt",
+        "example",
+        "link",
+    ]
+
+    assert tree.get_node("home/link").get_children() == []
+    assert tree.get_node("home/link").get_child("example") is None
+    assert tree.get_node("home").get_child("link") is tree.get_node("home/link")
+
+
+def test_archive_tree_aggregates(tree: ArchiveTree) -> None:
+    assert (tree.root.total_size, tree.root.total_files) == (35, 3)
+
+    assert [
+        (child.name, child.total_size, child.total_files)
+        for child in tree.get_node("home").get_children()
+    ] == [("example.txt", 5, 1), ("example", 10, 1), ("link", 0, 0)]
+
+    assert (tree.get_node("home").total_size, tree.get_node("var").total_size) == (
+        15,
+        20,
+    )
+
+
+def test_archive_tree_iter_subtree(tree: ArchiveTree) -> None:
+    assert [node.path for node in tree.iter_subtree()] == [
+        "",
+        "home",
+        "home/example.txt",
+        "home/example",
+        "home/example/example.txt",
+        "home/link",
+        "home2",
+        "var",
+        "var/log",
+        "var/log/example.log",
+        "tmp",
+    ]
+
+    assert [node.path for node in tree.iter_subtree("home/example")] == [
+        "home/example",
+        "home/example/example.txt",
+    ]
+
+
+def test_archive_tree_names_interned(tree: ArchiveTree) -> None:
+    assert (
+        tree.get_node("home/example.txt").name
+        is tree.get_node("home/example/example.txt").name
+    )
+
+
+def test_archive_tree_type_not_supported(
+    mocker: MockerFixture, archive_contents_lines: List[dict]
+) -> None:
+    """Test that objects of unsupported types (e.g. FIFOs) are added."""
+    line = {
+        **archive_contents_lines[1],
+        "type": "p",
+        "mode": "prw-r--r--",
+        "path": "home/fifo",
+    }
+
+    mocker.patch.object(
+        Archive,
+        "iter_contents",
+        side_effect=lambda **kwargs: iter([FilesystemObject(line)]),
+    )
+
+    tree = ArchiveTree(
+        archive=Archive(
+            repository=Repository(path="/tmp/repository", passphrase="test"),
+            name="example",
+            comment="Example",
+        ),
+    )
+
+    assert tree.get_node("home/fifo").filesystem_object is not None
+    assert (tree.root.total_size, tree.root.total_files) == (0, 0)
@@ -1,12 +1,18 @@
 import os
 
 import pytest
+from pytest_mock import MockerFixture
 
-from cyberfusion.BorgSupport.exceptions import ExecutableNotFoundError
+from cyberfusion.BorgSupport.exceptions import (
+    DirectoryNotPrivateError,
+    ExecutableNotFoundError,
+)
 from cyberfusion.BorgSupport.utilities import (
+    check_directory_private,
     find_executable,
     generate_random_string,
     get_md5_hash,
+    get_ssh_control_directory,
     get_tmp_file,
 )
 
@@ -47,3 +53,60 @@ def test_get_tmp_file_path() -> None:
 
 def test_get_tmp_file_permissions() -> None:
     assert os.stat(get_tmp_file()).st_mode == 33152
+
+
+def test_get_ssh_control_directory() -> None:
+    path = get_ssh_control_directory()
+
+    check_directory_private(path)
+
+    assert get_ssh_control_directory() == path
+
+
+def test_get_ssh_control_directory_created(mocker: MockerFixture) -> None:
+    """Test that mode is set regardless of umask when creating directory."""
+    get_ssh_control_directory()
+
+    mocker.patch("os.mkdir")  # As if created
+    spy_chmod = mocker.spy(os, "chmod")
+
+    path = get_ssh_control_directory()
+
+    spy_chmod.assert_called_once_with(path, 0o700)
+
+
+def test_check_directory_private_symlink(workspace_directory: str) -> None:
+    path = os.path.join(workspace_directory, "control")
+    target_path = os.path.join(workspace_directory, "target")
+
+    os.mkdir(target_path, mode=0o700)
+    os.symlink(target_path, path)
+
+    with pytest.raises(DirectoryNotPrivateError):
+        check_directory_private(path)
+
+
+def test_check_directory_private_mode(workspace_directory: str) -> None:
+    path = os.path.join(workspace_directory, "control")
+
+    os.mkdir(path)
+    os.chmod(path, 0o755)
+
+    with pytest.raises(DirectoryNotPrivateError):
+        check_directory_private(path)
+
+
+def test_check_directory_private_owner(
+    mocker: MockerFixture, workspace_directory: str
+) -> None:
+    path = os.path.join(workspace_directory, "control")
+
+    os.mkdir(path)
+    os.chmod(path, 0o700)
+
+    check_directory_private(path)
+
+    mocker.patch("os.getuid", return_value=os.getuid() + 1)
+
+    with pytest.raises(DirectoryNotPrivateError):
+        check_directory_private(path)